@@ -1,81 +1,152 @@
-import os
-import shutil
+import threading
 from pathlib import Path
-from typing import Dict, Union
-from src.scripts.separate import separate_audio
-from src.scripts.transcribe import LyricsTranscriber
-from pydub import AudioSegment
+from typing import Callable, Dict, Optional, Union
+import torch
+from src.scripts.separate import (
+    load_custom_model, load_preview_model, get_preset, MODEL_PATH, DEFAULT_PRESET, DEFAULT_MAX_WAIT,
+    BatchingSeparationPool, ParallelSeparationPool
+)
+from src.scripts.transcribe import LyricsTranscriber, DEFAULT_TRANSCRIPTION_PRESET
+from src.scripts.align import LyricsAligner
+from src.utils.fingerprint import FingerprintIndex
+from src.utils.memory import MemoryBudget, budget_from_env
+from src.utils.metrics import MODEL_LOAD
+from core.pipeline import ProcessingPipeline, ProcessingCancelled, default_workspace, file_sha256
 
 class AudioProcessor:
-    def __init__(self, model_size="medium"):
-        self.transcriber = LyricsTranscriber(model_size=model_size)
+    def __init__(self, model_size: Optional[str] = None, preload_separator=False, separation_preset=DEFAULT_PRESET,
+                 memory_budget_mb: Optional[float] = None, transcription_preset: Optional[str] = None,
+                 transcription_workers: int = 1, separation_workers: int = 1, deduplicate: bool = True,
+                 separation_batch: int = 1, separation_max_wait: float = DEFAULT_MAX_WAIT,
+                 derived_instrumental: bool = False, convert_models: bool = False):
+        get_preset(separation_preset)
+        if separation_workers > 1 and separation_batch > 1:
+            raise ValueError("separation_workers y separation_batch no se pueden combinar")
+        self.separation_preset = separation_preset
+        # Presupuesto compartido por todos los trabajos de este procesador (MB, None = sin límite)
+        self.memory_budget = MemoryBudget(memory_budget_mb if memory_budget_mb is not None else budget_from_env())
+        # model_size None = el modelo del preset de transcripción
+        self.transcriber = LyricsTranscriber(model_size=model_size,
+                                             preset=transcription_preset or DEFAULT_TRANSCRIPTION_PRESET,
+                                             workers=transcription_workers,
+                                             convert_model=convert_models)
+        # Huellas acústicas: otra copia (MP3, FLAC...) de una canción ya procesada la reutiliza
+        self.fingerprint_index = FingerprintIndex() if deduplicate else None
+        self.separation_model = None
+        self.separation_workers = separation_workers
+        # Lotes de ventanas de varias canciones en una sola pasada de HTDemucs (1 = sin lotes)
+        self.separation_batch = separation_batch
+        self.separation_max_wait = separation_max_wait
+        self.separation_executor = None
+        # Solo voces en disco; el instrumental se deriva al reproducir (original - voces)
+        self.derived_instrumental = derived_instrumental
+        # Guardar al cargar los checkpoints mapeables que falten (varios GB en models/)
+        self.convert_models = convert_models
+        self.preview_model = None
+        self.aligner = None
+        self._model_lock = threading.Lock()
+        if preload_separator:
+            self.get_separation_model()
 
-    def process_audio(self, input_path: Union[str, Path], output_base_dir: str = "output") -> Dict:
-        try:
-            input_path = Path(input_path)
-            output_dir = Path(output_base_dir)
-            
-            # Crear estructura de directorios
-            stems_dir = output_dir / "stems"
-            lyrics_dir = output_dir / "lyrics"
-            original_dir = output_dir / "original"
-            
-            # Limpiar y crear directorios
-            shutil.rmtree(output_dir, ignore_errors=True)
-            stems_dir.mkdir(parents=True, exist_ok=True)
-            lyrics_dir.mkdir(parents=True, exist_ok=True)
-            original_dir.mkdir(parents=True, exist_ok=True)
+    def get_separation_model(self):
+        """Devuelve el modelo HTDemucs residente, cargándolo la primera vez"""
+        with self._model_lock:
+            if self.separation_model is None:
+                device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                with MODEL_LOAD.time(model='htdemucs'):
+                    self.separation_model = load_custom_model(MODEL_PATH, device, convert=self.convert_models)
+                self.separation_model.eval()
+            return self.separation_model
 
-            # 1. Convertir el original a WAV estándar
-            original_wav = original_dir / "song.wav"
-            self._convert_to_standard_wav(input_path, original_wav)
+    def get_separation_executor(self) -> Optional[Union[ParallelSeparationPool, BatchingSeparationPool]]:
+        """Ejecutor compartido para las ventanas de HTDemucs: lotes entre canciones con
+        `separation_batch` > 1, o pool de procesos (solo CPU y con más de un worker)"""
+        model = self.get_separation_model()
+        with self._model_lock:
+            if self.separation_executor is None:
+                if self.separation_batch > 1:
+                    self.separation_executor = BatchingSeparationPool(model, self.separation_batch,
+                                                                      self.separation_max_wait)
+                elif self.separation_workers > 1 and next(model.parameters()).device.type == 'cpu':
+                    self.separation_executor = ParallelSeparationPool(model, self.separation_workers)
+            return self.separation_executor
 
-            # 2. Separación de stems
-            stems_result = separate_audio(
-                input_path=str(original_wav),
-                output_dir=str(stems_dir)
-            )
-            
-            # 3. Verificar stems
-            vocals_wav = stems_dir / 'vocals.wav'
-            instrumental_wav = stems_dir / 'instrumental.wav'
-            
-            if not vocals_wav.exists():
-                raise RuntimeError("No se generó el archivo vocals.wav")
+    def close(self):
+        """Detiene los procesos auxiliares (separación y transcripción en paralelo)"""
+        if self.separation_executor is not None:
+            self.separation_executor.shutdown(cancel_futures=True)
+            self.separation_executor = None
+        self.transcriber.close()
+
+    def get_preview_model(self):
+        """Separador rápido (Open-Unmix) para la vista previa, cargado al primer uso"""
+        with self._model_lock:
+            if self.preview_model is None:
+                device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                with MODEL_LOAD.time(model='openunmix'):
+                    self.preview_model = load_preview_model(device)
+            return self.preview_model
+
+    def get_aligner(self) -> LyricsAligner:
+        """Devuelve el alineador forzado, cargándolo solo cuando se usa letra conocida"""
+        with self._model_lock:
+            if self.aligner is None:
+                with MODEL_LOAD.time(model='aligner'):
+                    self.aligner = LyricsAligner()
+            return self.aligner
 
-            # 4. Transcripción con nombres fijos
-            lyrics_result = self.transcriber.transcribe_audio(
-                audio_path=str(vocals_wav),
-                output_dir=str(lyrics_dir)
+    def process_audio(
+        self,
+        input_path: Union[str, Path],
+        output_base_dir: Optional[str] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        return_audio: bool = False,
+        separation_preset: Optional[str] = None,
+        lyrics_text: Optional[str] = None,
+        preview: bool = False,
+        artifact_callback: Optional[Callable[[str, Dict], None]] = None,
+        lazy_words: bool = False,
+        derived_instrumental: Optional[bool] = None
+    ) -> Dict:
+        """Pipeline completo y reanudable (ver core.pipeline). Sin `output_base_dir` cada canción
+        usa su propio workspace en output/workspaces. `progress_callback(etapa, fracción)`
+        informa del avance y `should_cancel()` se consulta entre etapas y ventanas de separación
+        para abortar con ProcessingCancelled. `separation_preset` sustituye al preset por defecto
+        del procesador solo para esta llamada. Con `lyrics_text` la letra se alinea con las voces
+        (alineación forzada) en vez de transcribirse con Whisper. Con presupuesto de memoria, el
+        resultado incluye el plan elegido y, siempre, el uso de memoria por etapa en 'memory'.
+        Con `preview` se hace antes una separación rápida (Open-Unmix); `artifact_callback(tipo,
+        rutas)` recibe 'preview' con esos stems y 'stems' cuando están los de HTDemucs. Con
+        `lazy_words` la letra sale solo con tiempos por segmento y las palabras se alinean
+        después con src.scripts.lazy_words. `derived_instrumental` (por defecto, el del
+        procesador) guarda el instrumental como receta original - voces en lugar de WAV"""
+        try:
+            # El hash que elige el workspace sirve también para el manifiesto
+            input_sha256 = None if output_base_dir else file_sha256(input_path)
+            pipeline = ProcessingPipeline(
+                output_base_dir or default_workspace(input_path, sha256=input_sha256),
+                self.get_separation_model,
+                self.transcriber,
+                progress_callback=progress_callback,
+                should_cancel=should_cancel,
+                separation_preset=separation_preset or self.separation_preset,
+                lyrics_text=lyrics_text,
+                get_aligner=self.get_aligner,
+                memory_budget=self.memory_budget,
+                get_preview_model=self.get_preview_model if preview else None,
+                artifact_callback=artifact_callback,
+                get_separation_executor=self.get_separation_executor,
+                fingerprint_index=self.fingerprint_index,
+                lazy_words=lazy_words,
+                derived_instrumental=(self.derived_instrumental if derived_instrumental is None
+                                      else derived_instrumental),
+                input_sha256=input_sha256
             )
-            
-            # Rutas fijas para los archivos de letras
-            text_path = lyrics_dir / "song_lyrics.txt"
-            timed_path = lyrics_dir / "song_timed.json"
-            
-            return {
-                'original': str(original_wav),
-                'stems': {
-                    'vocals': str(vocals_wav),
-                    'instrumental': str(instrumental_wav)
-                },
-                'lyrics': {
-                    'text_path': str(text_path),
-                    'timed_path': str(timed_path),
-                    'data': lyrics_result
-                }
-            }
+            return pipeline.run(input_path, return_audio=return_audio)
 
+        except ProcessingCancelled:
+            raise
         except Exception as e:
             print(f"Error en procesamiento: {str(e)}")
             raise
-
-    def _convert_to_standard_wav(self, input_path: Path, output_path: Path):
-        """Conversión a WAV con parámetros fijos"""
-        audio = AudioSegment.from_file(input_path)
-        audio.export(
-            output_path,
-            format="wav",
-            codec="pcm_s16le",
-            parameters=["-ac", "2", "-ar", "44100"]
-        )
\ No newline at end of file
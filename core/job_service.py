@@ -0,0 +1,369 @@
+import json
+import mimetypes
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from src.utils import metrics
+
+if TYPE_CHECKING:
+    # Solo para anotaciones: la capa HTTP no necesita torch (se prueba con cualquier procesador)
+    from core.audio_processor import AudioProcessor
+
+ALLOWED_EXTENSIONS = {'.mp3', '.wav', '.flac', '.ogg'}
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_UPLOAD_MB = 200
+
+# Nombre público del artefacto -> ruta dentro del resultado de process_audio
+ARTIFACTS = {
+    'original': ('original',),
+    'vocals': ('stems', 'vocals'),
+    'instrumental': ('stems', 'instrumental'),
+    'lyrics': ('lyrics', 'text_path'),
+    'timed': ('lyrics', 'timed_path'),
+}
+
+
+class QueueFullError(Exception):
+    """La cola de trabajos ha alcanzado su capacidad máxima"""
+
+
+class UploadTooLargeError(Exception):
+    """La subida supera el tamaño máximo admitido"""
+
+
+class Job:
+    def __init__(self, job_id: str, input_path: Path, output_dir: Path):
+        self.id = job_id
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.result: Optional[Dict] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def artifact_path(self, name: str) -> Optional[Path]:
+        """Ruta en disco de un artefacto del trabajo, si ya existe"""
+        if self.result is None or name not in ARTIFACTS:
+            return None
+        value = self.result
+        for key in ARTIFACTS[name]:
+            value = value.get(key) if isinstance(value, dict) else None
+        if not value or not Path(value).exists():
+            return None
+        return Path(value)
+
+    def to_dict(self) -> Dict:
+        data = {
+            'id': self.id,
+            'filename': self.input_path.name,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == 'done':
+            data['artifacts'] = [name for name in ARTIFACTS if self.artifact_path(name)]
+        return data
+
+
+class JobService:
+    """Cola de trabajos con concurrencia acotada sobre un AudioProcessor compartido.
+
+    HTDemucs y Whisper se cargan una sola vez y permanecen residentes entre trabajos. Con
+    varios workers todos los hilos usan el mismo procesador, que es reentrante: cada
+    trabajo tiene su propio pipeline, workspace y temporales, y los modelos con estado
+    (Whisper, alineador) se usan bajo cerrojo.
+    """
+
+    def __init__(self, processor: 'AudioProcessor', output_root: Union[str, Path] = "output/jobs",
+                 workers: int = 1, max_queue: int = 32, max_upload_mb: float = DEFAULT_MAX_UPLOAD_MB):
+        self.processor = processor
+        self.max_upload_bytes = int(max_upload_mb * 1024 * 1024)
+        self.output_root = Path(output_root)
+        self.output_root.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        metrics.QUEUE_DEPTH.set_function(self._queue.qsize)
+        metrics.JOBS_RUNNING.set_function(lambda: self._running)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"lyraoke-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def submit(self, filename: str, stream: BinaryIO, length: int) -> Job:
+        """Registra una subida de `length` bytes leídos de `stream` y la encola para su
+        procesamiento. El cuerpo se copia al disco por bloques, nunca entero en memoria"""
+        name = Path(filename).name
+        if Path(name).suffix.lower() not in ALLOWED_EXTENSIONS:
+            raise ValueError(f"Formato no soportado: {name}")
+        if length <= 0:
+            raise ValueError("El archivo subido está vacío")
+        if length > self.max_upload_bytes:
+            raise UploadTooLargeError(f"El archivo supera el máximo de {self.max_upload_bytes} bytes")
+        # Sin hueco no se escribe nada (put_nowait puede fallar igualmente por una carrera)
+        if self._queue.full():
+            raise QueueFullError("Cola de trabajos llena, inténtalo más tarde")
+
+        job_id = uuid.uuid4().hex
+        job_dir = self.output_root / job_id
+        upload_dir = job_dir / "upload"
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        input_path = upload_dir / name
+        try:
+            _copy_upload(stream, input_path, length)
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        job = Job(job_id, input_path, job_dir / "result")
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise QueueFullError("Cola de trabajos llena, inténtalo más tarde")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            running = self._running
+        return {
+            'queue_depth': self._queue.qsize(),
+            'running': running,
+            'workers': self.workers,
+            'completed': statuses.count('done'),
+            'failed': statuses.count('failed'),
+        }
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            with self._lock:
+                self._running += 1
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                job.result = self.processor.process_audio(job.input_path, str(job.output_dir))
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running -= 1
+                self._queue.task_done()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Interpreta una cabecera Range de un único rango. Devuelve (inicio, fin) inclusivos.
+
+    Lanza ValueError si el rango no es satisfacible.
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not match or (not match.group(1) and not match.group(2)):
+        raise ValueError(f"Rango inválido: {header}")
+    start_str, end_str = match.groups()
+    if not start_str:
+        # Sufijo: últimos N bytes
+        length = int(end_str)
+        if length == 0:
+            raise ValueError("Rango vacío")
+        return max(0, size - length), size - 1
+    start = int(start_str)
+    end = int(end_str) if end_str else size - 1
+    if start >= size or end < start:
+        raise ValueError(f"Rango fuera del archivo: {header}")
+    return start, min(end, size - 1)
+
+
+def _copy_upload(stream: BinaryIO, path: Path, length: int):
+    """Copia exactamente `length` bytes de `stream` a `path` por bloques de CHUNK_SIZE"""
+    remaining = length
+    with open(path, 'wb') as f:
+        while remaining > 0:
+            block = stream.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                raise ValueError(f"Subida incompleta: faltan {remaining} de {length} bytes")
+            f.write(block)
+            remaining -= len(block)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """API HTTP local:
+
+    POST /jobs?filename=cancion.mp3     sube el audio (cuerpo en bruto) y lo encola
+    GET  /jobs                          lista de trabajos
+    GET  /jobs/<id>                     estado del trabajo
+    GET  /jobs/<id>/artifacts/<nombre>  descarga con soporte de Range
+    GET  /status                        profundidad de cola y trabajos en curso
+    GET  /metrics                       métricas en formato de texto de Prometheus
+    """
+
+    service: JobService = None
+    server_version = "Lyraoke"
+
+    def do_GET(self):
+        self._dispatch(send_body=True)
+
+    def do_HEAD(self):
+        self._dispatch(send_body=False)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            return self._send_json({'error': 'Ruta no encontrada'}, HTTPStatus.NOT_FOUND)
+
+        filename = parse_qs(url.query).get('filename', [''])[0]
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0
+        try:
+            job = self.service.submit(filename, self.rfile, length)
+        except UploadTooLargeError as e:
+            # El cuerpo queda sin leer: la conexión no puede reutilizarse
+            self.close_connection = True
+            return self._send_json({'error': str(e)}, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        except QueueFullError as e:
+            self.close_connection = True
+            return self._send_json({'error': str(e)}, HTTPStatus.SERVICE_UNAVAILABLE)
+        except ValueError as e:
+            self.close_connection = True
+            return self._send_json({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+        self._send_json(job.to_dict(), HTTPStatus.ACCEPTED)
+
+    def _dispatch(self, send_body: bool):
+        parts = [p for p in urlparse(self.path).path.split('/') if p]
+        if parts == ['status']:
+            return self._send_json(self.service.stats(), send_body=send_body)
+        if parts == ['metrics']:
+            return self._send_text(metrics.REGISTRY.render(), metrics.CONTENT_TYPE, send_body)
+        if parts == ['jobs']:
+            return self._send_json(self.service.list_jobs(), send_body=send_body)
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json({'error': 'Trabajo no encontrado'}, HTTPStatus.NOT_FOUND)
+            if len(parts) == 2:
+                return self._send_json(job.to_dict(), send_body=send_body)
+            if len(parts) == 4 and parts[2] == 'artifacts':
+                path = job.artifact_path(parts[3])
+                if path is None:
+                    return self._send_json({'error': 'Artefacto no disponible'}, HTTPStatus.NOT_FOUND)
+                return self._send_file(path, send_body)
+        self._send_json({'error': 'Ruta no encontrada'}, HTTPStatus.NOT_FOUND)
+
+    def _send_json(self, payload, status=HTTPStatus.OK, send_body=True):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_text(self, text: str, content_type: str, send_body: bool):
+        body = text.encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_file(self, path: Path, send_body: bool):
+        # El instrumental derivado se sirve como el WAV que sustituye, calculado al vuelo
+        # (importación diferida: numpy solo hace falta para las recetas)
+        if path.suffix == '.json':
+            from src.utils.derived_stems import DerivedWavStream, audio_path_for, is_derived
+            if is_derived(path):
+                with DerivedWavStream(path) as stream:
+                    return self._send_stream(stream, stream.size, audio_path_for(path).name, send_body)
+        with open(path, 'rb') as f:
+            return self._send_stream(f, path.stat().st_size, path.name, send_body)
+
+    def _send_stream(self, f, size: int, name: str, send_body: bool):
+        try:
+            byte_range = parse_range(self.headers.get('Range'), size)
+        except ValueError:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = byte_range if byte_range else (0, size - 1)
+        length = end - start + 1 if size else 0
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        self.send_header('Content-Type', mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(length))
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not send_body:
+            return
+
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        if os.environ.get("LYRAOKE_HTTP_LOG"):
+            super().log_message(format, *args)
+
+
+def create_server(service: JobService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Crea el servidor HTTP ligado al servicio. Con port=0 el sistema elige un puerto libre"""
+    handler = type('BoundJobRequestHandler', (JobRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
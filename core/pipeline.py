@@ -0,0 +1,674 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import torch
+import torchaudio
+
+from src.scripts.separate import (
+    CheckpointPool, load_mix, save_stems, separate_mix, separate_preview, get_preset,
+    DEFAULT_PRESET, TARGET_SR
+)
+from src.scripts.align import UnalignableLyricsError
+from src.scripts.transcribe import language_hint_keys
+from src.utils.audio_stream import audio_duration, stream_to_wav
+from src.utils.derived_stems import MIX_FILENAME, DerivedInstrumental, read_recipe, recipe_path_for
+from src.utils.files import atomic_write_json
+from src.utils.fingerprint import (
+    MAX_REUSE_OFFSET_SECONDS, FingerprintIndex, compute_fingerprint, load_fingerprint, save_fingerprint
+)
+from src.utils.memory import MemoryBudget, StageMemory
+from src.utils.metrics import AUDIO_SECONDS, PROCESSING_SECONDS, SONGS_PROCESSED, STAGE_DURATION, STAGE_FAILURES
+from src.utils.loudness import loudness_path_for, loudness_summary, write_loudness
+from src.utils.peaks import peaks_path_for, write_peaks
+from src.utils.pitch import PitchTrack, pitch_path_for
+from src.utils.profiling import JobProfiler, profile_region
+
+# Etapas en orden de ejecución; cada una consume los artefactos de las anteriores
+# La invalidación es posicional: pitch va después de transcribe para que un workspace sin
+# pista de tono (o con la suya inválida) no vuelva a pasar por Whisper
+STAGES = ('ingest', 'separate', 'save_stems', 'transcribe', 'pitch', 'export')
+MANIFEST_VERSION = 1
+WORKSPACE_ROOT = Path("output") / "workspaces"
+# Etapas que se copian de otro workspace con la misma grabación (huella acústica)
+REUSABLE_STAGES = ('separate', 'save_stems', 'transcribe', 'pitch')
+# Contenido de un workspace que el pipeline puede borrar al empezar de cero
+WORKSPACE_ENTRIES = ('original', 'stems', 'lyrics', 'profile', 'result.json', '.checkpoints')
+
+
+class ProcessingCancelled(Exception):
+    """El procesamiento se canceló a petición del usuario"""
+
+
+class WorkspaceBusy(RuntimeError):
+    """Otro trabajo está usando el mismo directorio de salida"""
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path: Path, data):
+    atomic_write_json(path, data)
+
+
+def default_workspace(input_path: Union[str, Path], sha256: Optional[str] = None) -> Path:
+    """Workspace propio de cada entrada: la misma canción vuelve a su directorio (y reanuda),
+    canciones distintas nunca comparten artefactos. `sha256` evita volver a leer la entrada
+    si ya se conoce su hash"""
+    input_path = Path(input_path)
+    slug = re.sub(r'[^\w-]+', '_', input_path.stem)[:40] or 'audio'
+    return WORKSPACE_ROOT / f"{slug}-{(sha256 or file_sha256(input_path))[:12]}"
+
+
+class WorkspaceLock:
+    """Cerrojo exclusivo sobre un workspace (`.lock`), liberado por el sistema si el proceso muere"""
+
+    def __init__(self, directory: Path):
+        self.path = directory / ".lock"
+        self._file = None
+
+    def __enter__(self) -> 'WorkspaceLock':
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            raise WorkspaceBusy(f"El workspace {self.path.parent} está en uso por otro trabajo")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+        return False
+
+
+class CheckpointManifest:
+    """Registro en disco de las etapas completadas y de la huella de sus artefactos"""
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.checkpoint_dir = output_dir / ".checkpoints"
+        self.path = self.checkpoint_dir / "manifest.json"
+        self.data = self._load()
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def save(self):
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        _write_json_atomic(self.path, self.data)
+
+    def bind_input(self, input_path: Path, settings: Optional[Dict] = None,
+                   sha256: Optional[str] = None) -> bool:
+        """Asocia el manifiesto a la entrada y a los ajustes que afectan al resultado
+        (`sha256`: hash de la entrada si ya se calculó). Devuelve True si hay trabajo
+        previo reutilizable"""
+        fingerprint = {
+            'sha256': sha256 or file_sha256(input_path),
+            'size': input_path.stat().st_size,
+            'settings': settings or {},
+        }
+        if self.data.get('input') == fingerprint:
+            return True
+        self.data = {'version': MANIFEST_VERSION, 'input': fingerprint, 'stages': {}}
+        return False
+
+    def is_done(self, stage: str) -> bool:
+        """Una etapa solo cuenta como completada si todos sus artefactos siguen intactos"""
+        entry = self.data.get('stages', {}).get(stage)
+        if not entry or entry.get('status') != 'done':
+            return False
+        for info in entry.get('artifacts', {}).values():
+            path = self.output_dir / info['path']
+            if not path.is_file() or path.stat().st_size != info['size']:
+                return False
+            if file_sha256(path) != info['sha256']:
+                return False
+        return True
+
+    def mark_done(self, stage: str, artifacts: Optional[Dict[str, Path]] = None,
+                  info: Optional[Dict] = None):
+        """Registra la etapa con el hash de sus artefactos; `info` guarda datos pequeños del
+        resultado que no están en los artefactos (p. ej. el idioma de la transcripción)"""
+        records = {}
+        for name, path in (artifacts or {}).items():
+            path = Path(path)
+            records[name] = {
+                'path': str(path.relative_to(self.output_dir)),
+                'size': path.stat().st_size,
+                'sha256': file_sha256(path),
+            }
+        self.data.setdefault('stages', {})[stage] = {
+            'status': 'done',
+            'artifacts': records,
+            'info': info or {},
+            'finished_at': time.time(),
+        }
+        self.save()
+
+    def stage_info(self, stage: str) -> Dict:
+        return dict(self.data.get('stages', {}).get(stage, {}).get('info', {}))
+
+    def invalidate_from(self, stage: str):
+        """Olvida la etapa indicada y todas las posteriores"""
+        stages = self.data.setdefault('stages', {})
+        for name in STAGES[STAGES.index(stage):]:
+            stages.pop(name, None)
+        self.save()
+
+
+def convert_to_standard_wav(input_path: Path, output_path: Path):
+    """Conversión a WAV con parámetros fijos (16 bits, estéreo, 44.1kHz), por bloques y atómica"""
+    stream_to_wav(input_path, output_path, target_sr=TARGET_SR, channels=2, subtype='PCM_16')
+
+
+def _link_or_copy(source: Path, target: Path):
+    """Enlace duro si se puede (los artefactos solo se sustituyen con os.replace, nunca se
+    modifican en sitio, así que compartir el inodo es seguro); si no, copia"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ProcessingPipeline:
+    """Pipeline por etapas (ingest, separate, save_stems, transcribe, export) reanudable.
+
+    Cada etapa completada queda registrada en `.checkpoints/manifest.json` junto con el
+    tamaño y el sha256 de sus artefactos. Al relanzar sobre la misma entrada se salta
+    todo lo que sigue siendo válido; la separación además reanuda ventana a ventana.
+    """
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        get_separation_model: Callable[[], torch.nn.Module],
+        transcriber,
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        separation_preset: str = DEFAULT_PRESET,
+        lyrics_text: Optional[str] = None,
+        get_aligner: Optional[Callable[[], object]] = None,
+        memory_budget: Optional[MemoryBudget] = None,
+        get_preview_model: Optional[Callable[[], torch.nn.Module]] = None,
+        artifact_callback: Optional[Callable[[str, Dict], None]] = None,
+        get_separation_executor: Optional[Callable[[], object]] = None,
+        fingerprint_index: Optional[FingerprintIndex] = None,
+        lazy_words: bool = False,
+        derived_instrumental: bool = False,
+        input_sha256: Optional[str] = None
+    ):
+        get_preset(separation_preset)  # Validar antes de tocar nada en disco
+        self.output_dir = Path(output_dir)
+        self.separation_preset = separation_preset
+        self.get_separation_model = get_separation_model
+        # Ventanas de separación en paralelo (ParallelSeparationPool); None = en este proceso
+        self.get_separation_executor = get_separation_executor
+        self.transcriber = transcriber
+        self.progress_callback = progress_callback
+        self.should_cancel = should_cancel
+        # Con letra conocida, la etapa transcribe alinea en lugar de transcribir
+        self.lyrics_text = lyrics_text.strip() if lyrics_text and lyrics_text.strip() else None
+        self.get_aligner = get_aligner
+        if self.lyrics_text and get_aligner is None:
+            raise ValueError("Se necesita un alineador para procesar con letra conocida")
+        # Vista previa: stems rápidos publicados antes de la separación HTDemucs
+        self.get_preview_model = get_preview_model
+        self.artifact_callback = artifact_callback
+        # Transcripción solo con tiempos por segmento; las palabras se alinean después
+        # bajo demanda (src.scripts.lazy_words)
+        self.lazy_words = lazy_words
+        # Solo voces en disco: el instrumental es una receta (original - voces) que se
+        # calcula al reproducir (src.utils.derived_stems)
+        self.derived_instrumental = derived_instrumental
+        # Hash de la entrada ya calculado por quien eligió el workspace (se lee una sola vez)
+        self.input_sha256 = input_sha256
+        # Con índice, una grabación ya procesada (en otro formato) reutiliza stems y letra
+        self.fingerprint_index = fingerprint_index
+        self.memory_budget = memory_budget
+        self.memory_plan: Optional[Dict] = None
+        self.stage_memory: Dict[str, Dict] = {}
+
+        self.original_wav = self.output_dir / "original" / "song.wav"
+        self.stems_dir = self.output_dir / "stems"
+        self.lyrics_dir = self.output_dir / "lyrics"
+        self.vocals_wav = self.stems_dir / "vocals.wav"
+        self.instrumental_wav = self.stems_dir / "instrumental.wav"
+        self.instrumental_recipe = recipe_path_for(self.instrumental_wav)
+        self.preview_dir = self.stems_dir / "preview"
+        self.text_path = self.lyrics_dir / "song_lyrics.txt"
+        self.timed_path = self.lyrics_dir / "song_timed.json"
+        self.pitch_path = pitch_path_for(self.lyrics_dir)
+        self.fingerprint_path = self.output_dir / "original" / "fingerprint.npy"
+        self.result_path = self.output_dir / "result.json"
+        self.profile_dir = self.output_dir / "profile"
+
+        self.manifest = CheckpointManifest(self.output_dir)
+        self.skipped_stages: List[str] = []
+        self.reused_from: Optional[Path] = None
+        self.memory_wait_seconds = 0.0
+        self._reused_stages: List[str] = []
+        self._settings: Dict = {}
+        self._stems = None
+        self._lyrics = None
+        self._mix = None
+        self._mix_gain = 1.0
+
+    def _report(self, stage: str, fraction: float):
+        if self.should_cancel is not None and self.should_cancel():
+            raise ProcessingCancelled(f"Procesamiento cancelado en la etapa '{stage}'")
+        if self.progress_callback is not None:
+            self.progress_callback(stage, fraction)
+
+    def run(self, input_path: Union[str, Path], return_audio: bool = False) -> Dict:
+        """Ejecuta el pipeline con el workspace bloqueado; otro trabajo sobre el mismo
+        directorio falla con WorkspaceBusy en lugar de pisar sus artefactos"""
+        try:
+            with WorkspaceLock(self.output_dir):
+                # El reloj empieza con el cerrojo ya tomado (y descuenta la espera de memoria)
+                start = time.perf_counter()
+                # Releer el manifiesto ya con el cerrojo: otro trabajo pudo actualizarlo
+                self.manifest = CheckpointManifest(self.output_dir)
+                result = self._run_locked(Path(input_path), return_audio)
+                elapsed = time.perf_counter() - start - self.memory_wait_seconds
+        except ProcessingCancelled:
+            SONGS_PROCESSED.inc(status='cancelled')
+            raise
+        except Exception:
+            SONGS_PROCESSED.inc(status='failed')
+            raise
+        SONGS_PROCESSED.inc(status='done')
+        mode = self._run_mode()
+        PROCESSING_SECONDS.inc(max(0.0, elapsed), mode=mode)
+        AUDIO_SECONDS.inc(audio_duration(self.original_wav), mode=mode)
+        return result
+
+    def _run_mode(self) -> str:
+        """'processed' si esta ejecución separó la canción; si no, 'reused' (stems de otro
+        workspace) o 'resumed' (checkpoints propios). Solo la primera mide el rendimiento"""
+        if 'separate' not in self.skipped_stages:
+            return 'processed'
+        return 'reused' if self.reused_from is not None else 'resumed'
+
+    def _reset_workspace(self):
+        """Borra solo lo que genera el pipeline (nunca el resto del directorio ni el cerrojo)"""
+        for name in WORKSPACE_ENTRIES:
+            path = self.output_dir / name
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+    def _run_locked(self, input_path: Path, return_audio: bool) -> Dict:
+        settings = {
+            'separation_preset': self.separation_preset,
+            'lyrics_sha256': hashlib.sha256(self.lyrics_text.encode('utf-8')).hexdigest()
+            if self.lyrics_text else None,
+            'transcription_preset': getattr(self.transcriber, 'preset', None),
+            'lazy_words': self.lazy_words,
+            'derived_instrumental': self.derived_instrumental,
+        }
+        self._settings = settings
+        if not self.manifest.bind_input(input_path, settings, sha256=self.input_sha256):
+            # Entrada distinta (o sin checkpoints): se empieza de cero
+            self._reset_workspace()
+        for directory in (self.original_wav.parent, self.stems_dir, self.lyrics_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.manifest.save()
+
+        runners = {
+            'ingest': lambda: self._ingest(input_path),
+            'separate': self._separate,
+            'save_stems': self._save_stems,
+            'transcribe': lambda: self._transcribe(input_path),
+            'pitch': self._pitch,
+            'export': self._export,
+        }
+        # Primera etapa sin checkpoint válido: desde ahí se ejecuta todo
+        first_pending = next((i for i, stage in enumerate(STAGES) if not self.manifest.is_done(stage)),
+                             len(STAGES))
+        reservation = self._plan_memory(input_path, first_pending)
+        try:
+            with JobProfiler(self.profile_dir) as profiler:
+                for index, stage in enumerate(STAGES):
+                    if index < first_pending or stage in self._reused_stages:
+                        self.skipped_stages.append(stage)
+                        continue
+                    if index == first_pending:
+                        self.manifest.invalidate_from(stage)
+                    if stage == 'separate' and self.get_preview_model is not None:
+                        # Fuera del manifiesto: solo tiene sentido mientras falten los stems buenos
+                        self._run_stage('preview', self._preview)
+                    self._run_stage(stage, runners[stage])
+        finally:
+            if self.memory_budget is not None:
+                self.memory_budget.release(reservation)
+
+        self._report('done', 1.0)
+        result = self._build_result()
+        result['memory'] = {
+            'budget_mb': self.memory_budget.budget_mb if self.memory_budget is not None else None,
+            'plan': self.memory_plan,
+            'stages': dict(self.stage_memory),
+        }
+        if profiler.files:
+            result['profile'] = dict(profiler.files)
+        if return_audio:
+            vocals, instrumental = self._stems or self._load_saved_stems()
+            result['audio'] = {'vocals': vocals, 'instrumental': instrumental, 'sample_rate': TARGET_SR}
+        return result
+
+    def _run_stage(self, stage: str, runner: Callable[[], None]):
+        tracker = StageMemory()
+        start = time.perf_counter()
+        try:
+            with tracker, profile_region(f'stage.{stage}'):
+                runner()
+        except ProcessingCancelled:
+            raise
+        except Exception:
+            STAGE_FAILURES.inc(stage=stage)
+            raise
+        else:
+            STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+        finally:
+            # Se devuelve en result['memory']['stages']
+            self.stage_memory[stage] = tracker.stats
+
+    def _plan_memory(self, input_path: Path, first_pending: int) -> Optional[Dict]:
+        """Con presupuesto, reserva memoria antes de empezar; falla con MemoryBudgetExceeded
+        si el trabajo no puede caber"""
+        separate = first_pending <= STAGES.index('save_stems')
+        transcribe = first_pending <= STAGES.index('transcribe')
+        if self.memory_budget is None or not self.memory_budget.enabled or not (separate or transcribe):
+            return None
+        window_seconds = None
+        if separate:
+            # El modelo residente cuenta en la línea base; su segmento de entrenamiento fija
+            # el tamaño real de cada ventana
+            window_seconds = float(getattr(self.get_separation_model(), 'segment', 7.8))
+        waited = time.perf_counter()
+        plan = self.memory_budget.plan(
+            audio_duration(input_path), window_seconds, separate, transcribe,
+            on_wait=lambda: self._report('memory_wait', 0.0)
+        )
+        self.memory_wait_seconds = time.perf_counter() - waited
+        self.memory_plan = {k: v for k, v in plan.items() if k != 'reservation'}
+        return plan
+
+    # Etapas
+
+    def _ingest(self, input_path: Path):
+        self._report('convert', 0.0)
+        convert_to_standard_wav(input_path, self.original_wav)
+        write_peaks(self.original_wav)
+        write_loudness(self.original_wav)
+        save_fingerprint(self.fingerprint_path, compute_fingerprint(self.original_wav))
+        self.manifest.mark_done('ingest', {
+            'original': self.original_wav,
+            'original_peaks': peaks_path_for(self.original_wav),
+            'original_loudness': loudness_path_for(self.original_wav),
+            'fingerprint': self.fingerprint_path,
+        })
+        if self.fingerprint_index is not None:
+            self._reuse_duplicate()
+
+    def _load_fingerprint(self):
+        """Huella de la entrada; los workspaces anteriores a la huella la calculan aquí"""
+        if not self.fingerprint_path.is_file():
+            save_fingerprint(self.fingerprint_path, compute_fingerprint(self.original_wav))
+        return load_fingerprint(self.fingerprint_path)
+
+    def _reuse_duplicate(self):
+        """Si la misma grabación ya se procesó con los mismos ajustes en otro workspace,
+        enlaza sus stems, afinación y letra y marca esas etapas como hechas. Solo si empiezan
+        a la vez: con otro desfase (silencio inicial distinto, otro corte) los tiempos no
+        valdrían para esta entrada"""
+        self._report('fingerprint', 0.04)
+        matches = self.fingerprint_index.lookup(self._load_fingerprint(), exclude=self.output_dir,
+                                                max_offset_seconds=MAX_REUSE_OFFSET_SECONDS)
+        for match in matches:
+            source = Path(match['workspace'])
+            try:
+                # Con el cerrojo del origen: ningún trabajo está reescribiendo sus artefactos
+                with WorkspaceLock(source):
+                    reused = self._copy_stages_from(source)
+            except (WorkspaceBusy, OSError):
+                continue
+            if reused:
+                self.reused_from = source
+                self._reused_stages = reused
+                print(f"Grabación ya procesada en {source} (bits distintos: "
+                      f"{match['bit_error_rate']:.1%}); se reutilizan {', '.join(reused)}")
+                return
+
+    def _copy_stages_from(self, source: Path) -> List[str]:
+        manifest = CheckpointManifest(source)
+        if manifest.data.get('input', {}).get('settings') != self._settings:
+            return []
+        if not all(manifest.is_done(stage) for stage in REUSABLE_STAGES):
+            return []
+        for stage in REUSABLE_STAGES:
+            artifacts = {}
+            for name, info in manifest.data['stages'][stage].get('artifacts', {}).items():
+                target = self.output_dir / info['path']
+                _link_or_copy(source / info['path'], target)
+                artifacts[name] = target
+            self.manifest.mark_done(stage, artifacts, manifest.stage_info(stage))
+        return list(REUSABLE_STAGES)
+
+    def _publish(self, kind: str, paths: Dict[str, Path]):
+        if self.artifact_callback is not None:
+            self.artifact_callback(kind, {name: str(path) for name, path in paths.items()})
+
+    def _preview(self):
+        self._report('preview', 0.02)
+        model = self.get_preview_model()
+        device = next(model.parameters()).device
+        self._mix, self._mix_gain = load_mix(self.original_wav, return_gain=True)
+        vocals, instrumental = separate_preview(model, self._mix, device)
+        vocals_path, instrumental_path = save_stems(vocals, instrumental, self.preview_dir)
+        self._publish('preview', {
+            'original': self.original_wav,
+            'vocals': vocals_path,
+            'instrumental': instrumental_path,
+            'original_peaks': peaks_path_for(self.original_wav),
+            'vocals_peaks': peaks_path_for(vocals_path),
+            'instrumental_peaks': peaks_path_for(instrumental_path),
+        })
+
+    def _separation_pool(self) -> CheckpointPool:
+        def on_window(done: int, total: int):
+            self._report('separate', 0.05 + 0.5 * done / max(total, 1))
+        executor = self.get_separation_executor() if self.get_separation_executor is not None else None
+        return CheckpointPool(self.manifest.checkpoint_dir / "windows", on_window=on_window, executor=executor)
+
+    def _separate(self):
+        self._report('separate', 0.05)
+        model = self.get_separation_model()
+        device = next(model.parameters()).device
+        if self._mix is None:
+            self._mix, self._mix_gain = load_mix(self.original_wav, return_gain=True)
+        pool = self._separation_pool()
+        try:
+            self._stems = separate_mix(model, self._mix, device, pool=pool, preset=self.separation_preset)
+        except BaseException:
+            # No dejar ventanas de este trabajo ocupando el pool compartido
+            pool.shutdown(cancel_futures=True)
+            raise
+        if not self.derived_instrumental:
+            self._mix = None
+        self.manifest.mark_done('separate')
+
+    def _save_stems(self):
+        if self._stems is None:
+            # Separación ya registrada en una ejecución anterior: las ventanas siguen en disco
+            self._separate()
+        self._report('save_stems', 0.55)
+        vocals, instrumental = self._stems
+        # La mezcla sigue en memoria hasta aquí: el instrumental derivado se comprueba con ella
+        _, instrumental_path = save_stems(vocals, instrumental, self.stems_dir,
+                                          self.original_wav if self.derived_instrumental else None,
+                                          self._mix if self.derived_instrumental else None, self._mix_gain)
+        self._mix = None
+        artifacts = {
+            'vocals': self.vocals_wav,
+            'vocals_peaks': peaks_path_for(self.vocals_wav),
+            'instrumental_peaks': peaks_path_for(self.instrumental_wav),
+            'vocals_loudness': loudness_path_for(self.vocals_wav),
+            'instrumental_loudness': loudness_path_for(self.instrumental_wav),
+        }
+        if instrumental_path == self.instrumental_recipe:
+            artifacts.update({'instrumental_recipe': self.instrumental_recipe,
+                              'mix': self.stems_dir / MIX_FILENAME})
+        else:
+            artifacts['instrumental'] = self.instrumental_wav
+        self.manifest.mark_done('save_stems', artifacts)
+        # Las ventanas ya no hacen falta una vez publicados los stems
+        shutil.rmtree(self.manifest.checkpoint_dir / "windows", ignore_errors=True)
+        self._publish('stems', {
+            'vocals': self.vocals_wav,
+            'instrumental': instrumental_path,
+            'vocals_peaks': peaks_path_for(self.vocals_wav),
+            'instrumental_peaks': peaks_path_for(self.instrumental_wav),
+        })
+
+    def _pitch(self):
+        self._report('pitch', 0.9)
+        if self._stems is not None:
+            track = PitchTrack.from_audio(self._stems[0].numpy(), TARGET_SR)
+        else:
+            track = PitchTrack.from_file(self.vocals_wav)
+        track.save(self.pitch_path)
+        self.manifest.mark_done('pitch', {'pitch': self.pitch_path})
+
+    def _transcribe(self, input_path: Path):
+        self._report('transcribe', 0.6)
+        self._lyrics = None
+        if self.lyrics_text:
+            try:
+                self._lyrics = self.get_aligner().align_audio(
+                    audio_path=str(self.vocals_wav),
+                    lyrics=self.lyrics_text,
+                    output_dir=str(self.lyrics_dir)
+                )
+            except UnalignableLyricsError as e:
+                print(f"No se puede alinear la letra ({e}): se transcribe con Whisper")
+        if self._lyrics is None:
+            self._lyrics = self.transcriber.transcribe_audio(
+                audio_path=str(self.vocals_wav),
+                output_dir=str(self.lyrics_dir),
+                # Las etiquetas y la carpeta están en la entrada original, no en los stems
+                hint_keys=language_hint_keys(input_path),
+                word_timestamps=not self.lazy_words
+            )
+        # El idioma con el que se transcribió (pista, caché o detección): el alineado
+        # perezoso de palabras debe usar el mismo aunque el trabajo se reanude o reutilice
+        self.manifest.mark_done('transcribe', {
+            'text': self.text_path,
+            'timed': self.timed_path,
+        }, {'language': self._lyrics.get('language')})
+
+    def _export(self):
+        self._report('export', 0.95)
+        _write_json_atomic(self.result_path, self._build_result())
+        self.manifest.mark_done('export', {'result': self.result_path})
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.add(self.output_dir, self._load_fingerprint())
+
+    # Utilidades
+
+    def _load_lyrics(self) -> Dict:
+        if self._lyrics is None:
+            with open(self.text_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            with open(self.timed_path, 'r', encoding='utf-8') as f:
+                segments = json.load(f)
+            self._lyrics = {'text': text, 'segments': segments,
+                            'language': self.manifest.stage_info('transcribe').get('language')}
+        return self._lyrics
+
+    def _instrumental_path(self) -> Path:
+        """instrumental.wav o, en modo derivado (si pasó la comprobación de calidad), su receta"""
+        return self.instrumental_recipe if self.instrumental_recipe.is_file() else self.instrumental_wav
+
+    def _load_saved_stems(self):
+        vocals, _ = torchaudio.load(str(self.vocals_wav), backend="soundfile")
+        if self._instrumental_path() == self.instrumental_recipe:
+            with DerivedInstrumental(self.instrumental_recipe) as reader:
+                instrumental = torch.from_numpy(reader.read_all())
+        else:
+            instrumental, _ = torchaudio.load(str(self.instrumental_wav), backend="soundfile")
+        return vocals, instrumental
+
+    def _build_result(self) -> Dict:
+        return {
+            'original': str(self.original_wav),
+            # El instrumental puede ser una receta `.derived.json` (ver src.utils.derived_stems)
+            'stems': {
+                'vocals': str(self.vocals_wav),
+                'instrumental': str(self._instrumental_path())
+            },
+            # Pirámides de picos para dibujar la forma de onda sin leer el audio
+            'peaks': {
+                'original': str(peaks_path_for(self.original_wav)),
+                'vocals': str(peaks_path_for(self.vocals_wav)),
+                'instrumental': str(peaks_path_for(self.instrumental_wav))
+            },
+            'lyrics': {
+                'text_path': str(self.text_path),
+                'timed_path': str(self.timed_path),
+                'data': self._load_lyrics(),
+                'language': self._load_lyrics().get('language')
+            },
+            # Sonoridad integrada (LUFS) de cada pista; el reproductor la aplica como ganancia
+            'loudness': loudness_summary({
+                'original': self.original_wav,
+                'vocals': self.vocals_wav,
+                'instrumental': self.instrumental_wav
+            }),
+            # Afinación de la voz (nota MIDI cada 10 ms), ver src.utils.pitch
+            'pitch_path': str(self.pitch_path),
+            # SDR del instrumental derivado frente a la suma de stems del modelo (None = WAV)
+            'instrumental_quality': (read_recipe(self.instrumental_recipe).get('quality')
+                                     if self._instrumental_path() == self.instrumental_recipe else None),
+            'resumed_stages': list(self.skipped_stages),
+            # Workspace de otra copia de la misma grabación del que se tomaron los stems y la letra
+            'reused_from': str(self.reused_from) if self.reused_from else None
+        }
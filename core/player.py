@@ -1,14 +1,46 @@
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtCore import QUrl, QTimer, pyqtSignal, QObject
+from PyQt5.QtCore import QIODevice, QUrl, QTimer, pyqtSignal, QObject
 from PyQt5.QtWidgets import QMessageBox
 import os
 import json
 from pathlib import Path
-from typing import List, Dict
-import tempfile
+from typing import List, Dict, Optional
 from pydub import AudioSegment
+from src.utils.derived_stems import DerivedWavStream, audio_path_for, is_derived
+from src.utils.files import new_temp_file
+from src.utils.loudness import playback_gain_db, read_loudness
+from src.utils.pitch import PitchTrack
+from src.scripts.lazy_words import load_word_timings
 import time
 
+class DerivedAudioDevice(QIODevice):
+    """Instrumental derivado (original - voces) como flujo WAV de acceso aleatorio para
+    QMediaPlayer: cada lectura calcula solo los bytes pedidos a partir de `pos()`"""
+
+    def __init__(self, recipe_path: str, parent=None):
+        super().__init__(parent)
+        self._stream = DerivedWavStream(recipe_path)
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+
+    def isSequential(self) -> bool:
+        return False
+
+    def size(self) -> int:
+        return self._stream.size
+
+    def bytesAvailable(self) -> int:
+        return max(0, self._stream.size - self.pos()) + super().bytesAvailable()
+
+    def readData(self, maxlen: int) -> bytes:
+        return self._stream.read_range(self.pos(), maxlen)
+
+    def writeData(self, data) -> int:
+        return -1
+
+    def close(self):
+        super().close()
+        self._stream.close()
+
 class KaraokePlayer(QMediaPlayer):
     lyrics_updated = pyqtSignal(str, float, list)  # palabra_actual, tiempo_actual, contexto
     position_changed = pyqtSignal(float)
@@ -16,14 +48,21 @@ class KaraokePlayer(QMediaPlayer):
     def __init__(self, parent=None):
         super().__init__(parent)
         self._timed_lyrics: List[Dict] = []
+        self._segments: List[Dict] = []  # segmentos con texto y tiempos; 'words' None = sin alinear
         self._current_segment_index: int = 0
         self._lyrics_update_timer = QTimer(self)
         self._lyrics_update_timer.setInterval(100)  # 100ms
         self._lyrics_update_timer.timeout.connect(self._update_lyrics_display)
         self._temp_files = []
+        self._pending_seek = None  # posición a restaurar tras un cambio de archivo en caliente
+        self._stream_device: Optional[DerivedAudioDevice] = None  # instrumental derivado en curso
+        self._pitch: Optional[PitchTrack] = None
+        self._volume = 100  # volumen elegido por el usuario, antes de la ganancia de sonoridad
+        self._gain_db = 0.0
         
         self.positionChanged.connect(self._handle_position_changed)
         self.stateChanged.connect(self._handle_state_change)
+        self.mediaStatusChanged.connect(self._handle_media_status)
     
     def __del__(self):
         """Limpiar archivos temporales"""
@@ -44,6 +83,52 @@ class KaraokePlayer(QMediaPlayer):
             self._current_segment_index = 0
             self.lyrics_updated.emit("", 0.0, [])
 
+    def _handle_media_status(self, status):
+        """Aplica la posición pendiente de swap_audio en cuanto el nuevo archivo está cargado"""
+        if self._pending_seek is not None and status in (QMediaPlayer.LoadedMedia, QMediaPlayer.BufferedMedia):
+            position, self._pending_seek = self._pending_seek, None
+            self.setPosition(position)
+
+    def setVolume(self, volume: int):
+        """Volumen del usuario (0-100); se combina con la ganancia de sonoridad de la pista"""
+        self._volume = max(0, min(100, int(volume)))
+        super().setVolume(round(self._volume * 10 ** (self._gain_db / 20)))
+
+    def _apply_loudness(self, audio_path: str):
+        """Iguala la sonoridad con la medida guardada junto al audio, sin reescribirlo.
+        Pistas sin medición suenan a volumen nominal"""
+        self._gain_db = playback_gain_db(read_loudness(audio_path_for(audio_path)))
+        self.setVolume(self._volume)
+
+    def _set_source(self, audio_path: str):
+        """setMedia con un archivo o, si es una receta de instrumental derivado, con su flujo"""
+        previous = self._stream_device
+        url = QUrl.fromLocalFile(str(audio_path))
+        if is_derived(audio_path):
+            self._stream_device = DerivedAudioDevice(str(audio_path), self)
+            self.setMedia(QMediaContent(url), self._stream_device)
+        else:
+            self._stream_device = None
+            self.setMedia(QMediaContent(url))
+        if previous is not None:
+            previous.close()
+            previous.deleteLater()
+
+    def swap_audio(self, audio_path: str) -> bool:
+        """Cambia a otro archivo de la misma canción sin cortar la sesión: conserva la
+        posición y, si estaba sonando, sigue sonando (p. ej. al llegar el stem de HTDemucs)"""
+        if not Path(audio_path).exists():
+            return False
+        state = self.state()
+        self._pending_seek = self.position() if state != QMediaPlayer.StoppedState else None
+        self._apply_loudness(audio_path)
+        self._set_source(audio_path)
+        if state == QMediaPlayer.PlayingState:
+            self.play()
+        elif state == QMediaPlayer.PausedState:
+            super().pause()
+        return True
+
     def load_audio(self, audio_path: str) -> bool:
         """Carga y convierte el audio a formato compatible"""
         try:
@@ -56,9 +141,17 @@ class KaraokePlayer(QMediaPlayer):
             if not os.access(audio_path, os.R_OK):
                 QMessageBox.warning(None, "Error", "No hay permisos para leer el archivo")
                 return False
+
+            # La medición va junto al archivo original, no al WAV temporal de reproducción
+            self._apply_loudness(audio_path)
             
+            if is_derived(path):
+                # Instrumental sin WAV en disco: se calcula al vuelo desde original y voces
+                self._set_source(audio_path)
+                return True
+
             if path.suffix.lower() not in ['.wav', '.mp3']:
-                temp_wav = Path(tempfile.mktemp(suffix='.wav'))
+                temp_wav = new_temp_file(prefix="lyraoke_play_", suffix='.wav')
                 try:
                     AudioSegment.from_file(path).export(temp_wav, format="wav")
                     self._temp_files.append(temp_wav)
@@ -69,8 +162,7 @@ class KaraokePlayer(QMediaPlayer):
             
             time.sleep(0.5)  # Esperar para asegurar disponibilidad
             
-            content = QMediaContent(QUrl.fromLocalFile(audio_path))
-            self.setMedia(content)
+            self._set_source(audio_path)
             
             if self.mediaStatus() == QMediaPlayer.InvalidMedia:
                 QMessageBox.warning(None, "Error", "Formato de audio no soportado")
@@ -82,7 +174,9 @@ class KaraokePlayer(QMediaPlayer):
             return False
 
     def load_timed_lyrics_from_json(self, json_path: str) -> bool:
-        """Carga letras temporizadas desde archivo JSON con manejo robusto de errores"""
+        """Carga letras temporizadas desde archivo JSON con manejo robusto de errores.
+        Los segmentos sin palabras (transcripción perezosa) se resaltan por línea hasta que
+        llegan sus palabras, de `song_words.json` o de `set_segment_words`"""
         try:
             with open(json_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -90,50 +184,118 @@ class KaraokePlayer(QMediaPlayer):
                 if not isinstance(data, list):
                     raise ValueError("El archivo JSON no contiene una lista de segmentos")
                 
-                self._timed_lyrics = []
-                for segment in data:
+                aligned = load_word_timings(json_path)
+                self._segments = []
+                for index, segment in enumerate(data):
                     if not isinstance(segment, dict):
                         continue
                     
-                    if 'words' not in segment or not isinstance(segment['words'], list):
-                        continue
-                    
                     segment_text = segment.get('text', '').strip()
                     if not segment_text:
                         continue
                     
-                    for word in segment['words']:
-                        if not isinstance(word, dict):
-                            continue
-                        
-                        if 'word' not in word or 'start' not in word:
-                            continue
-                        
-                        try:
-                            start = float(word['start'])
-                            end = float(word.get('end', start + 1.0))
-                            clean_word = {
-                                'word': str(word['word']).strip(),
-                                'start': start,
-                                'end': end,
-                                'segment_text': segment_text
-                            }
-                            if clean_word['word']:
-                                self._timed_lyrics.append(clean_word)
-                        except (TypeError, ValueError):
-                            continue
+                    try:
+                        start = float(segment['start'])
+                        end = float(segment['end'])
+                    except (KeyError, TypeError, ValueError):
+                        start = end = None
+                    words = segment.get('words') or aligned.get(index)
+                    self._segments.append({
+                        'index': index,
+                        'text': segment_text,
+                        'start': start,
+                        'end': end,
+                        'words': words if isinstance(words, list) else None
+                    })
                 
+                self._rebuild_timeline()
                 if not self._timed_lyrics:
                     raise ValueError("El archivo no contiene palabras válidas con tiempos")
                 
-                self._timed_lyrics.sort(key=lambda x: x['start'])
                 self._current_segment_index = 0
+                # Las letras pueden llegar con la canción ya sonando (vista previa)
+                if self.state() == QMediaPlayer.PlayingState:
+                    self._lyrics_update_timer.start()
                 return True
                 
         except Exception as e:
             QMessageBox.warning(None, "Error", f"No se pudieron cargar las letras: {str(e)}")
             return False
 
+    def _rebuild_timeline(self):
+        """Lista ordenada de lo que se resalta: palabras o, sin ellas, la línea completa"""
+        self._timed_lyrics = []
+        for segment in self._segments:
+            segment_text = segment['text']
+            words = []
+            for word in segment['words'] or []:
+                if not isinstance(word, dict):
+                    continue
+                
+                if 'word' not in word or 'start' not in word:
+                    continue
+                
+                try:
+                    start = float(word['start'])
+                    end = float(word.get('end', start + 1.0))
+                    clean_word = {
+                        'word': str(word['word']).strip(),
+                        'start': start,
+                        'end': end,
+                        'segment_text': segment_text
+                    }
+                    if clean_word['word']:
+                        words.append(clean_word)
+                except (TypeError, ValueError):
+                    continue
+            
+            if not words and segment['start'] is not None:
+                # Resaltado por línea: la "palabra" es el segmento entero
+                words = [{
+                    'word': segment_text,
+                    'start': segment['start'],
+                    'end': segment['end'],
+                    'segment_text': segment_text
+                }]
+            self._timed_lyrics.extend(words)
+        self._timed_lyrics.sort(key=lambda x: x['start'])
+
+    def set_segment_words(self, segment_index: int, words: List[Dict]):
+        """Sustituye el resaltado por línea de un segmento por sus palabras recién alineadas"""
+        for segment in self._segments:
+            if segment['index'] == segment_index:
+                segment['words'] = words
+                self._rebuild_timeline()
+                return
+
+    def load_pitch_track(self, pitch_path: str) -> bool:
+        """Carga la afinación de la voz (song_pitch.npz) de la canción actual"""
+        try:
+            self._pitch = PitchTrack.load(pitch_path)
+            return True
+        except Exception as e:
+            print(f"Info: No se pudo cargar la afinación: {str(e)}")
+            self._pitch = None
+            return False
+
+    def pitch_at(self, position_ms: Optional[int] = None) -> Optional[float]:
+        """Nota MIDI que se canta en la posición dada (por defecto, la actual); None si
+        no hay voz o no hay afinación cargada. Acceso directo por índice, O(1)"""
+        if self._pitch is None:
+            return None
+        if position_ms is None:
+            position_ms = self.position()
+        return self._pitch.at(position_ms / 1000)
+
+    def clear_lyrics(self):
+        """Olvida las letras y la afinación cargadas (canción nueva aún sin procesar)"""
+        self._pitch = None
+        self._segments = []
+        self._timed_lyrics = []
+        self._current_segment_index = 0
+        self._lyrics_update_timer.stop()
+        self.lyrics_updated.emit("", 0.0, [])
+
     def play(self):
         """Inicia reproducción con sincronización de letras"""
         super().play()
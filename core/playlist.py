@@ -0,0 +1,112 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from core.worker_process import ProcessingWorker
+
+PREFETCH_LOOKAHEAD = 2
+
+
+class PlaylistItem:
+    def __init__(self, path: Path, output_dir: Path):
+        self.path = path
+        self.output_dir = output_dir
+        self.status = 'pending'  # pending, processing, ready, failed
+        self.job_id: Optional[int] = None
+        self.progress = 0.0
+        self.result: Optional[Dict] = None
+        self.artifacts: Dict[str, Dict] = {}  # 'preview' / 'stems' -> rutas publicadas por el worker
+        self.error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+
+class Playlist:
+    """Cola de canciones de la sesión de karaoke.
+
+    Además de la canción actual, mantiene enviadas al worker las `lookahead`
+    siguientes para que estén separadas y transcritas antes de que termine la actual.
+    """
+
+    def __init__(self, worker: ProcessingWorker, output_root: Union[str, Path] = "output/playlist",
+                 lookahead: int = PREFETCH_LOOKAHEAD, preview: bool = True, lazy_words: bool = True,
+                 derived_instrumental: bool = False):
+        self.worker = worker
+        self.output_root = Path(output_root)
+        self.lookahead = max(0, lookahead)
+        # La canción actual pide vista previa rápida; las de prefetch tienen tiempo de sobra
+        self.preview = preview
+        # Letra con tiempos por línea en cuanto se transcribe; las palabras llegan después
+        self.lazy_words = lazy_words
+        # Solo voces en disco; el reproductor calcula el instrumental (original - voces)
+        self.derived_instrumental = derived_instrumental
+        self.items: List[PlaylistItem] = []
+        self.current_index = -1
+
+    def add(self, path: Union[str, Path]) -> PlaylistItem:
+        """Añade una canción al final de la cola y lanza el prefetch si entra en la ventana"""
+        path = Path(path)
+        slug = re.sub(r'[^\w-]+', '_', path.stem).strip('_') or 'song'
+        item = PlaylistItem(path, self.output_root / f"{len(self.items):03d}_{slug}")
+        self.items.append(item)
+        if self.current_index < 0:
+            self.current_index = 0
+        self.schedule()
+        return item
+
+    def current(self) -> Optional[PlaylistItem]:
+        if 0 <= self.current_index < len(self.items):
+            return self.items[self.current_index]
+        return None
+
+    def upcoming(self) -> List[PlaylistItem]:
+        return self.items[self.current_index + 1:] if self.current_index >= 0 else []
+
+    def has_next(self) -> bool:
+        return self.current_index + 1 < len(self.items)
+
+    def advance(self) -> Optional[PlaylistItem]:
+        """Pasa a la siguiente canción y amplía la ventana de prefetch"""
+        if not self.has_next():
+            return None
+        self.current_index += 1
+        self.schedule()
+        return self.current()
+
+    def set_lookahead(self, lookahead: int):
+        self.lookahead = max(0, lookahead)
+        self.schedule()
+
+    def schedule(self):
+        """Envía al worker las canciones de la ventana [actual, actual + lookahead] aún sin procesar"""
+        if self.current_index < 0:
+            return
+        end = min(len(self.items), self.current_index + self.lookahead + 1)
+        for item in self.items[self.current_index:end]:
+            if item.status == 'pending':
+                preview = self.preview and item is self.current()
+                item.job_id = self.worker.submit(item.path, item.output_dir, preview=preview,
+                                                 lazy_words=self.lazy_words,
+                                                 derived_instrumental=self.derived_instrumental)
+                item.status = 'processing'
+
+    def handle_event(self, kind: str, job_id: Optional[int], data) -> Optional[PlaylistItem]:
+        """Aplica un evento del worker al elemento correspondiente y lo devuelve"""
+        item = next((i for i in self.items if i.job_id is not None and i.job_id == job_id), None)
+        if item is None:
+            return None
+        if kind == 'progress':
+            item.progress = data[1]
+        elif kind == 'artifacts':
+            artifact_kind, paths = data
+            item.artifacts[artifact_kind] = paths
+        elif kind == 'result':
+            item.status = 'ready'
+            item.progress = 1.0
+            item.result = data
+        elif kind in ('error', 'cancelled'):
+            item.status = 'failed'
+            item.error = data or 'Cancelado'
+        return item
@@ -0,0 +1,184 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+
+def _worker_main(requests, events, cancel_event, model_size: Optional[str], nice: int = 0,
+                 num_threads: Optional[int] = None, transcription_preset: Optional[str] = None,
+                 playback_job=None, playback_position=None):
+    """Bucle del proceso worker: mantiene los modelos cargados y procesa trabajos en serie.
+    Las palabras de los trabajos con `lazy_words` se alinean en un hilo aparte, empezando
+    por la canción y la posición que indican `playback_job`/`playback_position`"""
+    # Prioridad reducida para no competir con la reproducción en curso
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+
+    # Importación diferida: torch y los modelos solo viven en el proceso worker
+    import torch
+    from core.audio_processor import AudioProcessor, ProcessingCancelled
+    from src.scripts.lazy_words import LazyWordAligner, WordAlignmentScheduler
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    try:
+        processor = AudioProcessor(model_size=model_size, preload_separator=True,
+                                   transcription_preset=transcription_preset)
+    except Exception as e:
+        events.put(('fatal', None, str(e)))
+        return
+    events.put(('ready', None, None))
+
+    def playback():
+        if playback_job is None:
+            return None, 0.0
+        return playback_job.value, playback_position.value
+
+    words = WordAlignmentScheduler(
+        playback, lambda job_id, index, segment_words: events.put(('words', job_id, (index, segment_words)))
+    )
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        job_id, input_path, output_dir, options = request
+        cancel_event.clear()
+
+        def progress(stage, fraction, job_id=job_id):
+            events.put(('progress', job_id, (stage, fraction)))
+
+        def artifacts(kind, paths, job_id=job_id):
+            events.put(('artifacts', job_id, (kind, paths)))
+
+        try:
+            result = processor.process_audio(
+                input_path,
+                output_dir,
+                progress_callback=progress,
+                should_cancel=cancel_event.is_set,
+                artifact_callback=artifacts,
+                **options
+            )
+            events.put(('result', job_id, result))
+            if options.get('lazy_words'):
+                words.add(job_id, LazyWordAligner(processor.transcriber, result['stems']['vocals'],
+                                                  result['lyrics']['timed_path'],
+                                                  result['lyrics']['language']))
+        except ProcessingCancelled:
+            events.put(('cancelled', job_id, None))
+        except Exception as e:
+            events.put(('error', job_id, str(e)))
+    words.stop()
+
+
+class ProcessingWorker:
+    """Proceso persistente que aloja el pipeline de separación y transcripción.
+
+    La comunicación es por colas: se envían peticiones y se reciben eventos
+    `(tipo, job_id, datos)` con tipo en ready, progress, artifacts, result, words, error,
+    cancelled o fatal. `artifacts` lleva `(tipo, rutas)`: stems de vista previa o definitivos.
+    `words` lleva `(índice de segmento, palabras)` de los trabajos con `lazy_words`.
+    `nice` y `num_threads` limitan la CPU que el worker quita a la reproducción.
+    """
+
+    def __init__(self, model_size: Optional[str] = None, nice: int = 0, num_threads: Optional[int] = None,
+                 transcription_preset: Optional[str] = None):
+        self.model_size = model_size
+        self.transcription_preset = transcription_preset
+        self.nice = nice
+        self.num_threads = num_threads
+        self._ctx = mp.get_context('spawn')
+        self._process = None
+        self._requests = None
+        self._events = None
+        self._cancel_event = None
+        self._playback_job = None
+        self._playback_position = None
+        self._ids = itertools.count(1)
+        self._pending: List[int] = []
+
+    def start(self):
+        """Arranca el proceso worker (la carga de modelos ocurre en segundo plano)"""
+        if self.is_alive():
+            return
+        self._requests = self._ctx.Queue()
+        self._events = self._ctx.Queue()
+        self._cancel_event = self._ctx.Event()
+        self._playback_job = self._ctx.Value('q', 0, lock=False)
+        self._playback_position = self._ctx.Value('d', 0.0, lock=False)
+        self._pending = []
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._requests, self._events, self._cancel_event, self.model_size,
+                  self.nice, self.num_threads, self.transcription_preset,
+                  self._playback_job, self._playback_position),
+            name="lyraoke-worker",
+            daemon=True
+        )
+        self._process.start()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def submit(self, input_path: Union[str, Path], output_dir: Optional[Union[str, Path]] = None,
+               **options) -> int:
+        """Encola un trabajo y devuelve su identificador. `options` se pasan a process_audio
+        (p. ej. separation_preset o lyrics_text)"""
+        if not self.is_alive():
+            self.start()
+        job_id = next(self._ids)
+        self._pending.append(job_id)
+        self._requests.put((job_id, str(input_path), str(output_dir) if output_dir else None, options))
+        return job_id
+
+    def set_playback(self, job_id: Optional[int], position: float):
+        """Canción que suena y su posición (s): orienta la alineación perezosa de palabras"""
+        if self._playback_job is not None:
+            self._playback_job.value = job_id or 0
+            self._playback_position.value = position
+
+    def cancel(self, force: bool = False):
+        """Cancela el trabajo en curso. Con `force` reinicia el worker (se pierden los modelos cargados)"""
+        if force:
+            lost = list(self._pending)
+            self.stop(timeout=0)
+            self.start()
+            for job_id in lost:
+                self._events.put(('cancelled', job_id, None))
+        elif self._cancel_event is not None:
+            self._cancel_event.set()
+
+    def poll_events(self) -> List[Tuple[str, Optional[int], object]]:
+        """Devuelve sin bloquear los eventos recibidos desde la última llamada"""
+        events = []
+        if self._events is None:
+            return events
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] in ('result', 'error', 'cancelled') and event[1] in self._pending:
+                self._pending.remove(event[1])
+            events.append(event)
+        if not events and self._process is not None and not self._process.is_alive() and self._pending:
+            # El worker murió (p. ej. OOM): informar de los trabajos perdidos
+            events = [('error', job_id, "El proceso de procesamiento terminó inesperadamente")
+                      for job_id in self._pending]
+            self._pending = []
+        return events
+
+    def stop(self, timeout: float = 5.0):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+        self._process = None
@@ -0,0 +1,89 @@
+from core.audio_processor import AudioProcessor
+from core.job_service import DEFAULT_MAX_UPLOAD_MB, JobService, create_server
+from src.scripts.separate import DEFAULT_MAX_WAIT
+from src.utils import metrics, profiling
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Servicio HTTP local de procesamiento Lyraoke (sin interfaz gráfica)',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección de escucha")
+    parser.add_argument("--port", default=8765, type=int, help="Puerto (0 = libre)")
+    parser.add_argument("--workers", default=1, type=int, help="Trabajos procesados en paralelo")
+    parser.add_argument("--max-queue", default=32, type=int, help="Trabajos en espera antes de rechazar")
+    parser.add_argument("--max-upload-mb", default=DEFAULT_MAX_UPLOAD_MB, type=float,
+                        help="Tamaño máximo de cada subida; las mayores se rechazan con 413")
+    parser.add_argument("--output", default="output/jobs", help="Directorio raíz de los trabajos")
+    parser.add_argument("--model-size", default=None,
+                        help="Tamaño del modelo Whisper (por defecto, el del preset de transcripción)")
+    parser.add_argument("--transcription-preset", default=None, choices=["fast", "balanced", "accurate"],
+                        help="Velocidad/precisión de la transcripción (por defecto balanced)")
+    parser.add_argument("--separation-workers", default=1, type=int,
+                        help="Procesos para separar en paralelo las ventanas de HTDemucs (solo CPU)")
+    parser.add_argument("--separation-batch", default=1, type=int,
+                        help="Ventanas de HTDemucs (de cualquier canción en cola) por pasada del modelo")
+    parser.add_argument("--separation-max-wait", default=DEFAULT_MAX_WAIT, type=float,
+                        help="Segundos que espera un lote incompleto antes de ejecutarse")
+    parser.add_argument("--transcription-workers", default=1, type=int,
+                        help="Procesos para transcribir en paralelo los trozos de cada canción (solo CPU)")
+    parser.add_argument("--derived-instrumental", action="store_true",
+                        help="Guardar solo las voces; el instrumental se calcula como original - voces")
+    parser.add_argument("--convert-models", action="store_true",
+                        help="Guardar en models/ los checkpoints mapeables que falten (arranques más rápidos)")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="No reutilizar resultados de otras copias de la misma canción")
+    parser.add_argument("--profile", default=None,
+                        help="Perfilar cada trabajo: torch, cprofile o torch,cprofile "
+                             f"(también vía {profiling.PROFILE_ENV})")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Escribir también las métricas (formato Prometheus) en este archivo")
+    parser.add_argument("--metrics-interval", default=metrics.DEFAULT_WRITE_INTERVAL, type=float,
+                        help="Segundos entre escrituras del archivo de métricas")
+    parser.add_argument("--memory-budget-mb", default=None, type=float,
+                        help="Memoria máxima del proceso; los trabajos que no quepan esperan o fallan")
+    args = parser.parse_args()
+    if args.separation_workers > 1 and args.separation_batch > 1:
+        parser.error("--separation-workers y --separation-batch no se pueden combinar")
+    if args.profile is not None:
+        # Antes de cargar los modelos, para que se instalen las regiones de Whisper
+        profiling.configure(args.profile)
+
+    # Modelos residentes durante toda la vida del servicio
+    processor = AudioProcessor(model_size=args.model_size, preload_separator=True,
+                               memory_budget_mb=args.memory_budget_mb,
+                               transcription_preset=args.transcription_preset,
+                               transcription_workers=args.transcription_workers,
+                               separation_workers=args.separation_workers,
+                               separation_batch=args.separation_batch,
+                               separation_max_wait=args.separation_max_wait,
+                               deduplicate=not args.no_dedup,
+                               derived_instrumental=args.derived_instrumental,
+                               convert_models=args.convert_models)
+    service = JobService(processor, args.output, workers=args.workers, max_queue=args.max_queue,
+                         max_upload_mb=args.max_upload_mb)
+    service.start()
+    # Las métricas también se sirven en GET /metrics
+    metrics_writer = None
+    if args.metrics_file:
+        metrics_writer = metrics.MetricsFileWriter(args.metrics_file, args.metrics_interval).start()
+
+    server = create_server(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Servicio Lyraoke escuchando en http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        processor.close()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
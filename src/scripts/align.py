@@ -0,0 +1,220 @@
+import torch
+import torchaudio
+from pathlib import Path
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+from src.utils.audio_stream import read_audio
+from src.utils.files import atomic_write_json, atomic_write_text
+from src.utils.profiling import instrument_module, profile_region
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STAR = '*'
+CHUNK_SECONDS = 30
+CONTEXT_SECONDS = 1
+MIN_ALIGNABLE_FRACTION = 0.5   # por debajo, la letra no se puede alinear con MMS_FA
+
+# Letras latinas que NFKD no descompone en base + diacrítico
+_LATIN_LETTERS = str.maketrans({
+    'ß': 'ss', 'æ': 'ae', 'œ': 'oe', 'ø': 'o', 'đ': 'd', 'ð': 'd', 'þ': 'th', 'ł': 'l', 'ı': 'i',
+})
+_uroman = None
+
+
+class UnalignableLyricsError(ValueError):
+    """La letra no tiene suficientes palabras representables en el alfabeto del alineador"""
+
+
+def _romanize(text: str) -> str:
+    """Transcripción al alfabeto latino con uroman (la que espera MMS_FA), si está
+    instalado; sin él solo se conservan las escrituras latinas"""
+    global _uroman
+    if _uroman is None:
+        try:
+            import uroman
+            _uroman = uroman.Uroman()
+        except ImportError:
+            _uroman = False
+    return _uroman.romanize_string(text) if _uroman else text
+
+
+def _is_latin(char: str) -> bool:
+    return char < '\u0250' or '\u1e00' <= char <= '\u1eff'
+
+
+def normalize_word(word: str) -> str:
+    """Reduce una palabra al alfabeto del alineador MMS (a-z y apóstrofo, sin tildes),
+    romanizando antes las escrituras no latinas"""
+    word = word.lower().translate(_LATIN_LETTERS)
+    if not all(_is_latin(c) for c in word if c.isalpha()):
+        word = _romanize(word).lower().translate(_LATIN_LETTERS)
+    decomposed = unicodedata.normalize('NFKD', word)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r"[^a-z']", '', stripped)
+
+
+class LyricsAligner:
+    """Alineación forzada (CTC) de una letra conocida contra el stem de voces.
+
+    Usa el modelo MMS_FA de torchaudio: una sola pasada del encoder wav2vec2 y un
+    Viterbi sobre la letra, en lugar de la decodificación autoregresiva de Whisper.
+    """
+
+    def __init__(self, device: Optional[str] = None):
+        logger.info("Inicializando alineador MMS_FA")
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        bundle = torchaudio.pipelines.MMS_FA
+        self.sample_rate = bundle.sample_rate
+        self.model = bundle.get_model(with_star=True).to(self.device).eval()
+        self.tokenizer = bundle.get_tokenizer()
+        self.aligner = bundle.get_aligner()
+        # Un AudioProcessor compartido (servicio con varios workers) alinea desde varios hilos
+        self._lock = threading.Lock()
+        instrument_module(self.model, 'align.emission')
+        logger.info(f"✅ Alineador cargado en {self.device}")
+
+    def align_audio(self, audio_path: str, lyrics: str, output_dir: str = None) -> Dict:
+        """Devuelve {'text', 'segments'} con el mismo formato que la transcripción"""
+        try:
+            if not Path(audio_path).exists():
+                raise FileNotFoundError(f"Archivo no encontrado: {audio_path}")
+
+            lines = [line.strip() for line in lyrics.splitlines() if line.strip()]
+            if not lines:
+                raise ValueError("La letra está vacía")
+
+            audio, _ = read_audio(audio_path, target_sr=self.sample_rate, channels=1)
+            waveform = torch.from_numpy(audio)
+            with self._lock:
+                emission = self._emission(waveform)
+                seconds_per_frame = waveform.shape[-1] / emission.shape[0] / self.sample_rate
+                segments = self._align_lines(lines, emission, seconds_per_frame)
+            processed = {
+                'text': ' '.join(lines),
+                'segments': segments
+            }
+
+            if output_dir:
+                self._save_results(processed, Path(output_dir), lyrics)
+
+            return processed
+
+        except Exception as e:
+            logger.error(f"Error en alineación: {str(e)}")
+            raise
+
+    @torch.inference_mode()
+    def _emission(self, waveform: torch.Tensor) -> torch.Tensor:
+        """Log-probabilidades por frame, calculadas en ventanas con contexto para acotar memoria"""
+        total = waveform.shape[-1]
+        chunk = CHUNK_SECONDS * self.sample_rate
+        context = CONTEXT_SECONDS * self.sample_rate
+        pieces = []
+        for start in range(0, total, chunk):
+            left = max(0, start - context)
+            right = min(total, start + chunk + context)
+            emission, _ = self.model(waveform[:, left:right].to(self.device))
+            frames_per_sample = emission.shape[1] / (right - left)
+            first = int(round((start - left) * frames_per_sample))
+            count = int(round(min(chunk, total - start) * frames_per_sample))
+            pieces.append(emission[0, first:first + count].cpu())
+        return torch.cat(pieces)
+
+    def _align_lines(self, lines: List[str], emission: torch.Tensor, seconds_per_frame: float) -> List[Dict]:
+        # Palabras alineables; el comodín absorbe intros, coros fuera de letra e instrumentales
+        entries = []  # (línea, palabra original, palabra normalizada o None)
+        for line_index, line in enumerate(lines):
+            for word in line.split():
+                entries.append((line_index, word, normalize_word(word) or None))
+        alignable = sum(1 for _, _, normalized in entries if normalized)
+        if alignable < MIN_ALIGNABLE_FRACTION * len(entries):
+            # Sin esto el Viterbi solo vería comodines y todos los tiempos quedarían a 0
+            raise UnalignableLyricsError(
+                f"Solo {alignable} de {len(entries)} palabras de la letra son alineables "
+                f"(¿escritura no latina sin uroman instalado?)")
+
+        transcript = [STAR]
+        for _, _, normalized in entries:
+            if normalized:
+                transcript.append(normalized)
+        transcript.append(STAR)
+
+        with profile_region('align.viterbi'):
+            spans = self.aligner(emission, self.tokenizer(transcript))
+        spans = [s for word, s in zip(transcript, spans) if word != STAR]
+
+        timings = []
+        span_iter = iter(spans)
+        for _, _, normalized in entries:
+            if normalized:
+                word_spans = next(span_iter)
+                timings.append((
+                    word_spans[0].start * seconds_per_frame,
+                    word_spans[-1].end * seconds_per_frame,
+                    sum(s.score for s in word_spans) / len(word_spans)
+                ))
+            else:
+                timings.append(None)
+        timings = self._fill_unaligned(timings)
+
+        segments: List[Dict] = []
+        for (line_index, word, _), (start, end, probability) in zip(entries, timings):
+            if not segments or segments[-1]['line'] != line_index:
+                segments.append({'line': line_index, 'text': ' ' + lines[line_index], 'words': []})
+            segments[-1]['words'].append({
+                'word': ' ' + word,
+                'start': round(start, 2),
+                'end': round(end, 2),
+                'probability': round(probability, 3)
+            })
+
+        for i, segment in enumerate(segments):
+            del segment['line']
+            segment['id'] = i
+            segment['start'] = segment['words'][0]['start']
+            segment['end'] = segment['words'][-1]['end']
+        return segments
+
+    @staticmethod
+    def _fill_unaligned(timings: List[Optional[tuple]]) -> List[tuple]:
+        """Palabras sin letras alineables (p. ej. números) toman el hueco entre sus vecinas"""
+        filled = list(timings)
+        for i, timing in enumerate(filled):
+            if timing is not None:
+                continue
+            previous_end = next((filled[j][1] for j in range(i - 1, -1, -1) if filled[j]), 0.0)
+            next_start = next((t[0] for t in timings[i + 1:] if t), previous_end)
+            filled[i] = (previous_end, max(previous_end, next_start), 0.0)
+        return filled
+
+    def _save_results(self, result: Dict, output_dir: Path, lyrics: str):
+        """Guarda resultados con los mismos nombres fijos que LyricsTranscriber"""
+        output_dir.mkdir(exist_ok=True)
+
+        atomic_write_text(output_dir / "song_lyrics.txt", lyrics)
+        atomic_write_json(output_dir / "song_timed.json", result.get('segments', []))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Alinea una letra conocida con el stem de voces',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--vocals", required=True, type=Path, help="Stem de voces")
+    parser.add_argument("--lyrics", required=True, type=Path, help="Archivo de texto con la letra")
+    parser.add_argument("--output", default=None, type=Path, help="Directorio de salida")
+    args = parser.parse_args()
+
+    aligner = LyricsAligner()
+    result = aligner.align_audio(str(args.vocals), args.lyrics.read_text(encoding='utf-8'),
+                                 str(args.output) if args.output else None)
+    print(f"Segmentos alineados: {len(result['segments'])}")
@@ -0,0 +1,828 @@
+"""Mediciones de coste/calidad del pipeline en la máquina local.
+
+Uso:
+    python -m src.scripts.benchmark presets --input cancion.wav [--reference-vocals vocals.wav]
+    python -m src.scripts.benchmark presets --track musdb18hq/test/<pista>
+    python -m src.scripts.benchmark separate-parallel --input cancion.wav --workers 1 2 4 8
+    python -m src.scripts.benchmark separate-batch --inputs a.wav b.wav c.wav --batch-sizes 1 2 4 8
+    python -m src.scripts.benchmark stem-storage --input cancion.mp3
+    python -m src.scripts.benchmark live --input cancion.wav --configs 0.25:0.1 0.5:0.25 1:0.5
+    python -m src.scripts.benchmark transcribe-batch --inputs a/vocals.wav b/vocals.wav ...
+    python -m src.scripts.benchmark transcribe-presets --input vocals.wav [--reference-lyrics letra.txt]
+    python -m src.scripts.benchmark transcribe-parallel --input vocals.wav --workers 1 4 8
+    python -m src.scripts.benchmark align --vocals vocals.wav --lyrics letra.txt
+    python -m src.scripts.benchmark stress --inputs a.mp3 b.mp3 --jobs 6 --concurrency 3
+    python -m src.scripts.benchmark cold-start --whisper medium
+"""
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import torch
+import torchaudio
+
+from src.scripts.separate import (
+    load_custom_model, load_mix, save_stems, separate_mix, MODEL_PATH, SEPARATION_PRESETS, TARGET_SR,
+    BatchingSeparationPool, ParallelSeparationPool, DEFAULT_MAX_WAIT, DEFAULT_PRESET
+)
+from src.scripts.transcribe import LyricsTranscriber, TRANSCRIPTION_PRESETS
+from src.scripts.align import LyricsAligner
+from src.scripts.live import simulate_live
+from src.utils.audio_stream import audio_duration
+from src.utils.derived_stems import read_recipe
+from core.audio_processor import AudioProcessor
+from core.pipeline import (
+    STAGES, CheckpointManifest, WorkspaceBusy, WorkspaceLock, convert_to_standard_wav, file_sha256
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent.parent
+REPORT_DIR = BASE_DIR / "output" / "benchmarks"
+
+
+def sdr(reference: torch.Tensor, estimate: torch.Tensor, eps: float = 1e-9) -> float:
+    """Signal-to-Distortion Ratio (dB), definición de MUSDB/museval sin ventanas"""
+    length = min(reference.shape[-1], estimate.shape[-1])
+    reference = reference[..., :length].double()
+    estimate = estimate[..., :length].double()
+    num = (reference ** 2).sum()
+    den = ((reference - estimate) ** 2).sum()
+    return float(10 * torch.log10((num + eps) / (den + eps)))
+
+
+def _load_reference(path: Union[str, Path], mixture_path: Union[str, Path],
+                    seconds: Optional[float]) -> torch.Tensor:
+    """Carga una referencia con la misma escala que `load_mix` aplica a la mezcla"""
+    reference, sr = torchaudio.load(str(path), backend="soundfile")
+    mixture, mix_sr = torchaudio.load(str(mixture_path), backend="soundfile")
+    if sr != TARGET_SR:
+        reference = torchaudio.functional.resample(reference, sr, TARGET_SR)
+    if mix_sr != TARGET_SR:
+        mixture = torchaudio.functional.resample(mixture, mix_sr, TARGET_SR)
+    scale = mixture.abs().max().clamp_min(1e-7)
+    reference = reference / scale
+    if reference.shape[0] == 1:
+        reference = torch.cat([reference, reference])
+    if seconds:
+        reference = reference[..., :int(seconds * TARGET_SR)]
+    return reference
+
+
+def write_report(name: str, report: Dict, output: Optional[Union[str, Path]] = None) -> Path:
+    path = Path(output) if output else REPORT_DIR / f"{name}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def calibrate_presets(
+    input_path: Union[str, Path],
+    reference_vocals: Optional[Union[str, Path]] = None,
+    presets: Optional[List[str]] = None,
+    seconds: Optional[float] = None,
+    model_path: Union[str, Path] = MODEL_PATH
+) -> Dict:
+    """Mide el factor de tiempo real y el SDR de voces de cada preset de separación.
+
+    Sin referencia no hay SDR de voces: se informa `sdr_vs_best_db`, el acuerdo de cada preset
+    con la salida de `best` (mide cuánto se aleja de `best`, no la calidad; `best` queda
+    sin valor porque se compararía consigo mismo).
+    """
+    presets = presets or list(SEPARATION_PRESETS)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_custom_model(model_path, device)
+    model.eval()
+
+    mix = load_mix(input_path)
+    if seconds:
+        mix = mix[..., :int(seconds * TARGET_SR)]
+    duration = mix.shape[-1] / TARGET_SR
+
+    reference = None
+    reference_kind = 'none'
+    if reference_vocals:
+        reference = _load_reference(reference_vocals, input_path, seconds)
+        reference_kind = 'ground_truth'
+
+    outputs = {}
+    rows = []
+    for preset in presets:
+        logger.info(f"Calibrando preset '{preset}' sobre {duration:.1f}s de audio...")
+        start = time.perf_counter()
+        vocals, _ = separate_mix(model, mix, device, preset=preset)
+        elapsed = time.perf_counter() - start
+        outputs[preset] = vocals
+        rows.append({
+            'preset': preset,
+            'params': SEPARATION_PRESETS[preset],
+            'seconds': round(elapsed, 3),
+            'rtf': round(elapsed / duration, 4),
+        })
+
+    for row in rows:
+        if reference is not None:
+            row['vocal_sdr_db'] = round(sdr(reference, outputs[row['preset']]), 2)
+        elif 'best' in outputs and row['preset'] != 'best':
+            row['sdr_vs_best_db'] = round(sdr(outputs['best'], outputs[row['preset']]), 2)
+            reference_kind = 'relative_to_best'
+        else:
+            row['sdr_vs_best_db'] = None
+
+    return {
+        'input': str(input_path),
+        'audio_seconds': round(duration, 2),
+        'device': str(device),
+        'threads': torch.get_num_threads(),
+        'reference': reference_kind,
+        'presets': rows,
+    }
+
+
+def compare_parallel_separation(
+    input_path: Union[str, Path],
+    workers: Optional[List[int]] = None,
+    preset: str = "balanced",
+    seconds: Optional[float] = None,
+    model_path: Union[str, Path] = MODEL_PATH
+) -> Dict:
+    """Escalado de la separación en CPU con 1..N procesos.
+
+    La eficiencia es la aceleración respecto a 1 proceso dividida entre el número de
+    procesos; `max_abs_diff` compara con la separación en el propio proceso (debe ser ~0).
+    """
+    workers = sorted(set([1] + (workers or [1, 2, 4])))
+    device = torch.device("cpu")
+    model = load_custom_model(model_path, device)
+    model.eval()
+    mix = load_mix(input_path)
+    if seconds:
+        mix = mix[..., :int(seconds * TARGET_SR)]
+    duration = mix.shape[-1] / TARGET_SR
+
+    start = time.perf_counter()
+    reference, _ = separate_mix(model, mix, device, preset=preset)
+    rows = [{'workers': 'in-process', 'seconds': round(time.perf_counter() - start, 2)}]
+
+    single = None
+    for count in workers:
+        with ParallelSeparationPool(model, count) as pool:
+            pool.start()  # arranque de procesos fuera de la medición
+            start = time.perf_counter()
+            vocals, _ = separate_mix(model, mix, device, pool=pool, preset=preset)
+            elapsed = time.perf_counter() - start
+        single = single or elapsed
+        rows.append({
+            'workers': count,
+            'seconds': round(elapsed, 2),
+            'rtf': round(elapsed / duration, 4),
+            'speedup': round(single / elapsed, 2),
+            'efficiency': round(single / elapsed / count, 2),
+            'max_abs_diff': float((vocals - reference).abs().max()),
+        })
+
+    return {
+        'input': str(input_path),
+        'audio_seconds': round(duration, 2),
+        'preset': preset,
+        'cpu_count': os.cpu_count(),
+        'runs': rows,
+    }
+
+
+def compare_batched_separation(
+    inputs: List[Union[str, Path]],
+    batch_sizes: Optional[List[int]] = None,
+    max_wait: float = DEFAULT_MAX_WAIT,
+    preset: str = "fast",
+    seconds: Optional[float] = None,
+    model_path: Union[str, Path] = MODEL_PATH
+) -> Dict:
+    """Separa todas las entradas a la vez (un hilo por canción) sobre un BatchingSeparationPool
+    con cada `max_batch`. Por configuración: tiempo total, aceleración respecto a lotes de 1,
+    diferencia máxima con la separación sin lotes y el rendimiento de cada tamaño de lote
+    realmente ejecutado (los lotes incompletos por `max_wait` aparecen con su tamaño)"""
+    batch_sizes = sorted(set([1] + (batch_sizes or [2, 4])))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_custom_model(model_path, device)
+    model.eval()
+    mixes = []
+    for input_path in inputs:
+        mix = load_mix(input_path)
+        if seconds:
+            mix = mix[..., :int(seconds * TARGET_SR)]
+        mixes.append(mix)
+    duration = sum(mix.shape[-1] for mix in mixes) / TARGET_SR
+    references = [separate_mix(model, mix, device, preset=preset)[0] for mix in mixes]
+
+    rows, batches, single = [], {}, None
+    for size in batch_sizes:
+        with BatchingSeparationPool(model, size, max_wait) as pool:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(mixes)) as executor:
+                results = list(executor.map(
+                    lambda mix: separate_mix(model, mix, device, pool=pool, preset=preset)[0], mixes))
+            elapsed = time.perf_counter() - start
+            batches[size] = pool.throughput()
+        single = single or elapsed
+        rows.append({
+            'max_batch': size,
+            'seconds': round(elapsed, 2),
+            'rtf': round(elapsed / duration, 4),
+            'speedup': round(single / elapsed, 2),
+            'mean_batch': round(sum(r['windows'] for r in batches[size]) /
+                                max(sum(r['batches'] for r in batches[size]), 1), 2),
+            'max_abs_diff': max(float((vocals - reference).abs().max())
+                                for vocals, reference in zip(results, references)),
+        })
+
+    return {
+        'inputs': [str(path) for path in inputs],
+        'audio_seconds': round(duration, 2),
+        'preset': preset,
+        'device': str(device),
+        'max_wait': max_wait,
+        'runs': rows,
+        'batches': {str(size): stats for size, stats in batches.items()},
+    }
+
+
+def _disk_mb(directory: Path) -> float:
+    """MB de los archivos de `directory`, contando una sola vez los enlaces duros"""
+    seen, total = set(), 0
+    for path in directory.rglob('*'):
+        if path.is_file():
+            stat = path.stat()
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total / 2 ** 20
+
+
+def compare_stem_storage(
+    input_path: Union[str, Path],
+    preset: str = "fast",
+    seconds: Optional[float] = None,
+    model_path: Union[str, Path] = MODEL_PATH
+) -> Dict:
+    """Guardado de stems con instrumental.wav frente a receta (original - voces): tiempo de
+    escritura, disco de original + stems y calidad del instrumental derivado frente a la
+    suma de stems del modelo"""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_custom_model(model_path, device)
+    model.eval()
+    root = Path(tempfile.mkdtemp(prefix="lyraoke_storage_"))
+    original = root / "original" / "song.wav"
+    original.parent.mkdir(parents=True)
+    convert_to_standard_wav(Path(input_path), original)
+    if seconds:
+        audio, sample_rate = torchaudio.load(str(original))
+        torchaudio.save(str(original), audio[:, :int(seconds * sample_rate)], sample_rate,
+                        encoding="PCM_S", bits_per_sample=16)
+    mix, mix_gain = load_mix(original, return_gain=True)
+    vocals, instrumental = separate_mix(model, mix, device, preset=preset)
+
+    rows = []
+    for mode in ('wav', 'derived'):
+        stems_dir = root / mode / "stems"
+        start = time.perf_counter()
+        derived = mode == 'derived'
+        _, instrumental_path = save_stems(vocals, instrumental, stems_dir, original if derived else None,
+                                          mix if derived else None, mix_gain)
+        elapsed = time.perf_counter() - start
+        row = {
+            'mode': mode,
+            'save_seconds': round(elapsed, 2),
+            'disk_mb': round(_disk_mb(original.parent) + _disk_mb(stems_dir), 2),
+            'sdr_db': None,
+        }
+        if instrumental_path.suffix == '.json':
+            row['sdr_db'] = read_recipe(instrumental_path)['quality']['sdr_db']
+        elif mode == 'derived':
+            row['mode'] = 'derived (calidad insuficiente, WAV)'
+        rows.append(row)
+
+    baseline = rows[0]
+    for row in rows:
+        row['time_saving'] = round(1 - row['save_seconds'] / max(baseline['save_seconds'], 1e-9), 2)
+        row['disk_saving'] = round(1 - row['disk_mb'] / max(baseline['disk_mb'], 1e-9), 2)
+    return {
+        'input': str(input_path),
+        'audio_seconds': round(audio_duration(original), 2),
+        'preset': preset,
+        'output_root': str(root),
+        'runs': rows,
+    }
+
+
+def compare_live_latency(
+    input_path: Union[str, Path],
+    configs: List[str],
+    seconds: Optional[float] = 30.0,
+    realtime: bool = True,
+    max_latency: Optional[float] = None,
+    model_path: Union[str, Path] = MODEL_PATH
+) -> Dict:
+    """Latencia conseguida y RTF del modo en directo para cada configuración 'hop:lookahead'"""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_custom_model(model_path, device)
+    model.eval()
+    rows = []
+    for config in configs:
+        hop, lookahead = (float(v) for v in config.split(':'))
+        try:
+            stats = simulate_live(input_path, model=model, realtime=realtime, seconds=seconds, hop=hop,
+                                  lookahead=lookahead, max_latency=max_latency)
+        except ValueError as e:
+            # Configuración que no puede ir en tiempo real en esta máquina
+            rows.append({'config': config, 'error': str(e)})
+            continue
+        rows.append(dict({'config': config}, **{k: stats[k] for k in (
+            'algorithmic_latency_s', 'latency_mean_s', 'latency_p95_s', 'latency_max_s', 'rtf',
+            'window_compute_s', 'hops', 'dropped_hops')}))
+    return {
+        'input': str(input_path),
+        'seconds': seconds,
+        'realtime': realtime,
+        'max_latency_s': max_latency,
+        'device': str(device),
+        'runs': rows,
+    }
+
+
+def compare_batch_transcription(
+    audio_paths: List[Union[str, Path]],
+    model_size: str = "medium",
+    batch_sizes: Optional[List[int]] = None,
+    language: Optional[str] = None
+) -> Dict:
+    """Compara el throughput de `transcribe_audio` (una canción cada vez) con `transcribe_batch`"""
+    batch_sizes = batch_sizes or [len(audio_paths)]
+    transcriber = LyricsTranscriber(model_size=model_size)
+    total_audio = sum(audio_duration(p) for p in audio_paths)
+
+    start = time.perf_counter()
+    for path in audio_paths:
+        transcriber.transcribe_audio(str(path))
+    sequential = time.perf_counter() - start
+    rows = [{
+        'mode': 'sequential',
+        'batch_size': 1,
+        'seconds': round(sequential, 2),
+        'audio_s_per_s': round(total_audio / sequential, 2),
+        'speedup': 1.0,
+    }]
+
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        transcriber.transcribe_batch([str(p) for p in audio_paths], batch_size=batch_size, language=language)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            'mode': 'batch',
+            'batch_size': batch_size,
+            'seconds': round(elapsed, 2),
+            'audio_s_per_s': round(total_audio / elapsed, 2),
+            'speedup': round(sequential / elapsed, 2),
+        })
+
+    return {
+        'inputs': [str(p) for p in audio_paths],
+        'audio_seconds': round(total_audio, 2),
+        'model_size': model_size,
+        'device': transcriber.device,
+        'threads': torch.get_num_threads(),
+        'runs': rows,
+    }
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """WER por distancia de edición entre palabras (minúsculas, sin puntuación)"""
+    ref = re.findall(r"\w+", reference.lower())
+    hyp = re.findall(r"\w+", hypothesis.lower())
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        current = [i]
+        for j, other in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def compare_transcription_presets(
+    audio_path: Union[str, Path],
+    presets: Optional[List[str]] = None,
+    reference_lyrics: Optional[Union[str, Path]] = None,
+    language: Optional[str] = None,
+    device: str = "cpu"
+) -> Dict:
+    """RTF de cada preset de transcripción (en CPU por defecto) y WER si hay letra de referencia"""
+    presets = presets or list(TRANSCRIPTION_PRESETS)
+    reference = Path(reference_lyrics).read_text(encoding='utf-8') if reference_lyrics else None
+    duration = audio_duration(audio_path)
+    rows = []
+    for preset in presets:
+        transcriber = LyricsTranscriber(preset=preset, device=device)
+        start = time.perf_counter()
+        result = transcriber.transcribe_audio(str(audio_path), language=language)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            'preset': preset,
+            'model_size': transcriber.model_size,
+            'seconds': round(elapsed, 2),
+            'rtf': round(elapsed / duration, 4),
+            'language': result.get('language'),
+            'wer': round(word_error_rate(reference, result['text']), 3) if reference is not None else None,
+        })
+        del transcriber
+    return {
+        'input': str(audio_path),
+        'audio_seconds': round(duration, 2),
+        'device': device,
+        'threads': torch.get_num_threads(),
+        'presets': rows,
+    }
+
+
+def compare_parallel_transcription(
+    audio_path: Union[str, Path],
+    workers: Optional[List[int]] = None,
+    preset: Optional[str] = None,
+    language: Optional[str] = None
+) -> Dict:
+    """Tiempo de transcripción en CPU según el número de procesos, y cuánto se parece el
+    texto troceado al secuencial (WER tomando el secuencial como referencia)"""
+    workers = workers or [1, 2, 4]
+    duration = audio_duration(audio_path)
+    rows = []
+    baseline = None
+    for count in sorted(set([1] + workers)):
+        kwargs = {'preset': preset} if preset else {}
+        transcriber = LyricsTranscriber(device="cpu", workers=count, **kwargs)
+        if count > 1:
+            transcriber._get_pool()  # arrancar los procesos fuera de la medición
+        start = time.perf_counter()
+        result = transcriber.transcribe_audio(str(audio_path), language=language)
+        elapsed = time.perf_counter() - start
+        transcriber.close()
+        if baseline is None:
+            baseline = (elapsed, result['text'])
+        words = [w for seg in result['segments'] for w in seg.get('words', [])]
+        rows.append({
+            'workers': count,
+            'seconds': round(elapsed, 2),
+            'rtf': round(elapsed / duration, 4),
+            'speedup': round(baseline[0] / elapsed, 2),
+            'wer_vs_sequential': round(word_error_rate(baseline[1], result['text']), 3),
+            'words': len(words),
+        })
+    return {
+        'input': str(audio_path),
+        'audio_seconds': round(duration, 2),
+        'cpu_count': os.cpu_count(),
+        'runs': rows,
+    }
+
+
+_COLD_START_CODE = """
+import json, time, torch
+from src.utils.memory import current_rss_mb
+from {module} import {function}
+start = time.perf_counter()
+{function}({target!r}, {device}, mmap={mmap}, convert={convert})
+print(json.dumps({{'seconds': time.perf_counter() - start, 'rss_mb': current_rss_mb()}}))
+"""
+
+
+def measure_cold_start(model_path: Union[str, Path] = MODEL_PATH, whisper_sizes: Optional[List[str]] = None,
+                       repeats: int = 3) -> Dict:
+    """Tiempo de carga de cada modelo en un proceso nuevo, desde el checkpoint original y
+    desde el mapeado en memoria (la caché de páginas del sistema no se vacía: mide la
+    construcción y las copias, no la lectura de disco)"""
+    targets = []
+    if Path(model_path).exists():
+        targets.append(('htdemucs', 'src.scripts.separate', 'load_custom_model', str(model_path),
+                        'torch.device("cpu")'))
+    for size in whisper_sizes or []:
+        targets.append((f'whisper-{size}', 'src.scripts.transcribe', 'load_whisper_model', size, '"cpu"'))
+
+    def run(module, function, target, device, mmap, convert=False) -> Dict:
+        code = _COLD_START_CODE.format(module=module, function=function, target=target, device=device,
+                                       mmap=mmap, convert=convert)
+        completed = subprocess.run([sys.executable, '-c', code], cwd=str(BASE_DIR), check=True,
+                                   capture_output=True, text=True)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    rows = []
+    for name, module, function, target, device in targets:
+        run(module, function, target, device, True, convert=True)  # asegura la conversión antes de medir
+        for mmap in (False, True):
+            samples = [run(module, function, target, device, mmap) for _ in range(repeats)]
+            rows.append({
+                'model': name,
+                'mode': 'mmap' if mmap else 'original',
+                'seconds': round(min(s['seconds'] for s in samples), 3),
+                'rss_mb': round(min(s['rss_mb'] or 0.0 for s in samples), 1),
+            })
+    return {'repeats': repeats, 'runs': rows}
+
+
+def compare_alignment(vocals_path: Union[str, Path], lyrics_path: Union[str, Path],
+                      model_size: str = "medium") -> Dict:
+    """Tiempo de la alineación forzada frente a la transcripción completa sobre el mismo stem"""
+    lyrics = Path(lyrics_path).read_text(encoding='utf-8')
+    duration = audio_duration(vocals_path)
+
+    transcriber = LyricsTranscriber(model_size=model_size)
+    start = time.perf_counter()
+    transcriber.transcribe_audio(str(vocals_path))
+    transcribe_seconds = time.perf_counter() - start
+
+    aligner = LyricsAligner()
+    start = time.perf_counter()
+    aligned = aligner.align_audio(str(vocals_path), lyrics)
+    align_seconds = time.perf_counter() - start
+
+    rows = [
+        {'mode': f'transcribe ({model_size})', 'seconds': round(transcribe_seconds, 2),
+         'rtf': round(transcribe_seconds / duration, 4)},
+        {'mode': 'align (MMS_FA)', 'seconds': round(align_seconds, 2),
+         'rtf': round(align_seconds / duration, 4)},
+    ]
+    return {
+        'vocals': str(vocals_path),
+        'audio_seconds': round(duration, 2),
+        'aligned_words': sum(len(seg['words']) for seg in aligned['segments']),
+        'speedup': round(transcribe_seconds / align_seconds, 2),
+        'runs': rows,
+    }
+
+
+def _verify_workspace(output_dir: Path) -> List[str]:
+    """Problemas encontrados en un workspace terminado (vacío = íntegro)"""
+    problems = []
+    manifest = CheckpointManifest(output_dir)
+    for stage in STAGES:
+        if not manifest.is_done(stage):
+            problems.append(f"etapa '{stage}' sin artefactos válidos")
+    leftovers = [p.name for p in output_dir.rglob(".*") if p.is_file() and p.name != ".lock"]
+    if leftovers:
+        problems.append(f"temporales sin publicar: {', '.join(leftovers)}")
+    return problems
+
+
+def stress_test(
+    inputs: List[Union[str, Path]],
+    jobs: int = 4,
+    concurrency: int = 2,
+    output_root: Optional[Union[str, Path]] = None,
+    model_size: str = "medium",
+    preset: str = DEFAULT_PRESET
+) -> Dict:
+    """Lanza `jobs` trabajos (las entradas se repiten a propósito) con `concurrency` a la vez
+    sobre un AudioProcessor compartido y comprueba que ningún trabajo pisa a otro"""
+    processor = AudioProcessor(model_size=model_size, preload_separator=True, separation_preset=preset)
+    root = Path(output_root) if output_root else Path(tempfile.mkdtemp(prefix="lyraoke_stress_"))
+    tasks = [(i, Path(inputs[i % len(inputs)])) for i in range(jobs)]
+
+    def run(task):
+        index, input_path = task
+        output_dir = root / f"job_{index:03d}"
+        start = time.perf_counter()
+        row = {'job': index, 'input': input_path.name}
+        try:
+            processor.process_audio(input_path, str(output_dir))
+            problems = _verify_workspace(output_dir)
+            row.update({
+                'status': 'ok' if not problems else 'corrupt',
+                'problems': problems,
+                'vocals_sha256': file_sha256(output_dir / "stems" / "vocals.wav"),
+            })
+        except Exception as e:
+            row.update({'status': 'error', 'problems': [str(e)]})
+        row['seconds'] = round(time.perf_counter() - start, 2)
+        return row
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        rows = list(executor.map(run, tasks))
+    wall = time.perf_counter() - start
+
+    # La misma entrada debe dar stems idénticos aunque se procese en paralelo con otras
+    by_input: Dict[str, set] = {}
+    for row in rows:
+        if row.get('vocals_sha256'):
+            by_input.setdefault(row['input'], set()).add(row['vocals_sha256'])
+    inconsistent = sorted(name for name, hashes in by_input.items() if len(hashes) > 1)
+
+    # Un segundo trabajo sobre un workspace ocupado debe rechazarse, no mezclarse
+    busy_dir = root / "busy"
+    with WorkspaceLock(busy_dir):
+        try:
+            processor.process_audio(tasks[0][1], str(busy_dir))
+            lock_respected = False
+        except WorkspaceBusy:
+            lock_respected = True
+
+    failed = [row for row in rows if row['status'] != 'ok']
+    return {
+        'output_root': str(root),
+        'jobs': jobs,
+        'concurrency': concurrency,
+        'preset': preset,
+        'wall_seconds': round(wall, 2),
+        'job_seconds_total': round(sum(row['seconds'] for row in rows), 2),
+        'songs_per_hour': round(jobs / wall * 3600, 1),
+        'failed': len(failed),
+        'inconsistent_inputs': inconsistent,
+        'lock_respected': lock_respected,
+        'runs': rows,
+    }
+
+
+def _print_table(rows: List[Dict], columns: List[str]):
+    print(" | ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print(" | ".join(f"{str(row.get(c)):>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmarks de Lyraoke en la máquina local',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    presets_parser = sub.add_parser("presets", help="RTF y SDR de voces por preset de separación")
+    presets_parser.add_argument("--input", type=Path, help="Mezcla a separar")
+    presets_parser.add_argument("--reference-vocals", type=Path, help="Voces de referencia (opcional)")
+    presets_parser.add_argument("--track", type=Path,
+                                help="Carpeta estilo MUSDB18-HQ con mixture.wav y vocals.wav")
+    presets_parser.add_argument("--seconds", type=float, default=30.0,
+                                help="Duración del extracto (0 = canción completa)")
+    presets_parser.add_argument("--presets", nargs="+", choices=sorted(SEPARATION_PRESETS))
+    presets_parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    presets_parser.add_argument("--report", type=Path, help="Ruta del informe JSON")
+
+    sep_parallel_parser = sub.add_parser("separate-parallel",
+                                         help="Escalado de la separación con 1..N procesos en CPU")
+    sep_parallel_parser.add_argument("--input", type=Path, required=True)
+    sep_parallel_parser.add_argument("--workers", type=int, nargs="+")
+    sep_parallel_parser.add_argument("--preset", default="balanced", choices=sorted(SEPARATION_PRESETS))
+    sep_parallel_parser.add_argument("--seconds", type=float, default=60.0,
+                                     help="Duración del extracto (0 = canción completa)")
+    sep_parallel_parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    sep_parallel_parser.add_argument("--report", type=Path)
+
+    sep_batch_parser = sub.add_parser("separate-batch",
+                                      help="Separación de varias canciones con ventanas agrupadas en lotes")
+    sep_batch_parser.add_argument("--inputs", type=Path, nargs="+", required=True)
+    sep_batch_parser.add_argument("--batch-sizes", type=int, nargs="+")
+    sep_batch_parser.add_argument("--max-wait", type=float, default=DEFAULT_MAX_WAIT)
+    sep_batch_parser.add_argument("--preset", default="fast", choices=sorted(SEPARATION_PRESETS))
+    sep_batch_parser.add_argument("--seconds", type=float, default=60.0,
+                                  help="Duración del extracto (0 = canción completa)")
+    sep_batch_parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    sep_batch_parser.add_argument("--report", type=Path)
+
+    storage_parser = sub.add_parser("stem-storage",
+                                    help="instrumental.wav frente a instrumental derivado (original - voces)")
+    storage_parser.add_argument("--input", type=Path, required=True)
+    storage_parser.add_argument("--preset", default="fast", choices=sorted(SEPARATION_PRESETS))
+    storage_parser.add_argument("--seconds", type=float, default=0.0,
+                                help="Duración del extracto (0 = canción completa)")
+    storage_parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    storage_parser.add_argument("--report", type=Path)
+
+    live_parser = sub.add_parser("live", help="Latencia y RTF del modo en directo")
+    live_parser.add_argument("--input", type=Path, required=True)
+    live_parser.add_argument("--configs", nargs="+", default=["0.5:0.25"], help="hop:lookahead en segundos")
+    live_parser.add_argument("--seconds", type=float, default=30.0,
+                             help="Duración del extracto (0 = canción completa)")
+    live_parser.add_argument("--max-latency", type=float, default=None)
+    live_parser.add_argument("--fast", action="store_true", help="No simular velocidad real")
+    live_parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    live_parser.add_argument("--report", type=Path)
+
+    batch_parser = sub.add_parser("transcribe-batch",
+                                  help="Transcripción secuencial frente a transcripción por lotes")
+    batch_parser.add_argument("--inputs", type=Path, nargs="+", required=True, help="Stems de voz")
+    batch_parser.add_argument("--batch-sizes", type=int, nargs="+")
+    batch_parser.add_argument("--model-size", default="medium")
+    batch_parser.add_argument("--language", default=None)
+    batch_parser.add_argument("--report", type=Path)
+
+    tpresets_parser = sub.add_parser("transcribe-presets", help="RTF y WER por preset de transcripción")
+    tpresets_parser.add_argument("--input", type=Path, required=True, help="Stem de voz")
+    tpresets_parser.add_argument("--reference-lyrics", type=Path, help="Letra de referencia (opcional)")
+    tpresets_parser.add_argument("--presets", nargs="+", choices=list(TRANSCRIPTION_PRESETS))
+    tpresets_parser.add_argument("--language", default=None)
+    tpresets_parser.add_argument("--device", default="cpu")
+    tpresets_parser.add_argument("--report", type=Path)
+
+    parallel_parser = sub.add_parser("transcribe-parallel",
+                                     help="Transcripción troceada en varios procesos frente a secuencial")
+    parallel_parser.add_argument("--input", type=Path, required=True, help="Stem de voz")
+    parallel_parser.add_argument("--workers", type=int, nargs="+")
+    parallel_parser.add_argument("--preset", choices=list(TRANSCRIPTION_PRESETS))
+    parallel_parser.add_argument("--language", default=None)
+    parallel_parser.add_argument("--report", type=Path)
+
+    align_parser = sub.add_parser("align", help="Alineación forzada frente a transcripción")
+    align_parser.add_argument("--vocals", type=Path, required=True)
+    align_parser.add_argument("--lyrics", type=Path, required=True)
+    align_parser.add_argument("--model-size", default="medium")
+    align_parser.add_argument("--report", type=Path)
+
+    cold_parser = sub.add_parser("cold-start", help="Carga de modelos: checkpoint original frente a mmap")
+    cold_parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    cold_parser.add_argument("--whisper", nargs="*", default=["medium"])
+    cold_parser.add_argument("--repeats", type=int, default=3)
+    cold_parser.add_argument("--report", type=Path)
+
+    stress_parser = sub.add_parser("stress", help="Varios trabajos simultáneos en workspaces aislados")
+    stress_parser.add_argument("--inputs", type=Path, nargs="+", required=True, help="Canciones de prueba")
+    stress_parser.add_argument("--jobs", type=int, default=4)
+    stress_parser.add_argument("--concurrency", type=int, default=2)
+    stress_parser.add_argument("--output", type=Path, help="Raíz de los workspaces (por defecto, temporal)")
+    stress_parser.add_argument("--model-size", default="medium")
+    # Con shifts (no 'fast') para que una carrera en el RNG de los shifts se note en los stems
+    stress_parser.add_argument("--preset", default=DEFAULT_PRESET, choices=sorted(SEPARATION_PRESETS))
+    stress_parser.add_argument("--report", type=Path)
+
+    args = parser.parse_args()
+
+    if args.command == "presets":
+        input_path, reference = args.input, args.reference_vocals
+        if args.track:
+            input_path, reference = args.track / "mixture.wav", args.track / "vocals.wav"
+        if input_path is None:
+            parser.error("Se requiere --input o --track")
+        report = calibrate_presets(input_path, reference, args.presets, args.seconds or None, args.model)
+        sdr_column = 'vocal_sdr_db' if report['reference'] == 'ground_truth' else 'sdr_vs_best_db'
+        _print_table(report['presets'], ['preset', 'seconds', 'rtf', sdr_column])
+        print(f"Informe: {write_report('presets', report, args.report)}")
+    elif args.command == "separate-parallel":
+        report = compare_parallel_separation(args.input, args.workers, args.preset, args.seconds or None, args.model)
+        _print_table(report['runs'], ['workers', 'seconds', 'rtf', 'speedup', 'efficiency', 'max_abs_diff'])
+        print(f"Informe: {write_report('separate_parallel', report, args.report)}")
+    elif args.command == "separate-batch":
+        report = compare_batched_separation(args.inputs, args.batch_sizes, args.max_wait, args.preset,
+                                            args.seconds or None, args.model)
+        _print_table(report['runs'], ['max_batch', 'seconds', 'rtf', 'speedup', 'mean_batch', 'max_abs_diff'])
+        for size, stats in report['batches'].items():
+            print(f"max_batch={size}")
+            _print_table(stats, ['batch_size', 'batches', 'windows', 'windows_per_s', 'audio_s_per_s'])
+        print(f"Informe: {write_report('separate_batch', report, args.report)}")
+    elif args.command == "stem-storage":
+        report = compare_stem_storage(args.input, args.preset, args.seconds or None, args.model)
+        _print_table(report['runs'], ['mode', 'save_seconds', 'disk_mb', 'time_saving', 'disk_saving', 'sdr_db'])
+        print(f"Informe: {write_report('stem_storage', report, args.report)}")
+    elif args.command == "live":
+        report = compare_live_latency(args.input, args.configs, args.seconds or None, not args.fast,
+                                      args.max_latency, args.model)
+        _print_table(report['runs'], ['config', 'algorithmic_latency_s', 'latency_p95_s', 'rtf',
+                                      'window_compute_s', 'dropped_hops', 'error'])
+        print(f"Informe: {write_report('live', report, args.report)}")
+    elif args.command == "transcribe-batch":
+        report = compare_batch_transcription(args.inputs, args.model_size, args.batch_sizes, args.language)
+        _print_table(report['runs'], ['mode', 'batch_size', 'seconds', 'audio_s_per_s', 'speedup'])
+        print(f"Informe: {write_report('transcribe_batch', report, args.report)}")
+    elif args.command == "transcribe-presets":
+        report = compare_transcription_presets(args.input, args.presets, args.reference_lyrics,
+                                               args.language, args.device)
+        _print_table(report['presets'], ['preset', 'model_size', 'seconds', 'rtf', 'wer'])
+        print(f"Informe: {write_report('transcribe_presets', report, args.report)}")
+    elif args.command == "transcribe-parallel":
+        report = compare_parallel_transcription(args.input, args.workers, args.preset, args.language)
+        _print_table(report['runs'], ['workers', 'seconds', 'rtf', 'speedup', 'wer_vs_sequential'])
+        print(f"Informe: {write_report('transcribe_parallel', report, args.report)}")
+    elif args.command == "align":
+        report = compare_alignment(args.vocals, args.lyrics, args.model_size)
+        _print_table(report['runs'], ['mode', 'seconds', 'rtf'])
+        print(f"Aceleración: x{report['speedup']}")
+        print(f"Informe: {write_report('align', report, args.report)}")
+    elif args.command == "cold-start":
+        report = measure_cold_start(args.model, args.whisper, args.repeats)
+        _print_table(report['runs'], ['model', 'mode', 'seconds', 'rss_mb'])
+        print(f"Informe: {write_report('cold_start', report, args.report)}")
+    elif args.command == "stress":
+        report = stress_test(args.inputs, args.jobs, args.concurrency, args.output,
+                             args.model_size, args.preset)
+        _print_table(report['runs'], ['job', 'input', 'status', 'seconds'])
+        print(f"{report['songs_per_hour']} canciones/hora, fallos: {report['failed']}, "
+              f"inconsistentes: {report['inconsistent_inputs'] or 'ninguna'}, "
+              f"cerrojo respetado: {report['lock_respected']}")
+        print(f"Informe: {write_report('stress', report, args.report)}")
+        if report['failed'] or report['inconsistent_inputs'] or not report['lock_respected']:
+            raise SystemExit(1)
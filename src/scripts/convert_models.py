@@ -0,0 +1,56 @@
+"""Convierte los checkpoints de HTDemucs y Whisper al formato mapeable en memoria.
+
+La conversión no se hace sola (ocupa varios GB en models/): se hace con este script, de
+antemano (p. ej. al preparar una imagen del servicio) o para forzarla de nuevo, o al
+arrancar con `AudioProcessor(convert_models=True)` / `service.py --convert-models`.
+
+Uso:
+    python -m src.scripts.convert_models --whisper medium large-v3
+"""
+import logging
+from pathlib import Path
+
+import torch
+
+from src.scripts.separate import MODEL_PATH, load_custom_model
+from src.scripts.transcribe import load_whisper_model, whisper_mmap_path
+from src.utils.checkpoints import mmap_path_for
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Convierte los modelos a checkpoints mapeables (arranque en frío rápido)',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--separation-model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--skip-separation", action="store_true")
+    parser.add_argument("--whisper", nargs="*", default=["medium"], help="Tamaños de Whisper a convertir")
+    args = parser.parse_args()
+
+    # Se borra la conversión anterior y se carga como en un primer arranque: la conversión
+    # solo se escribe si el modelo original cargó bien (nunca el preentrenado de reserva)
+    targets = []
+    if not args.skip_separation:
+        if not args.separation_model.exists():
+            parser.error(f"No existe el modelo de separación: {args.separation_model}")
+        targets.append(("HTDemucs", mmap_path_for(args.separation_model),
+                        lambda: load_custom_model(args.separation_model, torch.device("cpu"), convert=True)))
+    for model_size in args.whisper:
+        targets.append((f"Whisper {model_size}", whisper_mmap_path(model_size),
+                        lambda size=model_size: load_whisper_model(size, "cpu", convert=True)))
+
+    failed = False
+    for name, path, load in targets:
+        path.unlink(missing_ok=True)
+        load()
+        if path.exists():
+            print(f"{name} -> {path}")
+        else:
+            print(f"{name}: no se pudo convertir (ver el log)")
+            failed = True
+    if failed:
+        raise SystemExit(1)
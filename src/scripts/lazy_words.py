@@ -0,0 +1,162 @@
+"""Tiempos de palabra calculados bajo demanda, por delante de la reproducción.
+
+En modo perezoso la transcripción solo produce tiempos por segmento (sin la pasada de
+alineación de Whisper sobre toda la canción) y la canción puede sonar antes. Después,
+`LazyWordAligner` alinea los segmentos de uno en uno, empezando por el que se está
+cantando y siguiendo por los próximos; los que ya quedaron atrás van al final. Cada
+resultado se guarda en `song_words.json` (índice de segmento -> palabras) junto a
+`song_timed.json`, que no se modifica: el manifiesto del pipeline sigue siendo válido y
+una recarga recupera lo ya alineado.
+
+Este módulo no importa torch ni Whisper: el reproductor lo usa para leer las palabras.
+"""
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from src.utils.files import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+WORDS_FILENAME = "song_words.json"
+
+
+def words_path_for(timed_path: Union[str, Path]) -> Path:
+    """lyrics/song_timed.json -> lyrics/song_words.json"""
+    return Path(timed_path).with_name(WORDS_FILENAME)
+
+
+def load_word_timings(timed_path: Union[str, Path]) -> Dict[int, List[Dict]]:
+    """Palabras ya alineadas por índice de segmento ({} si aún no hay ninguna)"""
+    try:
+        with open(words_path_for(timed_path), 'r', encoding='utf-8') as f:
+            return {int(index): words for index, words in json.load(f).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+class LazyWordAligner:
+    """Alinea las palabras de los segmentos de una canción en orden de reproducción"""
+
+    def __init__(self, transcriber, vocals_path: Union[str, Path], timed_path: Union[str, Path],
+                 language: Optional[str] = None):
+        self.transcriber = transcriber
+        self.vocals_path = str(vocals_path)
+        self.timed_path = Path(timed_path)
+        self.language = language
+        with open(self.timed_path, 'r', encoding='utf-8') as f:
+            self.segments: List[Dict] = json.load(f)
+        self.words = load_word_timings(self.timed_path)
+        # Segmentos que ya traen palabras (p. ej. transcripción normal o letra conocida)
+        for index, segment in enumerate(self.segments):
+            if segment.get('words'):
+                self.words.setdefault(index, segment['words'])
+        self._mel = None
+
+    @property
+    def pending(self) -> List[int]:
+        return [i for i, segment in enumerate(self.segments)
+                if i not in self.words and segment.get('text', '').strip()]
+
+    def next_segment(self, position: float) -> Optional[int]:
+        """El segmento en curso o el siguiente; si todo lo que queda está atrás, el primero"""
+        pending = self.pending
+        if not pending:
+            return None
+        ahead = [i for i in pending if self.segments[i]['end'] >= position]
+        return min(ahead or pending, key=lambda i: self.segments[i]['start'])
+
+    def step(self, position: float = 0.0) -> Optional[Tuple[int, List[Dict]]]:
+        """Alinea el segmento más urgente para `position` (segundos) y lo guarda.
+        Devuelve (índice, palabras) o None si no queda nada"""
+        index = self.next_segment(position)
+        if index is None:
+            return None
+        if self._mel is None:
+            self._mel = self.transcriber.song_mel(self.vocals_path)
+            if self.language is None:
+                self.language = self.transcriber.detect_language(self.vocals_path)
+        try:
+            words = self.transcriber.align_segment_words(self._mel, self.segments[index], self.language)
+        except Exception as e:
+            # Sin palabras el reproductor sigue resaltando la línea completa
+            logger.warning(f"No se pudieron alinear las palabras del segmento {index}: {e}")
+            words = []
+        self.words[index] = words
+        atomic_write_json(words_path_for(self.timed_path), {str(i): w for i, w in sorted(self.words.items())})
+        return index, words
+
+    def run(self, get_position: Callable[[], float] = lambda: 0.0,
+            on_segment: Optional[Callable[[int, List[Dict]], None]] = None,
+            stop_event: Optional[threading.Event] = None):
+        """Alinea todo lo pendiente consultando la posición antes de cada segmento"""
+        while stop_event is None or not stop_event.is_set():
+            result = self.step(get_position())
+            if result is None:
+                break
+            if on_segment is not None:
+                on_segment(*result)
+
+
+class WordAlignmentScheduler:
+    """Hilo que reparte la alineación entre varias canciones: primero la que suena (en el
+    orden de su posición de reproducción) y, cuando esa termina, las demás"""
+
+    def __init__(self, get_playback: Callable[[], Tuple[Optional[int], float]],
+                 on_segment: Callable[[int, int, List[Dict]], None]):
+        """`get_playback()` -> (clave de la canción que suena, posición en segundos);
+        `on_segment(clave, índice, palabras)` recibe cada segmento alineado"""
+        self.get_playback = get_playback
+        self.on_segment = on_segment
+        self._aligners: Dict[int, LazyWordAligner] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, key: int, aligner: LazyWordAligner):
+        with self._condition:
+            self._aligners[key] = aligner
+            self._condition.notify()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="lyraoke-words", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _pick(self) -> Optional[Tuple[int, LazyWordAligner, float]]:
+        current, position = self.get_playback()
+        with self._condition:
+            for key in [k for k, aligner in self._aligners.items() if not aligner.pending]:
+                del self._aligners[key]
+            if current in self._aligners:
+                return current, self._aligners[current], position
+            # Sin canción sonando con palabras pendientes: la más antigua, desde el principio
+            key = next(iter(self._aligners), None)
+            return (key, self._aligners[key], 0.0) if key is not None else None
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._stopped and not self._aligners:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+            picked = self._pick()
+            if picked is None:
+                continue
+            key, aligner, position = picked
+            try:
+                result = aligner.step(position)
+            except Exception as e:
+                # Audio o letra ilegibles: esa canción se queda con resaltado por líneas
+                logger.warning(f"Alineación de palabras abandonada para {key}: {e}")
+                with self._condition:
+                    self._aligners.pop(key, None)
+                continue
+            if result is not None:
+                self.on_segment(key, *result)
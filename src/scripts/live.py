@@ -0,0 +1,294 @@
+"""Eliminación de voces en directo sobre una entrada por bloques.
+
+El separador HTDemucs se aplica sobre una ventana deslizante: `context` segundos de
+pasado, el salto `hop` que se va a emitir y `lookahead` segundos de futuro. Cada vez
+que llega audio suficiente se emite el instrumental del salto; la latencia algorítmica
+es hop + lookahead y la total suma el tiempo de cómputo. Entre saltos se hace un
+fundido corto con la estimación que la ventana anterior ya tenía de ese tramo.
+
+Con `max_latency`, si el cómputo se queda atrás y el retraso supera el límite, los
+saltos atrasados se emiten sin separar (la mezcla tal cual) hasta recuperar el ritmo:
+la latencia queda acotada a cambio de dejar pasar la voz unos instantes.
+
+HTDemucs rellena cada ventana hasta su segmento de entrenamiento (~7.8 s), así que cada
+salto cuesta una ventana completa aunque la configurada sea más corta. `check_realtime`
+mide ese coste al arrancar: si un salto tarda más en calcularse que en sonar, el directo
+se quedaría atrás sin remedio (con `max_latency`, casi todo pasaría sin separar) y se
+rechaza la configuración; sin `max_latency` solo se avisa.
+
+Uso (simulación con un archivo a velocidad real):
+    python -m src.scripts.live --input cancion.mp3 --output instrumental.wav --hop 0.5 --lookahead 0.25
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import soundfile as sf
+import torch
+from demucs.apply import apply_model
+
+from src.scripts.separate import load_custom_model, MODEL_PATH, TARGET_SR
+from src.utils.audio_stream import iter_audio_blocks
+from src.utils.files import atomic_output
+from src.utils.profiling import profile_region
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOP = 0.5
+DEFAULT_LOOKAHEAD = 0.25
+DEFAULT_CONTEXT = 2.0
+DEFAULT_CROSSFADE = 0.05
+LIVE_BLOCK_FRAMES = 1024  # ~23 ms a 44.1kHz, tamaño típico de un buffer de tarjeta de audio
+REALTIME_MARGIN = 0.8     # fracción del salto que puede ocupar el cómputo de una ventana
+
+
+def limit_blocks(blocks: Iterable[np.ndarray], frames: int) -> Iterator[np.ndarray]:
+    """Corta la secuencia de bloques tras `frames` muestras"""
+    for block in blocks:
+        if frames <= 0:
+            return
+        yield block[..., :frames]
+        frames -= block.shape[-1]
+
+
+def iter_realtime(blocks: Iterable[np.ndarray], sample_rate: int = TARGET_SR) -> Iterator[np.ndarray]:
+    """Entrega los bloques al ritmo al que llegarían de una fuente en directo"""
+    start = time.perf_counter()
+    position = 0
+    for block in blocks:
+        position += block.shape[-1]
+        delay = start + position / sample_rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield block
+
+
+class LiveSeparator:
+    """Separación por ventana deslizante con latencia acotada (entrada estéreo a 44.1kHz)"""
+
+    def __init__(self, model: torch.nn.Module, device: Optional[torch.device] = None,
+                 hop: float = DEFAULT_HOP, lookahead: float = DEFAULT_LOOKAHEAD,
+                 context: float = DEFAULT_CONTEXT, crossfade: float = DEFAULT_CROSSFADE,
+                 max_latency: Optional[float] = None, live: bool = True):
+        """`live` indica que la entrada llega a velocidad real (la latencia se mide contra
+        ese reloj); en una simulación sin pausas se estima como algorítmica + cómputo"""
+        if hop <= 0 or lookahead < 0 or context < 0:
+            raise ValueError("hop debe ser positivo y lookahead/context no negativos")
+        if crossfade > min(hop, lookahead):
+            raise ValueError("El fundido no puede ser mayor que hop ni que lookahead")
+        if max_latency is not None and max_latency <= hop + lookahead:
+            raise ValueError(f"max_latency debe superar la latencia algorítmica ({hop + lookahead:.2f}s)")
+        self.model = model.eval()
+        self.device = device or next(model.parameters()).device
+        self.sample_rate = TARGET_SR
+        self.hop = int(hop * TARGET_SR)
+        self.lookahead = int(lookahead * TARGET_SR)
+        self.context = int(context * TARGET_SR)
+        self.crossfade = int(crossfade * TARGET_SR)
+        self.window = self.context + self.hop + self.lookahead
+        # HTDemucs no acepta ventanas más largas que su segmento de entrenamiento
+        max_window = getattr(model, 'segment', None)
+        if max_window is not None and self.window > float(max_window) * TARGET_SR:
+            raise ValueError(f"context + hop + lookahead no puede superar {float(max_window):.2f}s")
+        # Muestras que calcula de verdad el modelo por salto (HTDemucs rellena hasta su segmento)
+        self.model_window = self.window
+        if max_window is not None and getattr(model, 'use_train_segment', False):
+            self.model_window = max(self.window, int(float(max_window) * TARGET_SR))
+        self.max_latency = max_latency
+        self.live = live
+        self.window_seconds: Optional[float] = None  # cómputo medido de una ventana
+        self.algorithmic_latency = (self.hop + self.lookahead) / TARGET_SR
+        fade = torch.linspace(0.0, 1.0, self.crossfade) if self.crossfade else torch.zeros(0)
+        self._fade_in = fade
+        self._fade_out = 1.0 - fade
+        self._reset()
+
+    def _reset(self):
+        # Ventana actual: empieza en silencio (sin pasado real)
+        self._audio = torch.zeros(2, self.context)
+        self._tail: Optional[torch.Tensor] = None
+        self._emitted = 0
+        self._latencies: List[float] = []
+        self._compute_seconds = 0.0
+        self._dropped = 0
+        self._started_at: Optional[float] = None
+        self._flushing = False
+
+    def _separate_window(self, window: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad(), profile_region('live.window'):
+            stems = apply_model(self.model, window.unsqueeze(0).to(self.device), shifts=0, split=False,
+                                segment=self.window / self.sample_rate)
+        return stems[0, :3].sum(0).cpu()  # drums + bass + other
+
+    def measure_window(self, repeats: int = 2) -> float:
+        """Segundos de cómputo de una ventana (la primera pasada calienta y no cuenta)"""
+        silence = torch.zeros(2, self.window)
+        self._separate_window(silence)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            self._separate_window(silence)
+        self.window_seconds = (time.perf_counter() - start) / repeats
+        return self.window_seconds
+
+    def check_realtime(self) -> float:
+        """Mide el cómputo por salto y devuelve su RTF (cómputo / duración del salto).
+        Con RTF por encima de REALTIME_MARGIN el directo no puede seguir el ritmo: con
+        `max_latency` lanza ValueError (sería un bypass), sin él avisa"""
+        hop_seconds = self.hop / self.sample_rate
+        rtf = self.measure_window() / hop_seconds
+        if rtf > REALTIME_MARGIN:
+            message = (f"Cada salto de {hop_seconds:.2f}s tarda {self.window_seconds:.2f}s en calcularse "
+                       f"(RTF {rtf:.2f}; el modelo procesa {self.model_window / self.sample_rate:.2f}s por "
+                       f"ventana) en {self.device}: el directo se quedaría atrás. Usa un salto de al menos "
+                       f"{self.window_seconds / REALTIME_MARGIN:.2f}s o una GPU")
+            if self.live and self.max_latency is not None:
+                raise ValueError(message + "; con max_latency casi todos los saltos pasarían sin separar")
+            logger.warning(message)
+        return rtf
+
+    def _lag(self) -> Optional[float]:
+        """Segundos desde que existió en la fuente la primera muestra del salto actual"""
+        if not self.live or self._flushing:
+            return None
+        return time.perf_counter() - (self._started_at + self._emitted / self.sample_rate)
+
+    def _step(self) -> torch.Tensor:
+        """Emite el instrumental del salto actual y avanza la ventana"""
+        window = self._audio[:, :self.window]
+        if window.shape[1] < self.window:
+            window = torch.nn.functional.pad(window, (0, self.window - window.shape[1]))
+        lag = self._lag()
+        if self.max_latency is not None and lag is not None and lag > self.max_latency:
+            # Atrasados: pasar la mezcla sin separar para recuperar el ritmo
+            out = window[:, self.context:self.context + self.hop].clone()
+            self._tail = None
+            self._dropped += 1
+            elapsed = 0.0
+        else:
+            start = time.perf_counter()
+            estimate = self._separate_window(window)
+            elapsed = time.perf_counter() - start
+            self._compute_seconds += elapsed
+            out = estimate[:, self.context:self.context + self.hop].clone()
+            if self._tail is not None and self.crossfade:
+                out[:, :self.crossfade] = self._tail * self._fade_out + out[:, :self.crossfade] * self._fade_in
+            end = self.context + self.hop
+            self._tail = estimate[:, end:end + self.crossfade].clone() if self.crossfade else None
+
+        lag = self._lag()
+        # Sin reloj real: la primera muestra espera a hop + lookahead y luego al cómputo
+        self._latencies.append(lag if lag is not None else self.algorithmic_latency + elapsed)
+        self._audio = self._audio[:, self.hop:]
+        self._emitted += self.hop
+        return out
+
+    def process(self, blocks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """Consume bloques (canales, muestras) y genera bloques de instrumental (2, hop).
+        Al agotarse la entrada se rellena con silencio para emitir el final"""
+        self._reset()
+        received = 0
+        for block in blocks:
+            block = torch.as_tensor(np.asarray(block, dtype=np.float32))
+            if block.dim() == 1:
+                block = block.unsqueeze(0)
+            if block.shape[0] == 1:
+                block = block.expand(2, -1)
+            if self._started_at is None:
+                # El primer bloque empezó a existir cuando se grabó su primera muestra
+                self._started_at = time.perf_counter() - block.shape[-1] / self.sample_rate
+            received += block.shape[-1]
+            self._audio = torch.cat([self._audio, block[:2]], dim=1)
+            while self._audio.shape[1] >= self.window:
+                yield self._step().numpy()
+
+        # Vaciado: silencio como futuro para lo que falta por emitir
+        self._flushing = True
+        self._audio = torch.cat([self._audio, torch.zeros(2, self.hop + self.lookahead)], dim=1)
+        while self._emitted < received:
+            remaining = received - self._emitted
+            yield self._step()[:, :remaining].numpy()
+
+    @property
+    def stats(self) -> Dict:
+        """Latencia conseguida (s) y factor de tiempo real del cómputo"""
+        processed = self._emitted / self.sample_rate
+        latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+        return {
+            'hop_s': self.hop / self.sample_rate,
+            'lookahead_s': self.lookahead / self.sample_rate,
+            'context_s': self.context / self.sample_rate,
+            'algorithmic_latency_s': round(self.algorithmic_latency, 3),
+            'latency_mean_s': round(float(latencies.mean()), 3),
+            'latency_p95_s': round(float(np.percentile(latencies, 95)), 3),
+            'latency_max_s': round(float(latencies.max()), 3),
+            'rtf': round(self._compute_seconds / processed, 4) if processed else None,
+            'model_window_s': round(self.model_window / self.sample_rate, 3),
+            'window_compute_s': round(self.window_seconds, 4) if self.window_seconds is not None else None,
+            'hops': len(self._latencies),
+            'dropped_hops': self._dropped,
+        }
+
+
+def simulate_live(
+    input_path: Union[str, Path],
+    output_path: Optional[Union[str, Path]] = None,
+    model: Optional[torch.nn.Module] = None,
+    realtime: bool = True,
+    seconds: Optional[float] = None,
+    check: bool = True,
+    **options
+) -> Dict:
+    """Pasa un archivo (o sus primeros `seconds`) por LiveSeparator como si fuera una entrada
+    en directo. Con `realtime` los bloques llegan a velocidad real; si no, tan rápido como
+    se procesen. Con `check` se comprueba antes que el cómputo por salto cabe en tiempo real
+    (ver LiveSeparator.check_realtime)"""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if model is None:
+        model = load_custom_model(MODEL_PATH, device)
+    separator = LiveSeparator(model, device, live=realtime, **options)
+    if check:
+        separator.check_realtime()
+    blocks = iter_audio_blocks(input_path, target_sr=TARGET_SR, channels=2, block_frames=LIVE_BLOCK_FRAMES)
+    if seconds:
+        blocks = limit_blocks(blocks, int(seconds * TARGET_SR))
+    if realtime:
+        blocks = iter_realtime(blocks)
+
+    if output_path is None:
+        for _ in separator.process(blocks):
+            pass
+    else:
+        with atomic_output(output_path, suffix=".wav") as temp_path:
+            with sf.SoundFile(str(temp_path), 'w', samplerate=TARGET_SR, channels=2,
+                              subtype='PCM_16', format='WAV') as out:
+                for block in separator.process(blocks):
+                    out.write(np.clip(block.T, -1.0, 1.0))
+    return dict(separator.stats, input=str(input_path), output=str(output_path) if output_path else None,
+                realtime=realtime, device=str(device))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Quita la voz de una entrada en directo (simulada con un archivo)',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--input", type=Path, required=True)
+    parser.add_argument("--output", type=Path, help="WAV con el instrumental (opcional)")
+    parser.add_argument("--hop", type=float, default=DEFAULT_HOP, help="Segundos emitidos por paso")
+    parser.add_argument("--lookahead", type=float, default=DEFAULT_LOOKAHEAD, help="Segundos de futuro")
+    parser.add_argument("--context", type=float, default=DEFAULT_CONTEXT, help="Segundos de pasado")
+    parser.add_argument("--max-latency", type=float, default=None,
+                        help="Latencia máxima: los saltos atrasados pasan sin separar")
+    parser.add_argument("--seconds", type=float, default=None, help="Procesar solo el principio")
+    parser.add_argument("--fast", action="store_true", help="No simular velocidad real")
+    args = parser.parse_args()
+
+    stats = simulate_live(args.input, args.output, realtime=not args.fast, seconds=args.seconds, hop=args.hop,
+                          lookahead=args.lookahead, context=args.context, max_latency=args.max_latency)
+    print(f"Latencia: media {stats['latency_mean_s']}s, p95 {stats['latency_p95_s']}s, "
+          f"máx {stats['latency_max_s']}s (algorítmica {stats['algorithmic_latency_s']}s)")
+    print(f"RTF: {stats['rtf']}, saltos sin separar: {stats['dropped_hops']}/{stats['hops']}")
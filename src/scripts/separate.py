@@ -1,17 +1,29 @@
 import torch
-import torchaudio
 from pathlib import Path
+import hashlib
 import logging
 import os
+import random
 import shutil
-from typing import Dict, Optional, Union
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from demucs.pretrained import get_model  # Para el modelo preentrenado
-from demucs.apply import apply_model
-from src.utils.audio_utils import (
-    convert_to_wav,
-    normalize_audio,
-    save_audio
+from demucs.apply import apply_model, TensorChunk
+import torch.multiprocessing as torch_mp
+from demucs.htdemucs import HTDemucs
+import openunmix
+from src.utils.audio_utils import save_audio
+from src.utils.audio_stream import read_audio
+from src.utils.checkpoints import (
+    assign_weights, build_on_meta, load_mmap_checkpoint, mmap_path_for, save_mmap_checkpoint
 )
+from src.utils.derived_stems import derive_instrumental
+from src.utils.files import atomic_output
+from src.utils.metrics import SEPARATION_BATCH_SECONDS, SEPARATION_WINDOWS
+from src.utils.profiling import profile_region
 
 # Configuración
 logging.basicConfig(level=logging.INFO)
@@ -21,9 +33,55 @@ BASE_DIR = Path(__file__).parent.parent.parent
 SONGS_DIR = BASE_DIR / "output" / "original"
 OUTPUT_DIR = BASE_DIR / "output" / "stems"
 MODEL_PATH = BASE_DIR / "models" / "final_model" / "best_model.pth"
+TARGET_SR = 44100
 
-def load_custom_model(model_path: Union[str, Path], device: torch.device):
-    """Carga el modelo custom manteniendo compatibilidad con diferentes formatos de state_dict"""
+# Presets velocidad/calidad -> parámetros de apply_model.
+# shifts: pasadas con desplazamiento aleatorio (coste lineal); overlap: solape entre ventanas
+SEPARATION_PRESETS = {
+    'fast': {'shifts': 0, 'overlap': 0.1, 'split': True},
+    'balanced': {'shifts': 1, 'overlap': 0.25, 'split': True},
+    'best': {'shifts': 3, 'overlap': 0.5, 'split': True},
+}
+DEFAULT_PRESET = 'balanced'
+SHIFT_SEED = 0
+MAX_SHIFT_SECONDS = 0.5    # el mismo desplazamiento máximo que usa apply_model
+
+def _load_mmap_model(model_path: Path, device: torch.device) -> Optional[HTDemucs]:
+    """HTDemucs directamente sobre los pesos mapeados de `<modelo>.mmap.pt`, sin cargar antes
+    los pesos preentrenados. None si no hay conversión vigente"""
+    try:
+        checkpoint = load_mmap_checkpoint(mmap_path_for(model_path), source=model_path)
+        if checkpoint is None:
+            return None
+        config = checkpoint['config']
+        model = build_on_meta(lambda: HTDemucs(*config['args'], **config['kwargs']))
+        assign_weights(model, checkpoint['state_dict'])
+    except Exception as e:
+        logger.warning(f"No se pudo usar el checkpoint mapeado de {model_path.name}, se carga el original: {e}")
+        return None
+    logger.info(f"✅ Modelo custom cargado (mmap): {mmap_path_for(model_path)}")
+    return model.to(device)
+
+def convert_separation_checkpoint(model: HTDemucs, model_path: Union[str, Path]) -> Path:
+    """Guarda el modelo ya cargado como `<modelo>.mmap.pt` para los siguientes arranques"""
+    args, kwargs = model._init_args_kwargs  # capturados por demucs (@capture_init)
+    return save_mmap_checkpoint(mmap_path_for(model_path), model.state_dict(),
+                                config={'args': list(args), 'kwargs': kwargs}, source=model_path)
+
+def load_custom_model(model_path: Union[str, Path], device: torch.device, mmap: bool = True,
+                      convert: bool = False):
+    """Carga el modelo custom manteniendo compatibilidad con diferentes formatos de state_dict.
+
+    Si hay un checkpoint mapeable vigente (`<modelo>.mmap.pt`, del mismo .pth), HTDemucs se
+    construye directamente sobre él (una sola lectura perezosa de pesos, páginas compartidas
+    entre procesos). Si no, se carga el .pth; con `convert` se guarda además la conversión
+    para los siguientes arranques (también la hace `python -m src.scripts.convert_models`).
+    Con `mmap=False` se usa siempre el .pth original.
+    """
+    model_path = Path(model_path)
+    model = _load_mmap_model(model_path, device) if mmap and model_path.exists() else None
+    if model is not None:
+        return model
     try:
         logger.info(f"Intentando cargar modelo custom: {model_path}")
         
@@ -57,6 +115,14 @@ def load_custom_model(model_path: Union[str, Path], device: torch.device):
             raise ValueError("El state_dict no coincide con la arquitectura del modelo")
             
         logger.info("✅ Modelo custom cargado correctamente")
+        if mmap and not convert:
+            logger.info(f"Sin checkpoint mapeado vigente de {model_path.name} "
+                        f"(python -m src.scripts.convert_models)")
+        elif mmap:
+            try:
+                convert_separation_checkpoint(model, model_path)
+            except Exception as e:
+                logger.warning(f"No se pudo guardar el checkpoint mapeado: {e}")
         return model
         
     except Exception as e:
@@ -88,16 +154,449 @@ def ensure_proper_shape(audio: torch.Tensor) -> torch.Tensor:
         audio = torch.cat([audio, audio])
     return audio
 
+def load_mix(audio_path: Union[str, Path], return_gain: bool = False):
+    """Carga un audio y lo deja listo para el modelo: 44.1kHz, estéreo, normalizado y con batch.
+    Con `return_gain` devuelve (mezcla, ganancia aplicada), la que necesita el instrumental
+    derivado para reconstruir la mezcla desde el original.
+
+    Solo la decodificación y el remuestreo van por bloques: HTDemucs necesita la canción
+    entera (normalización al pico y suma de solapes), así que la mezcla se materializa una
+    vez en memoria y se normaliza sobre ese mismo búfer, sin copias adicionales.
+    """
+    logger.info("Cargando audio...")
+    try:
+        audio, _ = read_audio(audio_path, target_sr=TARGET_SR, channels=2)
+    except Exception as e:
+        raise RuntimeError(f"Error al cargar audio: {str(e)}")
+
+    # Preprocesamiento: lo mismo que normalize_audio, pero en el sitio
+    logger.info("Preprocesando...")
+    mix = torch.from_numpy(audio)
+    peak = max(float(mix.max()), -float(mix.min())) if mix.numel() else 0.0
+    gain = 1.0
+    if peak > 1e-7:  # Evitar división por cero
+        mix /= peak
+        gain = 1.0 / peak
+    mix.clamp_(-1.0, 1.0)
+    mix = ensure_proper_shape(mix).unsqueeze(0)
+    return (mix, gain) if return_gain else mix
+
+class _LazyResult:
+    """Futuro perezoso: la ventana se calcula cuando apply_model pide su resultado"""
+
+    def __init__(self, fn: Callable[[], torch.Tensor]):
+        self._fn = fn
+
+    def result(self) -> torch.Tensor:
+        return self._fn()
+
+def _window_input(model, chunk, kwargs) -> Tuple[torch.Tensor, int]:
+    """Entrada real de una ventana con su contexto, tal como la rellena apply_model"""
+    # Misma longitud válida que usa apply_model internamente para rellenar la ventana
+    segment = kwargs.get('segment')
+    if isinstance(model, HTDemucs) and segment is not None:
+        valid_length = int(segment * model.samplerate)
+    elif hasattr(model, 'valid_length'):
+        valid_length = model.valid_length(chunk.length)
+    else:
+        valid_length = chunk.length
+    return chunk.padded(valid_length), valid_length
+
+class CheckpointPool:
+    """Pool para `apply_model` que persiste en disco cada ventana separada.
+
+    Las ventanas se identifican por el hash de su entrada (incluido el contexto de
+    padding), así que al relanzar una separación interrumpida solo se recalculan las
+    que faltan. Cada ventana se escribe de forma atómica; un archivo ilegible se descarta.
+    Con `executor` (p. ej. ParallelSeparationPool) las ventanas sin checkpoint se lanzan
+    en cuanto apply_model las envía y se calculan en paralelo.
+    """
+
+    def __init__(self, checkpoint_dir: Union[str, Path],
+                 on_window: Optional[Callable[[int, int], None]] = None,
+                 executor=None):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.on_window = on_window
+        self.executor = executor
+        self.submitted = 0
+        self.completed = 0
+        self.reused = 0
+        self._futures = []
+
+    def submit(self, fn, model, chunk, **kwargs) -> _LazyResult:
+        self.submitted += 1
+        if self.executor is None:
+            return _LazyResult(lambda: self._run(fn, model, chunk, kwargs))
+        path = self._window_path(model, chunk, kwargs)
+        out = self._load(path, chunk)
+        if out is not None:
+            return _LazyResult(lambda: self._finish(out))
+        future = self.executor.submit(fn, model, chunk, **kwargs)
+        self._futures.append(future)
+        return _LazyResult(lambda: self._finish(self._store(path, future.result())))
+
+    def _window_path(self, model, chunk, kwargs) -> Path:
+        data, valid_length = _window_input(model, chunk, kwargs)
+        digest = hashlib.sha1(data.detach().cpu().contiguous().numpy().tobytes())
+        digest.update(f"{chunk.length}:{valid_length}:{kwargs.get('shifts')}".encode())
+        return self.checkpoint_dir / f"{digest.hexdigest()}.pt"
+
+    def _load(self, path: Path, chunk) -> Optional[torch.Tensor]:
+        if not path.exists():
+            return None
+        try:
+            out = torch.load(path, map_location=chunk.tensor.device)
+            if not isinstance(out, torch.Tensor) or out.shape[-1] != chunk.length:
+                raise ValueError("forma inesperada")
+        except Exception as e:
+            logger.warning(f"Checkpoint de ventana inválido, se recalcula: {path.name} ({e})")
+            path.unlink(missing_ok=True)
+            return None
+        self.reused += 1
+        return out
+
+    def _store(self, path: Path, out: torch.Tensor) -> torch.Tensor:
+        with atomic_output(path) as temp_path:
+            torch.save(out.detach().cpu(), temp_path)
+        return out
+
+    def _finish(self, out: torch.Tensor) -> torch.Tensor:
+        self.completed += 1
+        if self.on_window is not None:
+            self.on_window(self.completed, self.submitted)
+        return out
+
+    def _run(self, fn, model, chunk, kwargs) -> torch.Tensor:
+        path = self._window_path(model, chunk, kwargs)
+        out = self._load(path, chunk)
+        if out is None:
+            with profile_region('separate.window'):
+                out = self._store(path, fn(model, chunk, **kwargs))
+        return self._finish(out)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """apply_model la llama si una ventana falla (o se cancela el trabajo): descarta solo
+        las ventanas pendientes de esta separación, el ejecutor puede ser compartido"""
+        for future in self._futures:
+            future.cancel()
+
+    def clear(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+# Modelo de cada proceso de ParallelSeparationPool (se fija en _init_separation_worker)
+_window_model: Optional[torch.nn.Module] = None
+
+def _init_separation_worker(model: torch.nn.Module, num_threads: int):
+    global _window_model
+    torch.set_num_threads(num_threads)
+    _window_model = model.eval()
+
+def _worker_ready(_) -> int:
+    return os.getpid()
+
+def _separate_window(data: torch.Tensor, offset: int, length: int, kwargs: Dict) -> torch.Tensor:
+    # La ventana llega ya rellenada con su contexto: centrada, apply_model la usa tal cual
+    return apply_model(_window_model, TensorChunk(data, offset, length), **kwargs)
+
+class ParallelSeparationPool:
+    """Pool de procesos para `apply_model`: reparte las ventanas de una canción entre CPUs.
+
+    apply_model sigue haciendo en el proceso padre el troceado, los shifts y la suma
+    ponderada de los solapes; a los procesos solo viaja la entrada de cada ventana (con su
+    contexto), así que el resultado es el mismo que en un solo proceso. Los pesos del modelo
+    se pasan en memoria compartida (reducciones de torch.multiprocessing), sin una copia
+    por proceso. Se usa directamente como `pool` o como `executor` de CheckpointPool.
+    """
+
+    def __init__(self, model: torch.nn.Module, workers: int, num_threads: Optional[int] = None):
+        self.model = model
+        self.workers = workers
+        num_threads = num_threads or max(1, (os.cpu_count() or 1) // workers)
+        model.share_memory()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=torch_mp.get_context('spawn'),
+            initializer=_init_separation_worker,
+            initargs=(model, num_threads)
+        )
+        logger.info(f"Separación en paralelo: {workers} procesos x {num_threads} hilos")
+
+    def start(self):
+        """Arranca todos los procesos (cada uno recibe el modelo) antes de la primera canción"""
+        list(self._executor.map(_worker_ready, range(self.workers)))
+
+    def submit(self, fn, model, chunk, **kwargs):
+        """Interfaz de pool de apply_model (`fn` es siempre apply_model)"""
+        if model is not self.model:
+            raise ValueError("ParallelSeparationPool solo separa con el modelo con el que se creó")
+        data, valid_length = _window_input(model, chunk, kwargs)
+        offset = (valid_length - chunk.length) // 2
+        window_kwargs = {key: value for key, value in kwargs.items() if key not in ('pool', 'device')}
+        window_kwargs['device'] = 'cpu'
+        return self._executor.submit(_separate_window, data.detach().cpu(), offset, chunk.length, window_kwargs)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self) -> 'ParallelSeparationPool':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(cancel_futures=True)
+        return False
+
+DEFAULT_MAX_BATCH = 4
+DEFAULT_MAX_WAIT = 0.05
+
+class BatchingSeparationPool:
+    """Ejecutor para `apply_model` que agrupa ventanas de varias canciones en una sola pasada.
+
+    Cada canción sigue haciendo en su hilo el troceado, los shifts y la suma ponderada de
+    los solapes; aquí solo llegan las entradas de las ventanas (con su contexto). Un hilo
+    junta hasta `max_batch` ventanas de la misma forma, esperando como mucho `max_wait`
+    segundos desde la primera, las apila en un lote, hace una pasada del modelo y devuelve a
+    cada futuro su parte recortada a la longitud de la ventana. Cuantas más canciones haya
+    en cola (servicio con varios workers), más se llena cada lote. La memoria pico del
+    modelo crece con el tamaño del lote. Se usa como `pool` o como `executor` de
+    CheckpointPool; `throughput()` informa del rendimiento por tamaño de lote.
+    """
+
+    def __init__(self, model: torch.nn.Module, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait: float = DEFAULT_MAX_WAIT):
+        if max_batch < 1:
+            raise ValueError("max_batch debe ser al menos 1")
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._stats: Dict[int, Dict[str, float]] = {}
+        self._thread = threading.Thread(target=self._loop, name="lyraoke-separation-batch", daemon=True)
+        self._thread.start()
+        logger.info(f"Separación por lotes: hasta {max_batch} ventanas, espera máxima {max_wait}s")
+
+    def submit(self, fn, model, chunk, **kwargs) -> Future:
+        """Interfaz de pool de apply_model (`fn` es siempre apply_model)"""
+        if model is not self.model:
+            raise ValueError("BatchingSeparationPool solo separa con el modelo con el que se creó")
+        data, valid_length = _window_input(model, chunk, kwargs)
+        future = Future()
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("BatchingSeparationPool ya está cerrado")
+            self._queue.append((data.detach(), (valid_length - chunk.length) // 2, chunk.length,
+                                chunk.tensor.device, future))
+            self._condition.notify()
+        return future
+
+    def _collect(self) -> list:
+        """Espera la primera ventana y reúne las de su misma forma hasta llenar el lote o
+        agotar `max_wait`. Las de otra forma (otro `segment`) esperan al siguiente lote"""
+        with self._condition:
+            while not self._queue and not self._stopped:
+                self._condition.wait()
+            if not self._queue:
+                return []
+            deadline = time.monotonic() + self.max_wait
+            key = (self._queue[0][0].shape, self._queue[0][0].dtype)
+            while not self._stopped:
+                ready = sum(1 for item in self._queue if (item[0].shape, item[0].dtype) == key)
+                remaining = deadline - time.monotonic()
+                if ready >= self.max_batch or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, rest = [], deque()
+            while self._queue:
+                item = self._queue.popleft()
+                if len(batch) < self.max_batch and (item[0].shape, item[0].dtype) == key:
+                    batch.append(item)
+                else:
+                    rest.append(item)
+            self._queue = rest
+        # Ventanas canceladas (trabajo abortado) antes de empezar: no se calculan
+        return [item for item in batch if item[-1].set_running_or_notify_cancel()]
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                with self._condition:
+                    if self._stopped and not self._queue:
+                        return
+                continue
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list):
+        device = next(self.model.parameters()).device
+        start = time.perf_counter()
+        try:
+            with torch.no_grad(), profile_region('separate.batch'):
+                out = self.model(torch.cat([item[0] for item in batch]).to(device))
+        except Exception as e:
+            for item in batch:
+                item[-1].set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+        audio_seconds = 0.0
+        for index, (_, offset, length, out_device, future) in enumerate(batch):
+            future.set_result(out[index:index + 1, ..., offset:offset + length].to(out_device))
+            audio_seconds += length / self.model.samplerate
+        self._record(len(batch), elapsed, audio_seconds)
+
+    def _record(self, size: int, seconds: float, audio_seconds: float):
+        with self._condition:
+            stats = self._stats.setdefault(size, {'batches': 0, 'windows': 0, 'seconds': 0.0, 'audio_seconds': 0.0})
+            stats['batches'] += 1
+            stats['windows'] += size
+            stats['seconds'] += seconds
+            stats['audio_seconds'] += audio_seconds
+        SEPARATION_WINDOWS.inc(size, batch_size=size)
+        SEPARATION_BATCH_SECONDS.inc(seconds, batch_size=size)
+
+    def throughput(self) -> List[Dict]:
+        """Lotes ejecutados por tamaño, con ventanas y segundos de audio separados por segundo"""
+        with self._condition:
+            stats = {size: dict(values) for size, values in self._stats.items()}
+        rows = []
+        for size, values in sorted(stats.items()):
+            seconds = max(values['seconds'], 1e-9)
+            rows.append({
+                'batch_size': size,
+                'batches': int(values['batches']),
+                'windows': int(values['windows']),
+                'seconds': round(values['seconds'], 3),
+                'windows_per_s': round(values['windows'] / seconds, 3),
+                'audio_s_per_s': round(values['audio_seconds'] / seconds, 2),
+            })
+        return rows
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        with self._condition:
+            self._stopped = True
+            if cancel_futures:
+                while self._queue:
+                    self._queue.popleft()[-1].cancel()
+            self._condition.notify_all()
+        if wait:
+            self._thread.join()
+
+    def __enter__(self) -> 'BatchingSeparationPool':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(cancel_futures=True)
+        return False
+
+def get_preset(preset: str) -> Dict:
+    if preset not in SEPARATION_PRESETS:
+        raise ValueError(f"Preset desconocido: {preset}. Disponibles: {', '.join(SEPARATION_PRESETS)}")
+    return dict(SEPARATION_PRESETS[preset])
+
+def _apply_shifted(model: torch.nn.Module, mix: torch.Tensor, pool, shifts: int = 0,
+                   **params) -> torch.Tensor:
+    """apply_model con los shifts hechos aquí: mismo promedio de pasadas desplazadas, pero
+    los desplazamientos salen de un `random.Random(SHIFT_SEED)` propio. Así las ventanas de
+    cada pasada son las mismas en cada ejecución (los checkpoints de CheckpointPool se
+    reutilizan) y no se toca el estado global de `random`, compartido entre hilos"""
+    if not shifts:
+        return apply_model(model, mix, pool=pool, shifts=0, **params)
+    rng = random.Random(SHIFT_SEED)
+    length = mix.shape[-1]
+    max_shift = int(MAX_SHIFT_SECONDS * model.samplerate)
+    padded = TensorChunk(mix).padded(length + 2 * max_shift)
+    out = 0.
+    for _ in range(shifts):
+        offset = rng.randint(0, max_shift)
+        shifted = TensorChunk(padded, offset, length + max_shift - offset)
+        out += apply_model(model, shifted, pool=pool, shifts=0, **params)[..., max_shift - offset:]
+    return out / shifts
+
+def separate_mix(model: torch.nn.Module, mix: torch.Tensor, device: torch.device,
+                 pool=None, preset: str = DEFAULT_PRESET) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Aplica el modelo sobre la mezcla y devuelve (vocales, instrumental) en CPU.
+
+    `pool` se pasa tal cual a `apply_model`, que le envía cada ventana del split.
+    """
+    params = get_preset(preset)
+    logger.info(f"Separando pistas (preset {preset}: {params})...")
+
+    with profile_region('apply_model'):
+        stems = _apply_shifted(model, mix.to(device), pool, **params)
+
+    # Preparar stems
+    instrumental = stems[:, :3].sum(1)  # Sumar drums, bass, other
+    vocals = stems[:, 3]  # Vocales
+
+    # Asegurar formas
+    return ensure_proper_shape(vocals.cpu()), ensure_proper_shape(instrumental.cpu())
+
+def load_preview_model(device: torch.device) -> torch.nn.Module:
+    """Open-Unmix (umxhq) solo con el objetivo de voces: el residuo es el instrumental.
+    Mucho más ligero que HTDemucs; sirve para tener una pista cantable en segundos"""
+    logger.info("Cargando separador rápido Open-Unmix...")
+    separator = openunmix.umxhq(targets=['vocals'], residual=True, niter=0, device=device)
+    return separator.eval()
+
+def separate_preview(model: torch.nn.Module, mix: torch.Tensor,
+                     device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Separación rápida (máscara espectral de Open-Unmix). Devuelve (vocales, instrumental) en CPU"""
+    logger.info("Separación rápida (vista previa)...")
+    with torch.inference_mode(), profile_region('separate.preview'):
+        estimates = model(mix.to(device))
+    estimates = model.to_dict(estimates)
+    vocals = estimates['vocals'].squeeze(0)
+    instrumental = estimates['residual'].squeeze(0)
+    return ensure_proper_shape(vocals.cpu()), ensure_proper_shape(instrumental.cpu())
+
+def save_stems(vocals: torch.Tensor, instrumental: torch.Tensor,
+               output_dir: Union[str, Path],
+               original_path: Optional[Union[str, Path]] = None,
+               mix: Optional[torch.Tensor] = None, mix_gain: float = 1.0) -> Tuple[Path, Path]:
+    """Guarda vocals.wav e instrumental.wav en `output_dir`, cada uno con su `.peaks.npz`
+    y su `.loudness.json`. Con `original_path` y `mix` (la mezcla que separó el modelo y su
+    ganancia, ver load_mix) el instrumental se guarda como receta `instrumental.derived.json`
+    (original menos voces, ver src.utils.derived_stems) si pasa la comprobación de calidad;
+    la segunda ruta devuelta es entonces la receta"""
+    if original_path is not None and mix is None:
+        raise ValueError("El instrumental derivado necesita la mezcla en memoria (mix)")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Rutas de salida con nombre original
+    instrumental_path = output_dir / "instrumental.wav"
+    vocals_path = output_dir / "vocals.wav"
+
+    with profile_region('save'):
+        save_audio(vocals, vocals_path, TARGET_SR, peaks=True, loudness=True)
+        if original_path is not None:
+            recipe_path, quality = derive_instrumental(
+                instrumental_path, instrumental.numpy(), vocals.numpy(), vocals_path,
+                ensure_proper_shape(mix.squeeze(0)).numpy(), mix_gain, original_path, TARGET_SR
+            )
+            if recipe_path is not None:
+                logger.info(f"Instrumental derivado de original - voces (SDR {quality['sdr_db']} dB)")
+                return vocals_path, recipe_path
+            logger.warning(f"Instrumental derivado por debajo de {quality['min_sdr_db']} dB "
+                           f"(SDR {quality['sdr_db']} dB): se guarda instrumental.wav")
+        save_audio(instrumental, instrumental_path, TARGET_SR, peaks=True, loudness=True)
+    return vocals_path, instrumental_path
+
 def separate_audio(
     input_path: Optional[Union[str, Path]] = None,
     output_dir: Union[str, Path] = OUTPUT_DIR,
-    model_path: Union[str, Path] = MODEL_PATH
+    model_path: Union[str, Path] = MODEL_PATH,
+    model: Optional[torch.nn.Module] = None,
+    return_audio: bool = False,
+    preset: str = DEFAULT_PRESET
 ) -> Dict[str, str]:
+    """Separa voces e instrumental. Si se pasa `model` se reutiliza en lugar de cargarlo de disco.
+    Con `return_audio` el resultado incluye también los tensores de los stems"""
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     output_dir = Path(output_dir)
     model_path = Path(model_path)
     
-    temp_file = None
     try:
         # Manejo de la ruta de entrada
         if input_path is None:
@@ -115,83 +614,43 @@ def separate_audio(
         original_name = input_path.stem
         logger.info(f"Procesando: {input_path}")
 
-        # Conversión a WAV si es necesario
-        if input_path.suffix.lower() != '.wav':
-            logger.info("Convirtiendo a WAV...")
-            audio_path_str, temp_file = convert_to_wav(input_path)
-            audio_path = Path(audio_path_str)
-        else:
-            audio_path = input_path
-
-        # Carga del audio
-        logger.info("Cargando audio...")
-        try:
-            mix, sr = torchaudio.load(str(audio_path), backend="soundfile")
-        except Exception as e:
-            raise RuntimeError(f"Error al cargar audio: {str(e)}")
-
-        # Preprocesamiento
-        logger.info("Preprocesando...")
-        target_sr = 44100
-        
-        if sr != target_sr:
-            logger.info(f"Resampleando de {sr}Hz a {target_sr}Hz...")
-            mix = torchaudio.functional.resample(mix, sr, target_sr)
-        
-        mix = normalize_audio(mix)
-        mix = ensure_proper_shape(mix).unsqueeze(0)
+        # Carga y preprocesamiento del audio (decodifica MP3/FLAC por bloques, sin WAV temporal)
+        mix = load_mix(input_path)
 
         # Carga del modelo (primero custom, luego preentrenado como fallback)
-        model = load_custom_model(model_path, device)
+        if model is None:
+            model = load_custom_model(model_path, device)
         model.to(device)
 
         # Separación
-        logger.info("Separando pistas...")
-        stems = apply_model(model, mix.to(device), split=True, overlap=0.25)
-
-        # Preparar stems
-        instrumental = stems[:, :3].sum(1)  # Sumar drums, bass, other
-        vocals = stems[:, 3]  # Vocales
-
-        # Asegurar formas
-        instrumental = ensure_proper_shape(instrumental.cpu())
-        vocals = ensure_proper_shape(vocals.cpu())
+        vocals, instrumental = separate_mix(model, mix, device, preset=preset)
 
         # Guardar resultados
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Limpiar archivos antiguos
-        for old_file in output_dir.glob("*.wav"):
-            old_file.unlink(missing_ok=True)
-
-        # Rutas de salida con nombre original
-        instrumental_path = output_dir / "instrumental.wav"
-        vocals_path = output_dir / "vocals.wav"
-
-        save_audio(instrumental, instrumental_path, target_sr)
-        save_audio(vocals, vocals_path, target_sr)
+        vocals_path, instrumental_path = save_stems(vocals, instrumental, output_dir)
 
         logger.info(f"★ Separación completada ★\n"
                    f"- Vocales: {vocals_path}\n"
                    f"- Instrumental: {instrumental_path}")
         
-        return {
+        result = {
             "vocals": str(vocals_path),
             "instrumental": str(instrumental_path),
             "output_dir": str(output_dir),
-            "model_used": "custom" if "custom" in str(model_path) else "pretrained"
+            "model_used": "custom" if "custom" in str(model_path) else "pretrained",
+            "preset": preset
         }
+        if return_audio:
+            result["audio"] = {
+                "vocals": vocals,
+                "instrumental": instrumental,
+                "sample_rate": TARGET_SR
+            }
+        return result
 
     except Exception as e:
         logger.error(f"Error durante la separación: {str(e)}", exc_info=True)
         raise
 
-    finally:
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except Exception as e:
-                logger.warning(f"No se pudo eliminar temporal: {str(e)}")
 
 if __name__ == "__main__":
     import argparse
@@ -216,11 +675,17 @@ if __name__ == "__main__":
         type=Path,
         help="Ruta al modelo fine-tuned (por defecto best_model.pth)"
     )
+    parser.add_argument(
+        "--preset",
+        default=DEFAULT_PRESET,
+        choices=sorted(SEPARATION_PRESETS),
+        help="Compromiso velocidad/calidad de la separación"
+    )
     
     args = parser.parse_args()
     
     try:
-        result = separate_audio(args.input, args.output, args.model)
+        result = separate_audio(args.input, args.output, args.model, preset=args.preset)
         print(f"Procesamiento exitoso (modelo: {result['model_used']})")
         print(f"Vocales: {result['vocals']}")
         print(f"Instrumental: {result['instrumental']}")
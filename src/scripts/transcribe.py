@@ -1,11 +1,28 @@
 import whisper
+import numpy as np
 import torch
 import torchaudio
+import torch.multiprocessing as torch_mp
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import json
 import logging
+import os
+import threading
 import warnings
-from typing import Dict
+import re
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from whisper.audio import HOP_LENGTH, N_FRAMES, SAMPLE_RATE, FRAMES_PER_SECOND
+from whisper.decoding import DecodingOptions, detect_language
+from whisper.model import ModelDimensions, Whisper
+from whisper.timing import add_word_timestamps
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import compression_ratio
+from src.utils.audio_stream import probe_tags
+from src.utils.checkpoints import MMAP_SUFFIX, assign_weights, build_on_meta, load_mmap_checkpoint, save_mmap_checkpoint
+from src.utils.files import atomic_write_json, atomic_write_text
+from src.utils.metrics import MODEL_LOAD
+from src.utils.profiling import instrument_module
 
 
 # Configuración de logging
@@ -15,11 +32,327 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Umbrales equivalentes a los de whisper.transcribe
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# Presets velocidad/precisión -> modelo y opciones de decodificación de Whisper.
+# beam_size None = greedy; temperature es la secuencia de fallback (una sola = sin reintentos);
+# umbrales None desactivan la comprobación que dispara el fallback
+TRANSCRIPTION_PRESETS = {
+    'fast': {
+        'model_size': 'small', 'beam_size': None, 'best_of': None, 'temperature': (0.0,),
+        'compression_ratio_threshold': None, 'logprob_threshold': None,
+        'no_speech_threshold': NO_SPEECH_THRESHOLD, 'condition_on_previous_text': False,
+    },
+    # Las opciones por defecto de whisper.transcribe: el comportamiento anterior a los presets
+    'balanced': {
+        'model_size': 'medium', 'beam_size': None, 'best_of': None, 'temperature': TEMPERATURE_FALLBACK,
+        'compression_ratio_threshold': COMPRESSION_RATIO_THRESHOLD, 'logprob_threshold': LOGPROB_THRESHOLD,
+        'no_speech_threshold': NO_SPEECH_THRESHOLD, 'condition_on_previous_text': True,
+    },
+    'accurate': {
+        'model_size': 'large-v3', 'beam_size': 5, 'best_of': 5, 'temperature': TEMPERATURE_FALLBACK,
+        'compression_ratio_threshold': COMPRESSION_RATIO_THRESHOLD, 'logprob_threshold': LOGPROB_THRESHOLD,
+        'no_speech_threshold': NO_SPEECH_THRESHOLD, 'condition_on_previous_text': True,
+    },
+}
+DEFAULT_TRANSCRIPTION_PRESET = 'balanced'
+
+# Transcripción en paralelo: trozos de ~CHUNK_SECONDS cortados en la pausa más silenciosa
+# a ±SILENCE_SEARCH_SECONDS del objetivo; cada trozo se transcribe con SEAM_PADDING_SECONDS
+# de contexto a cada lado y solo conserva las palabras cuyo centro cae en su tramo
+CHUNK_SECONDS = 60.0
+SILENCE_SEARCH_SECONDS = 10.0
+SEAM_PADDING_SECONDS = 1.0
+ENERGY_FRAME_SECONDS = 0.02
+ENERGY_SMOOTH_FRAMES = 15  # ~0.3 s: busca pausas, no un único frame silencioso
+# Audio tras el final de un segmento que se incluye al alinear sus palabras por separado
+WORD_ALIGN_MARGIN_SECONDS = 0.5
+BASE_DIR = Path(__file__).parent.parent.parent
+LANGUAGE_CACHE_PATH = BASE_DIR / "output" / "cache" / "language_hints.json"
+# Detecciones coincidentes (y ninguna distinta) para fijar el idioma de una carpeta
+LIBRARY_AGREEMENT = 3
+WHISPER_MMAP_DIR = BASE_DIR / "models" / "whisper"
+
+
+def whisper_mmap_path(model_size: str) -> Path:
+    return WHISPER_MMAP_DIR / f"{Path(model_size).stem}{MMAP_SUFFIX}"
+
+
+def whisper_source_path(model_size: str) -> Optional[Path]:
+    """Checkpoint original que lee whisper.load_model (ruta dada o descarga en su caché)"""
+    if Path(model_size).is_file():
+        return Path(model_size)
+    url = whisper._MODELS.get(model_size)
+    if url is None:
+        return None
+    cache = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return Path(cache) / "whisper" / os.path.basename(url)
+
+
+def convert_whisper_checkpoint(model: Whisper, model_size: str) -> Path:
+    """Guarda Whisper (pesos en float32 y cabezas de alineación) en formato mapeable, con la
+    firma del checkpoint original para descartar la conversión si este cambia"""
+    state_dict = dict(model.state_dict())
+    state_dict['alignment_heads'] = model.alignment_heads.to_dense()
+    return save_mmap_checkpoint(whisper_mmap_path(model_size), state_dict, config={'dims': vars(model.dims)},
+                                source=whisper_source_path(model_size))
+
+
+def _whisper_buffers(dims: ModelDimensions, alignment_heads: torch.Tensor) -> Dict[str, torch.Tensor]:
+    """Buffers no persistentes de Whisper, recreados como en su constructor"""
+    n_ctx = dims.n_text_ctx
+    return {
+        'alignment_heads': alignment_heads.to_sparse(),
+        'decoder.mask': torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1),
+    }
+
+
+def load_whisper_model(model_size: str, device: str, mmap: bool = True, convert: bool = False) -> Whisper:
+    """Whisper construido sobre su checkpoint mapeado en models/whisper, sin leer ni copiar
+    los pesos al arrancar, si existe y corresponde al checkpoint original actual. Si no, se
+    carga con whisper.load_model; con `convert` se guarda además la conversión (también la
+    hace `python -m src.scripts.convert_models`)"""
+    if not mmap:
+        return whisper.load_model(model_size, device=device)
+    source = whisper_source_path(model_size)
+    try:
+        checkpoint = load_mmap_checkpoint(whisper_mmap_path(model_size), source=source) if source else None
+        if checkpoint is not None:
+            dims = ModelDimensions(**checkpoint['config']['dims'])
+            state_dict = dict(checkpoint['state_dict'])
+            heads = state_dict.pop('alignment_heads')
+            model = build_on_meta(lambda: Whisper(dims))
+            assign_weights(model, state_dict, buffers=_whisper_buffers(dims, heads))
+            logger.info(f"Whisper {model_size} cargado (mmap)")
+            return model.to(device)
+    except Exception as e:
+        logger.warning(f"No se pudo usar el checkpoint mapeado de Whisper {model_size}: {e}")
+
+    model = whisper.load_model(model_size, device=device)
+    if not convert:
+        logger.info(f"Whisper {model_size} sin checkpoint mapeado vigente "
+                    f"(python -m src.scripts.convert_models --whisper {model_size})")
+        return model
+    try:
+        convert_whisper_checkpoint(model, model_size)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el checkpoint mapeado de Whisper: {e}")
+    return model
+
+
+def get_transcription_preset(preset: str) -> Dict:
+    if preset not in TRANSCRIPTION_PRESETS:
+        raise ValueError(f"Preset de transcripción desconocido: {preset}. "
+                         f"Disponibles: {', '.join(TRANSCRIPTION_PRESETS)}")
+    return dict(TRANSCRIPTION_PRESETS[preset])
+
+
+def language_hint_keys(path: Union[str, Path]) -> List[str]:
+    """Claves de caché de idioma de una canción: su artista (etiqueta) y su biblioteca (carpeta)"""
+    path = Path(path)
+    keys = []
+    tags = probe_tags(path)
+    artist = tags.get('artist') or tags.get('album_artist')
+    if artist:
+        keys.append('artist:' + re.sub(r'\s+', ' ', artist).strip().lower())
+    keys.append('library:' + str(path.resolve().parent))
+    return keys
+
+
+class LanguageHintCache:
+    """Idioma conocido por artista o por biblioteca, persistido en JSON.
+
+    Con una pista en caché Whisper no detecta el idioma (ni se arriesga a equivocarse en
+    una intro instrumental). Una detección nueva se guarda para el artista; una carpeta
+    mezcla artistas e idiomas, así que solo se fija con `set_hint` o cuando
+    LIBRARY_AGREEMENT detecciones en ella coinciden sin ninguna en contra.
+    """
+    _DETECTIONS_KEY = '_library_detections'
+
+    def __init__(self, path: Union[str, Path] = LANGUAGE_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._hints: Dict[str, str] = json.load(f)
+        except (OSError, ValueError):
+            self._hints = {}
+        # Idiomas detectados por carpeta, aún sin pista fijada: {'library:ruta': {'es': 2}}
+        self._detections: Dict[str, Dict[str, int]] = self._hints.pop(self._DETECTIONS_KEY, None) or {}
+
+    def _save(self):
+        atomic_write_json(self.path, {**self._hints, self._DETECTIONS_KEY: self._detections})
+
+    def lookup(self, keys: Sequence[str]) -> Optional[str]:
+        with self._lock:
+            return next((self._hints[k] for k in keys if k in self._hints), None)
+
+    def set_hint(self, key: str, language: str):
+        """Fija a mano el idioma de un artista ('artist:nombre') o biblioteca ('library:ruta')"""
+        with self._lock:
+            self._hints[key] = language
+            self._detections.pop(key, None)
+            self._save()
+
+    def remember(self, keys: Sequence[str], language: str):
+        """Guarda un idioma detectado sin pisar pistas ya existentes: el del artista a la
+        primera, el de la carpeta cuando sus detecciones coinciden"""
+        with self._lock:
+            changed = False
+            for key in keys:
+                if key in self._hints:
+                    continue
+                if key.startswith('artist:'):
+                    self._hints[key] = language
+                elif key.startswith('library:'):
+                    votes = self._detections.setdefault(key, {})
+                    votes[language] = votes.get(language, 0) + 1
+                    if len(votes) == 1 and votes[language] >= LIBRARY_AGREEMENT:
+                        self._hints[key] = language
+                        del self._detections[key]
+                else:
+                    continue
+                changed = True
+            if changed:
+                self._save()
+
+
+def split_at_silences(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                      chunk_seconds: float = CHUNK_SECONDS,
+                      search_seconds: float = SILENCE_SEARCH_SECONDS) -> List[Tuple[int, int]]:
+    """Tramos (inicio, fin) en muestras que cubren el audio, cortados en pausas de la voz"""
+    frame = max(int(ENERGY_FRAME_SECONDS * sample_rate), 1)
+    n_frames = len(audio) // frame
+    target = int(chunk_seconds / ENERGY_FRAME_SECONDS)
+    search = min(int(search_seconds / ENERGY_FRAME_SECONDS), target // 2)
+    if n_frames <= target + search:
+        return [(0, len(audio))]
+
+    energy = np.sqrt((audio[:n_frames * frame].reshape(n_frames, frame) ** 2).mean(axis=1))
+    energy = np.convolve(energy, np.ones(ENERGY_SMOOTH_FRAMES) / ENERGY_SMOOTH_FRAMES, mode='same')
+    cuts = [0]
+    position = 0
+    while n_frames - position > target + search:
+        low = position + target - search
+        cut = low + int(np.argmin(energy[low:position + target + search]))
+        cuts.append(cut * frame)
+        position = cut
+    cuts.append(len(audio))
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def merge_chunk_segments(chunks: Sequence[Tuple[int, int, int]], results: Sequence[Dict],
+                         sample_rate: int = SAMPLE_RATE) -> List[Dict]:
+    """Une los segmentos de cada trozo en la línea temporal de la canción.
+
+    `chunks` son (inicio con contexto, inicio propio, fin propio) en muestras. Cada palabra
+    pertenece al trozo en cuyo tramo propio cae su centro, así las palabras del contexto
+    compartido en una costura aparecen una sola vez.
+    """
+    merged = []
+    for (padded_start, start, end), result in zip(chunks, results):
+        offset = padded_start / sample_rate
+        own_start, own_end = start / sample_rate, end / sample_rate
+        for segment in result.get('segments', []):
+            words = []
+            for word in segment.get('words', []):
+                word = dict(word, start=round(word['start'] + offset, 2), end=round(word['end'] + offset, 2))
+                if own_start <= (word['start'] + word['end']) / 2 < own_end:
+                    words.append(word)
+            if not words:
+                continue
+            merged.append(dict(
+                segment,
+                seek=segment['seek'] + round(offset * FRAMES_PER_SECOND),
+                start=words[0]['start'],
+                end=words[-1]['end'],
+                text=''.join(word['word'] for word in words),
+                words=words
+            ))
+    merged.sort(key=lambda seg: seg['start'])
+    for i, segment in enumerate(merged):
+        segment['id'] = i
+    return merged
+
+
+# Modelo de cada proceso del pool de transcripción (se crea en _init_chunk_worker)
+_chunk_model: Optional[Whisper] = None
+_chunk_options: Dict = {}
+
+
+def _init_chunk_worker(dims: Dict, state_dict: Dict[str, torch.Tensor], alignment_heads: torch.Tensor,
+                       options: Dict, num_threads: int):
+    """Reconstruye Whisper sobre los pesos en memoria compartida del proceso padre"""
+    global _chunk_model, _chunk_options
+    torch.set_num_threads(num_threads)
+    dims = ModelDimensions(**dims)
+    model = build_on_meta(lambda: Whisper(dims))
+    # assign=True adopta los tensores compartidos en lugar de copiarlos
+    assign_weights(model, state_dict, buffers=_whisper_buffers(dims, alignment_heads))
+    _chunk_model = model.eval()
+    _chunk_options = options
+
+
+def _transcribe_chunk(audio: np.ndarray, language: str) -> Dict:
+    return _chunk_model.transcribe(audio, word_timestamps=True, fp16=False, language=language, **_chunk_options)
+
+
+class _SongState:
+    """Estado de una canción dentro de la transcripción por lotes"""
+
+    def __init__(self, index: int, audio_path: str, mel: torch.Tensor):
+        self.index = index
+        self.audio_path = audio_path
+        self.mel = mel
+        self.content_frames = mel.shape[-1] - N_FRAMES
+        self.seek = 0
+        self.language: Optional[str] = None
+        self.segments: List[Dict] = []
+        self.last_speech_timestamp = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.seek >= self.content_frames
+
+    def window(self):
+        """Ventana de 30 s actual (mel, nº de frames reales)"""
+        segment_size = min(N_FRAMES, self.content_frames - self.seek)
+        mel_segment = whisper.pad_or_trim(self.mel[:, self.seek:self.seek + segment_size], N_FRAMES)
+        return mel_segment, segment_size
+
+
 class LyricsTranscriber:
-    def __init__(self, model_size="medium"):
-        logger.info(f"Inicializando transcriber con modelo {model_size}")
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = whisper.load_model(model_size, device=self.device)
+    def __init__(self, model_size: Optional[str] = None, preset: str = DEFAULT_TRANSCRIPTION_PRESET,
+                 language_cache: Optional[LanguageHintCache] = None, device: Optional[str] = None,
+                 workers: int = 1, convert_model: bool = False):
+        """`preset` fija las opciones de decodificación y el modelo; `model_size` sustituye
+        solo el modelo del preset. Con `workers` > 1 (solo CPU) las canciones largas se
+        trocean en pausas y se transcriben en paralelo en otros tantos procesos.
+        `convert_model` guarda el checkpoint mapeable si falta (ver load_whisper_model)"""
+        self.preset = preset
+        self.options = get_transcription_preset(preset)
+        model_size = model_size or self.options['model_size']
+        self.model_size = model_size
+        self.language_cache = language_cache if language_cache is not None else LanguageHintCache()
+        logger.info(f"Inicializando transcriber con modelo {model_size} (preset {preset})")
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        with MODEL_LOAD.time(model=f'whisper-{model_size}'):
+            self.model = load_whisper_model(model_size, self.device, convert=convert_model)
+        # Whisper instala hooks temporales (kv-cache, atención cruzada) en el propio modelo:
+        # dos decodificaciones simultáneas se mezclarían, así que el modelo se usa en exclusiva
+        self._model_lock = threading.Lock()
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Regiones de perfilado: la decodificación llama a encoder/decoder por separado y
+        # los word timestamps ejecutan el forward completo del modelo
+        instrument_module(self.model.encoder, 'whisper.encode')
+        instrument_module(self.model.decoder, 'whisper.decode')
+        instrument_module(self.model, 'whisper.align_words')
         logger.info(f"✅ Modelo cargado en {self.device}")
 
     def _load_whisper_model(self, model_size):
@@ -31,23 +364,41 @@ class LyricsTranscriber:
             logger.error(f"Error cargando modelo Whisper: {str(e)}")
             raise
 
-    def transcribe_audio(self, audio_path: str, output_dir: str = None) -> Dict:
-        """Transcribe audio y guarda con nombres fijos"""
+    def transcribe_audio(self, audio_path: str, output_dir: str = None, language: Optional[str] = None,
+                         hint_keys: Optional[Sequence[str]] = None, word_timestamps: bool = True) -> Dict:
+        """Transcribe audio y guarda con nombres fijos. Sin `language`, se busca en la caché
+        con `hint_keys` (ver language_hint_keys) antes de dejar que Whisper lo detecte.
+        Sin `word_timestamps` solo hay tiempos por segmento (sin la pasada de alineación DTW);
+        las palabras se calculan después con `align_segment_words` (ver src.scripts.lazy_words)"""
         try:
             # Verificar archivo
             if not Path(audio_path).exists():
                 raise FileNotFoundError(f"Archivo no encontrado: {audio_path}")
 
-            # Transcripción
-            result = self.model.transcribe(
-                audio_path,
-                word_timestamps=True,
-                fp16=(self.device == "cuda")
-            )
+            hint_keys = list(hint_keys or [])
+            if language is None and hint_keys:
+                language = self.language_cache.lookup(hint_keys)
+
+            # Transcripción (la paralela une trozos por sus palabras: solo con word timestamps)
+            if word_timestamps and self.workers > 1 and self.device == "cpu":
+                result = self._transcribe_parallel(audio_path, language)
+            else:
+                with self._model_lock:
+                    result = self.model.transcribe(
+                        audio_path,
+                        word_timestamps=word_timestamps,
+                        fp16=(self.device == "cuda"),
+                        language=language,
+                        **self._decode_kwargs()
+                    )
+
+            if language is None and hint_keys and result.get('language'):
+                self.language_cache.remember(hint_keys, result['language'])
 
             processed = {
                 'text': result.get('text', ''),
-                'segments': result.get('segments', [])
+                'segments': result.get('segments', []),
+                'language': result.get('language', language)
             }
 
             if output_dir:
@@ -60,14 +411,332 @@ class LyricsTranscriber:
             logger.error(f"Error en transcripción: {str(e)}")
             raise
 
+    def song_mel(self, audio_path: str) -> torch.Tensor:
+        """Espectrograma log-mel de la canción completa (en CPU), para alinear por segmentos"""
+        audio = whisper.load_audio(str(audio_path))
+        return whisper.log_mel_spectrogram(audio, self.model.dims.n_mels)
+
+    def detect_language(self, audio_path: str) -> str:
+        return self._detect_language_of(whisper.load_audio(str(audio_path)))
+
+    def align_segment_words(self, mel: torch.Tensor, segment: Dict, language: Optional[str]) -> List[Dict]:
+        """Tiempos de palabra de un único segmento (DTW sobre la atención cruzada, como los
+        word timestamps de Whisper) usando solo el audio de ese segmento"""
+        tokenizer = get_tokenizer(
+            self.model.is_multilingual,
+            num_languages=self.model.num_languages,
+            language=language,
+            task="transcribe"
+        )
+        tokens = [t for t in segment.get('tokens', []) if t < tokenizer.eot]
+        if not tokens:
+            tokens = tokenizer.encode(' ' + segment.get('text', '').strip())
+        if not tokens:
+            return []
+        start_frame = max(int(segment['start'] * FRAMES_PER_SECOND), 0)
+        end_frame = min(int((segment['end'] + WORD_ALIGN_MARGIN_SECONDS) * FRAMES_PER_SECOND), mel.shape[-1])
+        num_frames = min(max(end_frame - start_frame, 1), N_FRAMES)
+        window = whisper.pad_or_trim(mel[:, start_frame:start_frame + num_frames], N_FRAMES).to(self.device)
+        # add_word_timestamps mide los tiempos desde `seek`: aquí, el inicio del segmento
+        probe = dict(segment, seek=start_frame, tokens=tokens)
+        with self._model_lock:
+            add_word_timestamps(
+                segments=[probe],
+                model=self.model,
+                tokenizer=tokenizer,
+                mel=window,
+                num_frames=num_frames,
+                last_speech_timestamp=segment['start']
+            )
+        return probe.get('words', [])
+
+    def _decode_kwargs(self) -> Dict:
+        """Opciones del preset en el formato de whisper.transcribe"""
+        return {key: self.options[key] for key in (
+            'temperature', 'compression_ratio_threshold', 'logprob_threshold', 'no_speech_threshold',
+            'condition_on_previous_text', 'beam_size', 'best_of'
+        )}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Pool de transcripción, creado al primer uso y reutilizado entre canciones.
+
+        Los pesos se mueven a memoria compartida y los procesos hijos los reciben por
+        referencia (reducciones de torch.multiprocessing): N procesos no ocupan N modelos.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                with self._model_lock:
+                    self.model.share_memory()
+                    state_dict = self.model.state_dict()
+                    heads = self.model.alignment_heads.to_dense().share_memory_()
+                num_threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=torch_mp.get_context('spawn'),
+                    initializer=_init_chunk_worker,
+                    initargs=(vars(self.model.dims), state_dict, heads, self._decode_kwargs(), num_threads)
+                )
+                logger.info(f"Pool de transcripción: {self.workers} procesos x {num_threads} hilos")
+            return self._pool
+
+    def _detect_language_of(self, audio: np.ndarray) -> str:
+        """Idioma de la ventana de 30 s con más energía (la intro suele ser instrumental)"""
+        if not self.model.is_multilingual:
+            return "en"
+        window = N_FRAMES * HOP_LENGTH
+        starts = range(0, max(len(audio) - window, 0) + 1, window // 2)
+        start = max(starts, key=lambda s: float(np.square(audio[s:s + window]).mean()))
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio[start:start + window]),
+                                          self.model.dims.n_mels).to(self.device)
+        with self._model_lock:
+            _, probs = self.model.detect_language(mel)
+        return max(probs, key=probs.get)
+
+    def _transcribe_parallel(self, audio_path: str, language: Optional[str]) -> Dict:
+        """Transcribe los trozos de la canción en el pool y une sus word timestamps"""
+        audio = whisper.load_audio(str(audio_path))
+        spans = split_at_silences(audio)
+        if len(spans) == 1:
+            with self._model_lock:
+                return self.model.transcribe(audio, word_timestamps=True, fp16=False, language=language,
+                                             **self._decode_kwargs())
+
+        # Un único idioma para todos los trozos, como en la transcripción secuencial
+        language = language or self._detect_language_of(audio)
+        padding = int(SEAM_PADDING_SECONDS * SAMPLE_RATE)
+        chunks = [(max(start - padding, 0), start, end) for start, end in spans]
+        pool = self._get_pool()
+        futures = [pool.submit(_transcribe_chunk, audio[padded:min(end + padding, len(audio))], language)
+                   for padded, _, end in chunks]
+        results = [future.result() for future in futures]
+
+        segments = merge_chunk_segments(chunks, results)
+        return {
+            'text': ''.join(seg['text'] for seg in segments),
+            'segments': segments,
+            'language': language
+        }
+
+    def close(self):
+        """Detiene el pool de transcripción en paralelo, si se llegó a crear"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def transcribe_batch(
+        self,
+        audio_paths: Sequence[str],
+        output_dirs: Optional[Sequence[str]] = None,
+        batch_size: int = 8,
+        language: Optional[str] = None,
+        hint_keys: Optional[Sequence[Sequence[str]]] = None
+    ) -> List[Dict]:
+        """Transcribe varias canciones empaquetando sus ventanas de 30 s en un mismo lote.
+
+        En cada paso se toma la ventana actual de hasta `batch_size` canciones y se
+        decodifican juntas (encoder y decoder con batch > 1). Los resultados se reparten
+        por canción con las mismas reglas de segmentación y word timestamps que
+        `transcribe`, sin condicionar en el texto previo. `hint_keys` (una lista por canción)
+        permite saltar la detección de idioma de las canciones con pista en caché.
+        """
+        for path in audio_paths:
+            if not Path(path).exists():
+                raise FileNotFoundError(f"Archivo no encontrado: {path}")
+        if output_dirs is not None and len(output_dirs) != len(audio_paths):
+            raise ValueError("output_dirs debe tener un elemento por canción")
+        if hint_keys is not None and len(hint_keys) != len(audio_paths):
+            raise ValueError("hint_keys debe tener un elemento por canción")
+
+        n_mels = self.model.dims.n_mels
+        states = []
+        for i, path in enumerate(audio_paths):
+            audio = whisper.load_audio(str(path))
+            mel = whisper.log_mel_spectrogram(audio, n_mels, padding=N_FRAMES * HOP_LENGTH)
+            states.append(_SongState(i, str(path), mel.to(self.device)))
+            if language is None and hint_keys is not None:
+                states[-1].language = self.language_cache.lookup(hint_keys[i])
+
+        with self._model_lock:
+            self._detect_languages([s for s in states if not s.done and s.language is None], language, batch_size)
+            if language is None and hint_keys is not None:
+                for state in states:
+                    if state.language:
+                        self.language_cache.remember(hint_keys[state.index], state.language)
+
+            pending = [s for s in states if not s.done]
+            while pending:
+                # Agrupar por idioma: DecodingOptions admite un único idioma por llamada
+                by_language: Dict[str, List[_SongState]] = {}
+                for state in pending:
+                    by_language.setdefault(state.language, []).append(state)
+                for lang, group in by_language.items():
+                    for start in range(0, len(group), batch_size):
+                        self._decode_step(group[start:start + batch_size], lang)
+                pending = [s for s in states if not s.done]
+
+        results = []
+        for state in states:
+            segments = [seg for seg in state.segments if seg['text'].strip() and seg['start'] != seg['end']]
+            for i, seg in enumerate(segments):
+                seg['id'] = i
+            processed = {
+                'text': ''.join(seg['text'] for seg in segments),
+                'segments': segments,
+                'language': state.language
+            }
+            if output_dirs:
+                self._save_results(processed, Path(output_dirs[state.index]))
+            results.append(processed)
+        return results
+
+    def _detect_languages(self, states: List[_SongState], language: Optional[str], batch_size: int):
+        if language or not self.model.is_multilingual:
+            for state in states:
+                state.language = language or "en"
+            return
+        for start in range(0, len(states), batch_size):
+            group = states[start:start + batch_size]
+            mel_batch = torch.stack([state.window()[0] for state in group])
+            if self.device == "cuda":
+                mel_batch = mel_batch.half()
+            _, probs = detect_language(self.model, mel_batch)
+            for state, lang_probs in zip(group, probs):
+                state.language = max(lang_probs, key=lang_probs.get)
+
+    def _decode_step(self, group: List[_SongState], language: str):
+        """Decodifica la ventana actual de cada canción del grupo y avanza su posición"""
+        tokenizer = get_tokenizer(
+            self.model.is_multilingual,
+            num_languages=self.model.num_languages,
+            language=language,
+            task="transcribe"
+        )
+        windows = [state.window() for state in group]
+        mel_batch = torch.stack([mel for mel, _ in windows])
+        if self.device == "cuda":
+            mel_batch = mel_batch.half()
+
+        # Decodificación por lotes con fallback de temperatura solo para los que fallan
+        preset = self.options
+        results = [None] * len(group)
+        remaining = list(range(len(group)))
+        for temperature in preset['temperature']:
+            options = DecodingOptions(
+                task="transcribe",
+                language=language,
+                temperature=temperature,
+                # beam search solo en greedy; best_of solo con muestreo (igual que whisper.transcribe)
+                beam_size=preset['beam_size'] if temperature == 0 else None,
+                best_of=preset['best_of'] if temperature > 0 else None,
+                without_timestamps=False,
+                fp16=(self.device == "cuda")
+            )
+            decoded = whisper.decode(self.model, mel_batch[remaining], options)
+            retry = []
+            for idx, result in zip(remaining, decoded):
+                results[idx] = result
+                needs_fallback = (
+                    (preset['compression_ratio_threshold'] is not None
+                     and compression_ratio(result.text) > preset['compression_ratio_threshold'])
+                    or (preset['logprob_threshold'] is not None
+                        and result.avg_logprob < preset['logprob_threshold'])
+                )
+                no_speech = (preset['no_speech_threshold'] is not None
+                             and result.no_speech_prob > preset['no_speech_threshold'])
+                if needs_fallback and not no_speech:
+                    retry.append(idx)
+            remaining = retry
+            if not remaining:
+                break
+
+        for state, (mel_segment, segment_size), result in zip(group, windows, results):
+            self._consume_window(state, tokenizer, result, mel_segment, segment_size)
+
+    def _consume_window(self, state: _SongState, tokenizer, result, mel_segment, segment_size: int):
+        """Convierte los tokens de una ventana en segmentos (lógica de whisper.transcribe)"""
+        input_stride = N_FRAMES // self.model.dims.n_audio_ctx
+        time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+        time_offset = float(state.seek * HOP_LENGTH / SAMPLE_RATE)
+
+        no_speech, logprob = self.options['no_speech_threshold'], self.options['logprob_threshold']
+        if (no_speech is not None and result.no_speech_prob > no_speech
+                and (logprob is None or result.avg_logprob < logprob)):
+            state.seek += segment_size
+            return
+
+        def new_segment(start, end, tokens):
+            tokens = tokens.tolist()
+            return {
+                'seek': state.seek,
+                'start': start,
+                'end': end,
+                'text': tokenizer.decode([t for t in tokens if t < tokenizer.eot]),
+                'tokens': tokens,
+                'temperature': result.temperature,
+                'avg_logprob': result.avg_logprob,
+                'compression_ratio': result.compression_ratio,
+                'no_speech_prob': result.no_speech_prob,
+            }
+
+        tokens = torch.tensor(result.tokens)
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1
+
+        current_segments = []
+        previous_seek = state.seek
+        if len(consecutive) > 0:
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+            last_slice = 0
+            for current_slice in slices:
+                sliced = tokens[last_slice:current_slice]
+                start_pos = sliced[0].item() - tokenizer.timestamp_begin
+                end_pos = sliced[-1].item() - tokenizer.timestamp_begin
+                current_segments.append(new_segment(
+                    time_offset + start_pos * time_precision,
+                    time_offset + end_pos * time_precision,
+                    sliced
+                ))
+                last_slice = current_slice
+            if single_timestamp_ending:
+                state.seek += segment_size
+            else:
+                last_timestamp_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                state.seek += last_timestamp_pos * input_stride
+        else:
+            duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                duration = (timestamps[-1].item() - tokenizer.timestamp_begin) * time_precision
+            current_segments.append(new_segment(time_offset, time_offset + duration, tokens))
+            state.seek += segment_size
+
+        if not current_segments:
+            return
+        add_word_timestamps(
+            segments=current_segments,
+            model=self.model,
+            tokenizer=tokenizer,
+            mel=mel_segment,
+            num_frames=segment_size,
+            last_speech_timestamp=state.last_speech_timestamp
+        )
+        words = [w for seg in current_segments for w in seg.get('words', [])]
+        if words:
+            state.last_speech_timestamp = words[-1]['end']
+            if not single_timestamp_ending and words[-1]['end'] > time_offset:
+                state.seek = max(previous_seek + 1, round(words[-1]['end'] * FRAMES_PER_SECOND))
+        state.segments.extend(current_segments)
+
     def _save_results(self, result: Dict, output_dir: Path):
         """Guarda resultados con nombres fijos"""
         output_dir.mkdir(exist_ok=True)
         
-        # Archivo de texto (nombre fijo)
-        with open(output_dir / "song_lyrics.txt", 'w', encoding='utf-8') as f:
-            f.write(result.get('text', ''))
+        # Archivo de texto (nombre fijo, publicación atómica)
+        atomic_write_text(output_dir / "song_lyrics.txt", result.get('text', ''))
         
-        # Archivo JSON (nombre fijo)
-        with open(output_dir / "song_timed.json", 'w', encoding='utf-8') as f:
-            json.dump(result.get('segments', []), f, ensure_ascii=False, indent=2)
\ No newline at end of file
+        # Archivo JSON (nombre fijo, publicación atómica)
+        atomic_write_json(output_dir / "song_timed.json", result.get('segments', []))
\ No newline at end of file
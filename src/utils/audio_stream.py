@@ -0,0 +1,184 @@
+"""Decodificación y remuestreo por bloques.
+
+La entrada se lee en bloques de tamaño fijo (soundfile o una tubería de ffmpeg) y se
+remuestrea con un resampler con estado (soxr), de modo que la memoria máxima no depende
+de la duración del archivo. Los bloques se entregan como arrays float32 (canales, muestras).
+"""
+import math
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import ffmpeg
+import numpy as np
+import soundfile as sf
+import soxr
+
+from src.utils.files import atomic_output
+from src.utils.profiling import profile_region
+
+DEFAULT_BLOCK_FRAMES = 1 << 16  # ~1.5 s a 44.1kHz
+
+
+def _probe(path: Union[str, Path]) -> Tuple[int, int, bool]:
+    """(sample_rate, canales, legible_por_soundfile)"""
+    try:
+        info = sf.info(str(path))
+        return info.samplerate, info.channels, True
+    except RuntimeError:
+        probe = ffmpeg.probe(str(path))
+        stream = next((s for s in probe['streams'] if s.get('codec_type') == 'audio'), None)
+        if stream is None:
+            raise RuntimeError(f"No se encontró pista de audio en {path}")
+        return int(stream['sample_rate']), int(stream['channels']), False
+
+
+def probe_audio(path: Union[str, Path]) -> Tuple[int, int]:
+    """Devuelve (sample_rate, canales) sin decodificar el archivo"""
+    return _probe(path)[:2]
+
+
+def audio_duration(path: Union[str, Path]) -> float:
+    """Duración en segundos leída de la cabecera/contenedor"""
+    try:
+        return sf.info(str(path)).duration
+    except RuntimeError:
+        return float(ffmpeg.probe(str(path))['format']['duration'])
+
+
+def probe_tags(path: Union[str, Path]) -> Dict[str, str]:
+    """Etiquetas del contenedor (artist, album...) con claves en minúscula; {} si no hay"""
+    try:
+        tags = ffmpeg.probe(str(path)).get('format', {}).get('tags', {})
+    except (ffmpeg.Error, OSError):
+        return {}
+    return {str(k).lower(): str(v) for k, v in tags.items()}
+
+
+def _iter_soundfile(path: Path, block_frames: int) -> Iterator[np.ndarray]:
+    for block in sf.blocks(str(path), blocksize=block_frames, dtype='float32', always_2d=True):
+        yield block
+
+
+def _iter_ffmpeg(path: Path, block_frames: int, channels: int) -> Iterator[np.ndarray]:
+    """Decodifica con ffmpeg a PCM float32 entrelazado y lo lee por bloques de la tubería"""
+    process = subprocess.Popen(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-i', str(path),
+         '-vn', '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', str(channels), '-'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    frame_bytes = 4 * channels
+    pending = b''
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_frames * frame_bytes)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % frame_bytes
+            pending = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, channels)
+        finished = True
+    finally:
+        if not finished:
+            # El consumidor dejó de leer: no esperar a que ffmpeg termine
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors='ignore')
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo decodificar {path}: {stderr.strip()}")
+
+
+def _match_channels(block: np.ndarray, channels: int) -> np.ndarray:
+    """Ajusta un bloque (muestras, canales) al número de canales pedido"""
+    if block.shape[1] == channels:
+        return block
+    if block.shape[1] == 1:
+        return np.repeat(block, channels, axis=1)
+    if channels == 1:
+        return block.mean(axis=1, keepdims=True)
+    return block[:, :channels]
+
+
+def iter_audio_blocks(
+    path: Union[str, Path],
+    target_sr: Optional[int] = None,
+    channels: int = 2,
+    block_frames: int = DEFAULT_BLOCK_FRAMES
+) -> Iterator[np.ndarray]:
+    """Genera bloques float32 (canales, muestras) del archivo, remuestreados a `target_sr`"""
+    path = Path(path)
+    sample_rate, source_channels, readable = _probe(path)
+    if readable:
+        source = _iter_soundfile(path, block_frames)
+    else:
+        source = _iter_ffmpeg(path, block_frames, source_channels)
+
+    resampler = None
+    if target_sr and target_sr != sample_rate:
+        resampler = soxr.ResampleStream(sample_rate, target_sr, channels, dtype='float32', quality='HQ')
+
+    while True:
+        with profile_region('decode'):
+            block = next(source, None)
+        if block is None:
+            break
+        block = _match_channels(block, channels)
+        if resampler is not None:
+            with profile_region('resample'):
+                block = resampler.resample_chunk(np.ascontiguousarray(block))
+        if len(block):
+            yield np.ascontiguousarray(block.T)
+
+    if resampler is not None:
+        tail = resampler.resample_chunk(np.zeros((0, channels), dtype=np.float32), last=True)
+        if len(tail):
+            yield np.ascontiguousarray(tail.T)
+
+
+def read_audio(path: Union[str, Path], target_sr: Optional[int] = None, channels: int = 2) -> Tuple[np.ndarray, int]:
+    """Lee el archivo completo vía bloques. Devuelve (audio (canales, muestras), sample_rate).
+
+    El resultado se reserva una vez con la duración de la cabecera y cada bloque se copia en
+    su sitio, así que el pico de memoria es la canción de salida más un bloque (sin lista de
+    bloques ni np.concatenate). Si la cabecera se queda corta, el búfer crece.
+    """
+    sample_rate = target_sr or probe_audio(path)[0]
+    capacity = int(math.ceil(audio_duration(path) * sample_rate)) + DEFAULT_BLOCK_FRAMES
+    audio = np.empty((channels, capacity), dtype=np.float32)
+    filled = 0
+    for block in iter_audio_blocks(path, target_sr=target_sr, channels=channels):
+        end = filled + block.shape[1]
+        if end > audio.shape[1]:
+            grown = np.empty((channels, max(end, 2 * audio.shape[1])), dtype=np.float32)
+            grown[:, :filled] = audio[:, :filled]
+            audio = grown
+        audio[:, filled:end] = block
+        filled = end
+    return audio[:, :filled], sample_rate
+
+
+def stream_to_wav(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    target_sr: Optional[int] = 44100,
+    channels: int = 2,
+    subtype: str = 'PCM_16'
+) -> Path:
+    """Convierte cualquier entrada a WAV bloque a bloque (sin `target_sr` conserva la
+    frecuencia original). La escritura es atómica"""
+    output_path = Path(output_path)
+    target_sr = target_sr or probe_audio(input_path)[0]
+    clip = subtype.startswith('PCM')
+    with atomic_output(output_path) as temp_path:
+        with sf.SoundFile(str(temp_path), 'w', samplerate=target_sr, channels=channels,
+                          subtype=subtype, format='WAV') as out:
+            for block in iter_audio_blocks(input_path, target_sr=target_sr, channels=channels):
+                frames = block.T
+                out.write(np.clip(frames, -1.0, 1.0) if clip else frames)
+    return output_path
@@ -4,28 +4,22 @@ import numpy as np
 from typing import Union
 from pathlib import Path
 from typing import Tuple, Optional
-import tempfile
 import os
 from pydub import AudioSegment
 import warnings
+from src.utils.audio_stream import stream_to_wav
+from src.utils.files import atomic_output, new_temp_file
+from src.utils.loudness import write_loudness
+from src.utils.peaks import write_peaks
 
-def convert_to_wav(input_path: Union[str, Path]) -> Tuple[str, Optional[str]]:
-    """Conversión robusta a WAV usando torchaudio"""
+def convert_to_wav(input_path: Union[str, Path], target_sr: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    """Conversión a WAV float32 por bloques (memoria constante, sin recortar picos)"""
     input_path = Path(input_path)
-    temp_file = f"{tempfile.gettempdir()}/{input_path.stem}_temp_{os.getpid()}.wav"
+    # Nombre único: varios trabajos pueden convertir archivos con el mismo nombre a la vez
+    temp_file = str(new_temp_file(prefix=f"{input_path.stem}_temp_", suffix=".wav"))
     
     try:
-        # Cargar con torchaudio que maneja mejor los formatos
-        waveform, sample_rate = torchaudio.load(input_path)
-        
-        # Asegurar formato float32 y rango [-1, 1]
-        waveform = waveform.float()
-        max_val = waveform.abs().max()
-        if max_val > 0:
-            waveform /= max_val
-        
-        # Guardar con torchaudio que garantiza WAV válido
-        torchaudio.save(temp_file, waveform, sample_rate, encoding="PCM_S", bits_per_sample=16)
+        stream_to_wav(input_path, temp_file, target_sr=target_sr, subtype='FLOAT')
         return temp_file, temp_file
     except Exception as e:
         if os.path.exists(temp_file):
@@ -54,8 +48,12 @@ def safe_tensor_to_audio(tensor: torch.Tensor, sample_rate: int) -> torch.Tensor
     elif tensor.dim() == 3:
         tensor = tensor.squeeze(0)
     
-    # Normalización final
-    tensor = normalize_audio(tensor)
+    # Sin normalizar al pico: solo se atenúa si recortaría. La sonoridad se iguala al
+    # reproducir con la ganancia de `<audio>.loudness.json`
+    tensor = tensor.float()
+    max_val = tensor.abs().max() if tensor.numel() else 0.0
+    if max_val > 1.0:
+        tensor = tensor / max_val
     
     # Conversión a int16 para compatibilidad universal
     if tensor.dtype != torch.float32:
@@ -63,17 +61,21 @@ def safe_tensor_to_audio(tensor: torch.Tensor, sample_rate: int) -> torch.Tensor
     
     return tensor
 
-def save_audio(tensor: torch.Tensor, path: Union[str, Path], sample_rate: int):
-    """Guarda audio con todas las protecciones"""
+def save_audio(tensor: torch.Tensor, path: Union[str, Path], sample_rate: int, peaks: bool = False,
+               loudness: bool = False):
+    """Guarda audio con todas las protecciones. Con `peaks` genera además su pirámide de
+    picos y con `loudness` su sonoridad integrada"""
     path = Path(path)
     tensor = safe_tensor_to_audio(tensor, sample_rate)
     
-    # Guardado temporal primero
-    temp_path = f"{tempfile.gettempdir()}/temp_{os.getpid()}_{path.name}"
-    torchaudio.save(temp_path, tensor, sample_rate, encoding="PCM_S", bits_per_sample=16)
-    
-    # Mover al destino final
-    os.replace(temp_path, str(path))
+    # Guardado temporal junto al destino y publicación atómica
+    with atomic_output(path, suffix=".wav") as temp_path:
+        torchaudio.save(str(temp_path), tensor, sample_rate, encoding="PCM_S", bits_per_sample=16)
+
+    if peaks:
+        write_peaks(path, tensor.numpy(), sample_rate)
+    if loudness:
+        write_loudness(path, tensor.numpy(), sample_rate)
 
 def safe_audio_load(path: Union[str, Path]) -> AudioSegment:
     """Carga ultra-segura de audio"""
@@ -106,7 +108,7 @@ def save_temp_audio(audio: Union[torch.Tensor, AudioSegment], sample_rate: Optio
     Guarda audio en un archivo temporal seguro, manejando ambos tipos (Tensor y AudioSegment)
     Devuelve la ruta al archivo temporal creado
     """
-    temp_path = f"{tempfile.gettempdir()}/temp_audio_{os.getpid()}.wav"
+    temp_path = str(new_temp_file(prefix="temp_audio_", suffix=".wav"))
     
     if isinstance(audio, torch.Tensor):
         if sample_rate is None:
@@ -0,0 +1,107 @@
+"""Checkpoints mapeables en memoria para arrancar los modelos en frío sin copias.
+
+El formato es un `torch.save` (zip) con el state_dict ya definitivo y los argumentos de
+construcción del modelo. `torch.load(mmap=True)` no lee los pesos: los tensores apuntan a
+páginas del archivo que el sistema carga al usarse y que comparten todos los procesos que
+abren el mismo checkpoint. El modelo se construye en el dispositivo `meta` (sin reservar
+ni inicializar pesos aleatorios) y `load_state_dict(assign=True)` adopta esos tensores.
+"""
+import json
+from fractions import Fraction
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import torch
+
+from src.utils.files import atomic_output
+
+MMAP_FORMAT = 1
+MMAP_SUFFIX = ".mmap.pt"
+
+
+def mmap_path_for(path: Union[str, Path]) -> Path:
+    """best_model.pth -> best_model.mmap.pt"""
+    path = Path(path)
+    return path.with_name(path.stem + MMAP_SUFFIX)
+
+
+def _encode(value):
+    # Fraction (p. ej. el segmento de HTDemucs) no sobrevive a float sin cambiar la longitud en muestras
+    if isinstance(value, Fraction):
+        return {'__fraction__': [value.numerator, value.denominator]}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {'__fraction__'}:
+            return Fraction(*value['__fraction__'])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def save_mmap_checkpoint(path: Union[str, Path], state_dict: Dict[str, torch.Tensor],
+                         config: Optional[Dict] = None, source: Optional[Union[str, Path]] = None) -> Path:
+    """Guarda pesos contiguos en CPU y la configuración (JSON) para reconstruir el modelo.
+    `source` registra tamaño y fecha del checkpoint original para detectar que cambió"""
+    path = Path(path)
+    payload = {
+        'format': MMAP_FORMAT,
+        'config': json.dumps(_encode(config or {})),
+        'source': json.dumps(_source_signature(source) if source else None),
+        'state_dict': {k: v.detach().cpu().contiguous() for k, v in state_dict.items()},
+    }
+    with atomic_output(path) as temp_path:
+        torch.save(payload, temp_path)
+    return path
+
+
+def _source_signature(source: Union[str, Path]) -> Dict:
+    stat = Path(source).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_mmap_checkpoint(path: Union[str, Path],
+                         source: Optional[Union[str, Path]] = None) -> Optional[Dict]:
+    """Abre el checkpoint sin leer los pesos. None si no existe, es de otro formato o
+    `source` ha cambiado (o ya no existe) desde la conversión"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    payload = torch.load(str(path), map_location='cpu', mmap=True, weights_only=True)
+    if payload.get('format') != MMAP_FORMAT:
+        return None
+    if source is not None:
+        if not Path(source).is_file() or json.loads(payload['source']) != _source_signature(source):
+            return None
+    return {'config': _decode(json.loads(payload['config'])), 'state_dict': payload['state_dict']}
+
+
+def build_on_meta(factory: Callable[[], torch.nn.Module]) -> torch.nn.Module:
+    """Construye el módulo sin pesos reales; si algún constructor no admite `meta`,
+    lo construye normalmente (más lento, el resultado es el mismo tras `assign_weights`)"""
+    try:
+        with torch.device('meta'):
+            return factory()
+    except (NotImplementedError, RuntimeError):
+        return factory()
+
+
+def assign_weights(model: torch.nn.Module, state_dict: Dict[str, torch.Tensor],
+                   buffers: Optional[Dict[str, torch.Tensor]] = None) -> torch.nn.Module:
+    """Adopta los tensores (mapeados) del state_dict; `buffers` rellena los buffers no
+    persistentes (no están en el state_dict). Falla si queda algo sin materializar"""
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    for name, tensor in (buffers or {}).items():
+        module_name, _, buffer_name = name.rpartition('.')
+        model.get_submodule(module_name).register_buffer(buffer_name, tensor, persistent=False)
+    pending = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if pending:
+        raise ValueError(f"Tensores sin valor tras cargar el checkpoint: {pending[:3]}... (total: {len(pending)})")
+    return model
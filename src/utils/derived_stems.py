@@ -0,0 +1,270 @@
+"""Instrumental derivado al reproducir: mezcla menos voces.
+
+HTDemucs separa la mezcla normalizada al pico (`mix_gain * original`) y sus cuatro stems
+suman casi exactamente la entrada, así que el instrumental (batería + bajo + otros) se
+puede reconstruir como `output_gain * (mix_gain * original - vocals_gain * voces)`, donde
+`vocals_gain` deshace la atenuación anticlipping de vocals.wav y `output_gain` es la misma
+que habría recibido instrumental.wav. En este modo no se escribe instrumental.wav: se
+guarda `instrumental.derived.json` con las ganancias y la calidad medida frente a la suma
+de stems del modelo. Los picos y la sonoridad del instrumental se guardan como siempre.
+
+La receta apunta a `mix.wav`, un enlace duro a original/song.wav en la carpeta de stems:
+no ocupa disco y sigue siendo la mezcla exacta que vio el modelo aunque el original se
+vuelva a generar (o los stems se reutilicen en otro workspace).
+
+La calidad se mide al guardar sobre los stems y la mezcla que ya están en memoria,
+simulando el redondeo a 16 bits de vocals.wav, sin volver a decodificar ningún archivo.
+
+`DerivedWavStream` presenta la receta como un WAV PCM de 16 bits: genera la cabecera y
+calcula cada rango de bytes pedido leyendo esas muestras de ambos archivos y restando de
+forma vectorizada. Así la reproducción, los saltos y las descargas por rangos funcionan sin
+el instrumental en disco.
+"""
+import io
+import json
+import os
+import shutil
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+from src.utils.audio_stream import DEFAULT_BLOCK_FRAMES
+from src.utils.files import atomic_output, atomic_write_json
+from src.utils.loudness import write_loudness
+from src.utils.peaks import write_peaks
+
+RECIPE_SUFFIX = ".derived.json"
+RECIPE_VERSION = 1
+MIX_FILENAME = "mix.wav"
+MIN_SDR_DB = 30.0          # por debajo, la resta se oye: se guarda instrumental.wav
+_HEADER_BYTES = 44
+_EPS = 1e-12
+
+
+def recipe_path_for(audio_path: Union[str, Path]) -> Path:
+    """instrumental.wav -> instrumental.derived.json"""
+    return Path(audio_path).with_suffix(RECIPE_SUFFIX)
+
+
+def is_derived(path: Union[str, Path]) -> bool:
+    return str(path).endswith(RECIPE_SUFFIX)
+
+
+def audio_path_for(path: Union[str, Path]) -> Path:
+    """Ruta del audio que sustituye la receta (instrumental.derived.json -> instrumental.wav),
+    para encontrar sus `.peaks.npz` y `.loudness.json`. Otras rutas se devuelven tal cual"""
+    path = Path(path)
+    if not is_derived(path):
+        return path
+    return path.with_name(path.name[:-len(RECIPE_SUFFIX)] + ".wav")
+
+
+def read_recipe(path: Union[str, Path]) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        recipe = json.load(f)
+    if recipe.get('version') != RECIPE_VERSION:
+        raise ValueError(f"Versión de receta no soportada en {path}")
+    return recipe
+
+
+class DerivedInstrumental:
+    """Lector del instrumental de una receta: bloques float32 (canales, muestras) bajo demanda"""
+
+    def __init__(self, recipe_path: Union[str, Path], recipe: Optional[Dict] = None):
+        self.recipe_path = Path(recipe_path)
+        self.recipe = recipe if recipe is not None else read_recipe(self.recipe_path)
+        directory = self.recipe_path.parent
+        self.sample_rate = int(self.recipe['sample_rate'])
+        self.channels = int(self.recipe['channels'])
+        self.frames = int(self.recipe['frames'])
+        self.mix_gain = float(self.recipe['mix_gain'])
+        self.vocals_gain = float(self.recipe['vocals_gain'])
+        self.output_gain = float(self.recipe['output_gain'])
+        self._mix = sf.SoundFile(str(directory / self.recipe['mix']))
+        self._vocals = sf.SoundFile(str(directory / self.recipe['vocals']))
+
+    def read(self, start: int, frames: int) -> np.ndarray:
+        """Muestras [start, start + frames) ya recortadas a [-1, 1]"""
+        start = max(0, min(start, self.frames))
+        frames = max(0, min(frames, self.frames - start))
+        self._mix.seek(start)
+        self._vocals.seek(start)
+        mix = self._mix.read(frames, dtype='float32', always_2d=True)
+        vocals = self._vocals.read(frames, dtype='float32', always_2d=True)
+        return _combine(mix.T, vocals.T, frames, self.channels,
+                        self.mix_gain, self.vocals_gain, self.output_gain)
+
+    def iter_blocks(self, block_frames: int = DEFAULT_BLOCK_FRAMES) -> Iterator[np.ndarray]:
+        for start in range(0, self.frames, block_frames):
+            yield self.read(start, block_frames)
+
+    def read_all(self) -> np.ndarray:
+        return self.read(0, self.frames)
+
+    def close(self):
+        self._mix.close()
+        self._vocals.close()
+
+    def __enter__(self) -> 'DerivedInstrumental':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def _combine(mix: np.ndarray, vocals: np.ndarray, frames: int, channels: int,
+             mix_gain: float, vocals_gain: float, output_gain: float) -> np.ndarray:
+    """`output_gain * (mix_gain * mix - vocals_gain * vocals)` recortado a [-1, 1], en
+    (canales, frames); si una entrada es algo más corta se completa con silencio"""
+    out = np.zeros((channels, frames), dtype=np.float32)
+    out[:, :mix.shape[1]] += mix_gain * mix[:channels, :frames]
+    out[:, :vocals.shape[1]] -= vocals_gain * vocals[:channels, :frames]
+    out *= output_gain
+    np.clip(out, -1.0, 1.0, out=out)
+    return out
+
+
+def _as_pcm16(audio: np.ndarray) -> np.ndarray:
+    """Las muestras tal como se leerán de un WAV PCM de 16 bits"""
+    return np.clip(np.round(audio * 32768.0), -32768, 32767).astype(np.float32) / 32768.0
+
+
+def _wav_header(sample_rate: int, channels: int, frames: int) -> bytes:
+    data_bytes = frames * channels * 2
+    return (b'RIFF' + struct.pack('<I', 36 + data_bytes) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                    sample_rate * channels * 2, channels * 2, 16)
+            + b'data' + struct.pack('<I', data_bytes))
+
+
+class DerivedWavStream(io.RawIOBase):
+    """El instrumental de una receta como archivo WAV PCM 16 bits de solo lectura y con seek"""
+
+    def __init__(self, recipe_path: Union[str, Path]):
+        super().__init__()
+        self.reader = DerivedInstrumental(recipe_path)
+        self._header = _wav_header(self.reader.sample_rate, self.reader.channels, self.reader.frames)
+        self._frame_bytes = self.reader.channels * 2
+        self.size = len(self._header) + self.reader.frames * self._frame_bytes
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        data = self.read_range(self._position, len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def read_range(self, offset: int, size: int) -> bytes:
+        """Bytes [offset, offset + size) del WAV, calculando solo los frames que cubren"""
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return b''
+        parts = []
+        if offset < _HEADER_BYTES:
+            parts.append(self._header[offset:min(end, _HEADER_BYTES)])
+        data_start, data_end = max(offset, _HEADER_BYTES) - _HEADER_BYTES, end - _HEADER_BYTES
+        if data_end > data_start:
+            first = data_start // self._frame_bytes
+            last = -(-data_end // self._frame_bytes)
+            block = self.reader.read(first, last - first)
+            pcm = np.clip(np.round(block.T * 32768.0), -32768, 32767).astype('<i2').tobytes()
+            skip = data_start - first * self._frame_bytes
+            parts.append(pcm[skip:skip + data_end - data_start])
+        return b''.join(parts)
+
+    def close(self):
+        if not self.closed:
+            self.reader.close()
+        super().close()
+
+
+def _link_mix(original_path: Path, mix_path: Path):
+    """mix.wav como enlace duro al original (copia si el sistema de archivos no enlaza)"""
+    with atomic_output(mix_path) as temp_path:
+        temp_path.unlink()
+        try:
+            os.link(original_path, temp_path)
+        except OSError:
+            shutil.copy2(original_path, temp_path)
+
+
+def derive_instrumental(instrumental_path: Union[str, Path], instrumental: np.ndarray,
+                        vocals: np.ndarray, vocals_path: Union[str, Path],
+                        mix: np.ndarray, mix_gain: float,
+                        original_path: Union[str, Path], sample_rate: int,
+                        min_sdr_db: float = MIN_SDR_DB) -> Tuple[Optional[Path], Dict]:
+    """Sustituye instrumental.wav por su receta si la resta reproduce bien los stems sumados
+    del modelo. `instrumental` y `vocals` son los stems en memoria, (canales, muestras), y
+    `vocals_path` ya debe estar guardado a partir de `vocals`. `mix` es la mezcla que separó
+    el modelo, `mix_gain * original` (ver load_mix). Devuelve (receta, calidad); la receta
+    es None (y no queda nada en disco) si la calidad no llega a `min_sdr_db`"""
+    instrumental_path = Path(instrumental_path)
+    recipe_path = recipe_path_for(instrumental_path)
+    mix_path = instrumental_path.with_name(MIX_FILENAME)
+
+    # Las mismas ganancias que load_mix (mezcla) y save_audio (stems)
+    instrumental = np.asarray(instrumental, dtype=np.float32)
+    vocals = np.asarray(vocals, dtype=np.float32)
+    mix = np.asarray(mix, dtype=np.float32)
+    output_gain = 1.0 / max(1.0, float(np.abs(instrumental).max()) if instrumental.size else 0.0)
+    vocals_gain = max(1.0, float(np.abs(vocals).max()) if vocals.size else 0.0)
+    channels, frames = instrumental.shape
+
+    # Calidad por la misma resta que la reproducción, con las voces redondeadas a 16 bits
+    # como en vocals.wav (la mezcla ya viene de un WAV de 16 bits)
+    reference = instrumental * output_gain
+    signal = noise = 0.0
+    max_error = 0.0
+    for start in range(0, frames, DEFAULT_BLOCK_FRAMES):
+        target = reference[:, start:start + DEFAULT_BLOCK_FRAMES]
+        stored = _as_pcm16(vocals[:, start:start + target.shape[1]] / vocals_gain)
+        block = _combine(mix[:, start:start + target.shape[1]], stored, target.shape[1], channels,
+                         1.0, vocals_gain, output_gain)
+        error = block - target
+        signal += float(np.square(target, dtype=np.float64).sum())
+        noise += float(np.square(error, dtype=np.float64).sum())
+        if error.size:
+            max_error = max(max_error, float(np.abs(error).max()))
+    sdr = 10 * np.log10((signal + _EPS) / (noise + _EPS))
+    quality = {'sdr_db': round(float(sdr), 2), 'max_abs_error': round(max_error, 5),
+               'min_sdr_db': min_sdr_db}
+    if sdr < min_sdr_db:
+        mix_path.unlink(missing_ok=True)
+        recipe_path.unlink(missing_ok=True)
+        return None, quality
+
+    _link_mix(Path(original_path), mix_path)
+    atomic_write_json(recipe_path, {
+        'version': RECIPE_VERSION,
+        'mix': MIX_FILENAME,
+        'vocals': Path(vocals_path).name,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'frames': frames,
+        'mix_gain': float(mix_gain),
+        'vocals_gain': vocals_gain,
+        'output_gain': output_gain,
+        'quality': quality,
+    })
+    instrumental_path.unlink(missing_ok=True)
+    write_peaks(instrumental_path, reference, sample_rate)
+    write_loudness(instrumental_path, reference, sample_rate)
+    return recipe_path, quality
@@ -0,0 +1,60 @@
+"""Escritura segura de archivos cuando varios trabajos comparten proceso o máquina.
+
+Los temporales llevan un nombre único (no basta con el pid: dos hilos del mismo proceso
+lo comparten) y se crean en el mismo directorio que el destino, para que `os.replace`
+publique el artefacto de forma atómica sin cruzar sistemas de archivos.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+# mkstemp crea los temporales con permisos 0600: al publicarlos se les da el modo que tendría
+# un archivo creado con open() (0666 menos la umask, leída una vez al importar)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_PUBLISHED_MODE = 0o666 & ~_UMASK
+
+
+def unique_temp_path(target: Union[str, Path], suffix: str = ".tmp") -> Path:
+    """Reserva un archivo temporal vacío junto a `target` (oculto y con nombre único)"""
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=suffix, dir=str(target.parent))
+    os.close(fd)
+    return Path(name)
+
+
+@contextmanager
+def atomic_output(target: Union[str, Path], suffix: str = ".tmp") -> Iterator[Path]:
+    """Da una ruta temporal donde escribir; al salir sin error la publica en `target`"""
+    target = Path(target)
+    temp_path = unique_temp_path(target, suffix)
+    try:
+        yield temp_path
+        if temp_path.exists():
+            os.chmod(temp_path, _PUBLISHED_MODE)
+        os.replace(temp_path, target)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def atomic_write_text(target: Union[str, Path], text: str):
+    with atomic_output(target) as temp_path:
+        temp_path.write_text(text, encoding='utf-8')
+
+
+def atomic_write_json(target: Union[str, Path], data):
+    with atomic_output(target) as temp_path:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def new_temp_file(prefix: str = "lyraoke_", suffix: str = "") -> Path:
+    """Archivo temporal único en el directorio temporal del sistema (lo borra quien lo pide)"""
+    fd, name = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(fd)
+    return Path(name)
@@ -0,0 +1,238 @@
+"""Huella acústica basada en croma para reconocer la misma grabación en otro formato.
+
+La mezcla mono a 11 kHz se resume en un vector de croma (12 clases de nota, 80 Hz-4 kHz)
+cada ~0,19 s. Cada vector se convierte en una palabra de 24 bits comparando cada clase con
+la siguiente y con la que está a tres semitonos: solo cuentan relaciones de energía, así que
+la palabra sobrevive a recodificaciones (MP3, FLAC, ripeos), cambios de ganancia y
+ecualizaciones suaves. Una canción de 3 minutos ocupa ~4 KB.
+
+El índice (`output/cache/fingerprints.jsonl`) guarda la huella de cada workspace terminado.
+La búsqueda es la de los sistemas tipo Chromaprint: las palabras idénticas votan por un
+desplazamiento, y los candidatos con más votos se verifican con la tasa de bits distintos
+alrededor de ese desplazamiento.
+"""
+import base64
+import json
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.utils.audio_stream import read_audio
+from src.utils.files import atomic_output, atomic_write_text
+
+FINGERPRINT_SR = 11025
+FRAME = 4096
+HOP = 2048                 # ~0,19 s por palabra
+FMIN = 80.0
+FMAX = 4000.0
+SILENCE_DB = -60.0         # respecto al frame más fuerte; las palabras en silencio valen 0
+MATCH_BIT_ERROR = 0.25     # dos grabaciones distintas rondan 0,5
+MIN_OVERLAP = 0.9          # fracción de la huella más larga que debe solaparse
+MIN_VOTES = 8
+MAX_CANDIDATES = 5
+# Desfase máximo (una palabra) para reutilizar otra grabación: más y la letra y los stems
+# reutilizados irían desplazados respecto a esta entrada
+MAX_REUSE_OFFSET_SECONDS = HOP / FINGERPRINT_SR
+COMPACT_MIN_LINES = 64
+FINGERPRINT_INDEX_PATH = Path("output") / "cache" / "fingerprints.jsonl"
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+BITS = 24
+
+
+def _chroma_matrix() -> np.ndarray:
+    """(bins de la FFT, 12): suma de cada bin en su clase de nota"""
+    frequencies = np.fft.rfftfreq(FRAME, 1.0 / FINGERPRINT_SR)
+    matrix = np.zeros((len(frequencies), 12))
+    valid = (frequencies >= FMIN) & (frequencies <= FMAX)
+    notes = np.round(12 * np.log2(frequencies[valid] / 440.0) + 69).astype(int) % 12
+    matrix[np.flatnonzero(valid), notes] = 1.0
+    return matrix
+
+
+def fingerprint_audio(audio: np.ndarray) -> np.ndarray:
+    """Palabras uint32 (24 bits útiles) del audio mono a FINGERPRINT_SR"""
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < FRAME:
+        return np.zeros(0, dtype=np.uint32)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME)[::HOP] * np.hanning(FRAME).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    chroma = power @ _chroma_matrix()
+    energy = chroma.sum(axis=1)
+
+    # Relaciones entre clases vecinas (semitono y tercera menor): 2 x 12 bits
+    bits = np.concatenate([chroma > np.roll(chroma, -1, axis=1),
+                           chroma > np.roll(chroma, -3, axis=1)], axis=1)
+    words = (bits.astype(np.uint32) << np.arange(BITS, dtype=np.uint32)).sum(axis=1).astype(np.uint32)
+    with np.errstate(divide='ignore'):
+        level = 10 * np.log10(energy / max(energy.max(), 1e-12))
+    words[level < SILENCE_DB] = 0
+    return words
+
+
+def compute_fingerprint(audio_path: Union[str, Path]) -> np.ndarray:
+    audio, _ = read_audio(audio_path, target_sr=FINGERPRINT_SR, channels=1)
+    return fingerprint_audio(audio[0])
+
+
+def save_fingerprint(path: Union[str, Path], words: np.ndarray) -> Path:
+    path = Path(path)
+    with atomic_output(path) as temp_path:
+        with open(temp_path, 'wb') as f:
+            np.save(f, words.astype(np.uint32))
+    return path
+
+
+def load_fingerprint(path: Union[str, Path]) -> np.ndarray:
+    return np.load(str(path)).astype(np.uint32)
+
+
+def bit_error_rate(a: np.ndarray, b: np.ndarray, offset: int) -> Tuple[float, int]:
+    """(fracción de bits distintos, palabras solapadas) con b desplazada `offset` palabras
+    respecto a a (b[i + offset] frente a a[i])"""
+    start = max(0, -offset)
+    end = min(len(a), len(b) - offset)
+    if end <= start:
+        return 1.0, 0
+    diff = np.bitwise_xor(a[start:end], b[start + offset:end + offset])
+    errors = int(_POPCOUNT[diff.view(np.uint8)].sum())
+    return errors / (BITS * (end - start)), end - start
+
+
+def _encode(words: np.ndarray) -> str:
+    return base64.b64encode(words.astype('<u4').tobytes()).decode('ascii')
+
+
+def _decode(text: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype='<u4').astype(np.uint32)
+
+
+def _record(workspace: str, words: np.ndarray) -> str:
+    return json.dumps({'workspace': workspace, 'words': _encode(words)}) + '\n'
+
+
+class FingerprintIndex:
+    """Huellas de los workspaces procesados, con búsqueda por votos.
+
+    Se persisten como registro JSON Lines (una línea por huella; si un workspace aparece
+    varias veces manda la última). Añadir una huella escribe solo su línea e indexa solo sus
+    palabras, y cada proceso lee únicamente lo que otros han añadido desde su última lectura.
+    Cuando las líneas sustituidas superan a las vigentes el registro se reescribe compacto;
+    una huella que otro proceso añada justo durante esa reescritura puede perderse (solo se
+    pierde la deduplicación de esa canción).
+    """
+
+    def __init__(self, path: Union[str, Path] = FINGERPRINT_INDEX_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, np.ndarray] = {}
+        self._postings: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+        self._inode = None
+        self._offset = 0   # bytes del registro ya leídos
+        self._lines = 0    # líneas leídas, incluidas las sustituidas
+        self._import_legacy()
+        self._refresh()
+
+    def _import_legacy(self):
+        """Índice anterior (un único JSON workspace -> huella) pasado al registro"""
+        legacy = self.path.with_suffix('.json')
+        if self.path.exists() or legacy == self.path or not legacy.is_file():
+            return
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            atomic_write_text(self.path, ''.join(_record(k, _decode(v)) for k, v in entries.items()))
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+
+    def _index(self, workspace: str, words: np.ndarray):
+        previous = self._entries.get(workspace)
+        if previous is not None:
+            for word in set(previous.tolist()) - {0}:
+                self._postings[word] = [p for p in self._postings[word] if p[0] != workspace]
+        self._entries[workspace] = words
+        for position, word in enumerate(words.tolist()):
+            if word:
+                self._postings[word].append((workspace, position))
+
+    def _refresh(self):
+        """Indexa lo añadido al registro desde la última lectura (todo, si se reescribió)"""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._entries, self._postings = {}, defaultdict(list)
+            self._inode, self._offset, self._lines = stat.st_ino, 0, 0
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # Una línea a medio escribir se deja para la próxima lectura
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                self._index(record['workspace'], _decode(record['words']))
+            except (ValueError, KeyError, TypeError):
+                continue
+            self._lines += 1
+        self._offset += end
+
+    def _compact(self):
+        atomic_write_text(self.path, ''.join(_record(k, v) for k, v in self._entries.items()))
+        stat = self.path.stat()
+        self._inode, self._offset, self._lines = stat.st_ino, stat.st_size, len(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, workspace: Union[str, Path], words: np.ndarray):
+        """Registra (o sustituye) la huella de un workspace añadiendo una línea al registro"""
+        key = str(Path(workspace).resolve())
+        record = _record(key, np.asarray(words, dtype=np.uint32)).encode('utf-8')
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Una sola escritura en modo append: las líneas de varios procesos no se mezclan
+            with open(self.path, 'ab') as f:
+                f.write(record)
+            self._refresh()
+            if self._lines > 2 * len(self._entries) + COMPACT_MIN_LINES:
+                self._compact()
+
+    def lookup(self, words: np.ndarray, exclude: Optional[Union[str, Path]] = None,
+               max_offset_seconds: Optional[float] = None) -> List[Dict]:
+        """Workspaces con la misma grabación, del más parecido al menos. `offset_seconds` es
+        cuánto empieza antes la entrada que el workspace; con `max_offset_seconds` se descartan
+        las coincidencias más desplazadas"""
+        excluded = str(Path(exclude).resolve()) if exclude is not None else None
+        with self._lock:
+            self._refresh()
+            votes = Counter()
+            for position, word in enumerate(np.asarray(words).tolist()):
+                if word:
+                    for workspace, other in self._postings.get(word, ()):
+                        if workspace != excluded:
+                            votes[(workspace, other - position)] += 1
+            best_offsets = {}
+            for (workspace, offset), count in votes.most_common():
+                if count < MIN_VOTES:
+                    break
+                best_offsets.setdefault(workspace, offset)
+                if len(best_offsets) >= MAX_CANDIDATES:
+                    break
+            candidates = [(workspace, offset, self._entries[workspace]) for workspace, offset in best_offsets.items()]
+
+        matches = []
+        for workspace, offset, other in candidates:
+            # El desplazamiento votado puede estar a una palabra del mejor
+            ber, overlap, offset = min(bit_error_rate(words, other, o) + (o,) for o in range(offset - 1, offset + 2))
+            if max_offset_seconds is not None and abs(offset) * HOP / FINGERPRINT_SR > max_offset_seconds + 1e-9:
+                continue
+            if ber <= MATCH_BIT_ERROR and overlap >= MIN_OVERLAP * max(len(words), len(other)):
+                matches.append({'workspace': workspace, 'bit_error_rate': round(ber, 4),
+                                'offset_seconds': round(offset * HOP / FINGERPRINT_SR, 2)})
+        return sorted(matches, key=lambda m: m['bit_error_rate'])
@@ -0,0 +1,152 @@
+"""Sonoridad integrada (ITU-R BS.1770 / EBU R128) medida por bloques.
+
+El audio pasa por el filtro de ponderación K (dos biquads con estado entre bloques) y se
+acumula la energía por canal en subbloques de 100 ms. Los bloques de 400 ms con solape
+del 75% son sumas de cuatro subbloques consecutivos, así que el cómputo de las puertas
+(absoluta a -70 LUFS y relativa a -10 LU) se hace al final sobre un array pequeño, sin
+guardar el audio.
+
+El resultado se guarda junto al audio como `<nombre>.loudness.json` y el reproductor lo
+aplica como ganancia al reproducir; las muestras del archivo no se modifican.
+"""
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+import numpy as np
+from scipy.signal import sosfilt
+
+from src.utils.audio_stream import iter_audio_blocks, probe_audio
+from src.utils.files import atomic_write_json
+
+TARGET_LUFS = -18.0
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+SUBBLOCK_SECONDS = 0.1
+SUBBLOCKS_PER_BLOCK = 4  # bloques de 400 ms con solape del 75%
+
+
+def loudness_path_for(audio_path: Union[str, Path]) -> Path:
+    """vocals.wav -> vocals.loudness.json"""
+    return Path(audio_path).with_suffix('.loudness.json')
+
+
+def _biquad(b: np.ndarray, a: np.ndarray) -> np.ndarray:
+    return np.concatenate([b / a[0], a / a[0]])
+
+
+def k_weighting(sample_rate: int) -> np.ndarray:
+    """Filtro K (shelving + paso alto) como secciones de segundo orden para `sample_rate`.
+    Coeficientes derivados del prototipo analógico de BS.1770, válidos a cualquier frecuencia"""
+    # Shelving de alta frecuencia (+4 dB, modelo de la cabeza)
+    gain, fc, q = 3.999843853973347, 1681.974450955533, 0.7071752369554196
+    k = np.tan(np.pi * fc / sample_rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _biquad(np.array([vh + vb * k / q + k * k, 2 * (k * k - vh), vh - vb * k / q + k * k]),
+                    np.array([a0, 2 * (k * k - 1), 1 - k / q + k * k]))
+    # Paso alto (RLB): el numerador se queda en (1, -2, 1), como en la norma
+    fc, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * fc / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = np.array([1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return np.stack([shelf, highpass])
+
+
+class LoudnessMeter:
+    """Medidor incremental: `add()` con bloques (canales, muestras) y `integrated()` al final"""
+
+    def __init__(self, sample_rate: int, channels: int = 2):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._sos = k_weighting(sample_rate)
+        self._state = np.zeros((len(self._sos), channels, 2))
+        self._subblock = int(round(SUBBLOCK_SECONDS * sample_rate))
+        self._pending = np.zeros((channels, 0))
+        self._energies = []  # (canales, subbloques) de cada bloque recibido
+
+    def add(self, block: np.ndarray):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[np.newaxis]
+        weighted, self._state = sosfilt(self._sos, block[:self.channels], axis=-1, zi=self._state)
+        pending = np.concatenate([self._pending, weighted], axis=1)
+        usable = pending.shape[1] - pending.shape[1] % self._subblock
+        if usable:
+            squares = pending[:, :usable] ** 2
+            self._energies.append(squares.reshape(self.channels, -1, self._subblock).mean(axis=2))
+        self._pending = pending[:, usable:]
+
+    def integrated(self) -> Optional[float]:
+        """LUFS integrados; None si la señal es más corta que un bloque o no pasa la puerta"""
+        if not self._energies:
+            return None
+        # Energía por subbloque sumada sobre canales (peso 1.0 para L/R)
+        energy = np.concatenate(self._energies, axis=1).sum(axis=0)
+        if len(energy) < SUBBLOCKS_PER_BLOCK:
+            return None
+        cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+        blocks = (cumulative[SUBBLOCKS_PER_BLOCK:] - cumulative[:-SUBBLOCKS_PER_BLOCK]) / SUBBLOCKS_PER_BLOCK
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[loudness > ABSOLUTE_GATE]
+        if not len(gated):
+            return None
+        threshold = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+        gated = blocks[(loudness > ABSOLUTE_GATE) & (loudness > threshold)]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def measure_blocks(blocks: Iterable[np.ndarray], sample_rate: int, channels: int = 2) -> Optional[float]:
+    meter = LoudnessMeter(sample_rate, channels)
+    for block in blocks:
+        meter.add(block)
+    return meter.integrated()
+
+
+def measure_file(audio_path: Union[str, Path]) -> Optional[float]:
+    """Recorre el archivo por bloques, sin cargarlo entero"""
+    sample_rate, channels = probe_audio(audio_path)
+    channels = min(channels, 2)
+    return measure_blocks(iter_audio_blocks(audio_path, channels=channels), sample_rate, channels)
+
+
+def write_loudness(audio_path: Union[str, Path], audio: np.ndarray = None, sample_rate: int = None) -> Path:
+    """Genera `<audio>.loudness.json` desde el array dado o, sin él, leyendo el archivo por bloques"""
+    if audio is None:
+        sample_rate = probe_audio(audio_path)[0]
+        lufs = measure_file(audio_path)
+    else:
+        audio = np.asarray(audio)
+        channels = 1 if audio.ndim == 1 else min(audio.shape[0], 2)
+        lufs = measure_blocks([audio], sample_rate, channels)
+    path = loudness_path_for(audio_path)
+    atomic_write_json(path, {
+        'integrated_lufs': None if lufs is None else round(lufs, 2),
+        'sample_rate': sample_rate,
+    })
+    return path
+
+
+def read_loudness(audio_path: Union[str, Path]) -> Optional[float]:
+    """LUFS guardados para `audio_path`, o None si no se midieron"""
+    path = loudness_path_for(audio_path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('integrated_lufs')
+    except (OSError, ValueError):
+        return None
+
+
+def playback_gain_db(lufs: Optional[float], target: float = TARGET_LUFS) -> float:
+    """Ganancia para llevar la pista a `target`. Solo atenúa: el volumen del reproductor
+    no amplifica, y subir pistas flojas arriesgaría recortes"""
+    if lufs is None:
+        return 0.0
+    return min(0.0, target - lufs)
+
+
+def loudness_summary(audio_paths: Dict[str, Union[str, Path]]) -> Dict[str, Optional[float]]:
+    """nombre -> LUFS guardados, para el resultado del pipeline"""
+    return {name: read_loudness(path) for name, path in audio_paths.items()}
@@ -0,0 +1,218 @@
+"""Medición de memoria por etapa y presupuesto de memoria del proceso.
+
+`StageMemory` muestrea en segundo plano, mientras dura una etapa, el RSS del proceso (CPU)
+y, con CUDA, la memoria asignada a tensores. Ambos contadores son del proceso entero: si
+otra etapa corría a la vez, las cifras incluyen su memoria y se marcan `exclusive: False`.
+`MemoryBudget` reparte un límite de memoria entre los pipelines que corren a la vez en el
+proceso: cada uno reserva su estimación antes de empezar, espera si otros ocupan el hueco
+y falla de inmediato si no cabría ni ejecutándose solo.
+"""
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import torch
+
+MEMORY_BUDGET_ENV = "LYRAOKE_MEMORY_BUDGET_MB"
+SAMPLE_INTERVAL = 0.05  # segundos entre muestras de RSS
+
+# Estimaciones de pico (MB) calibradas a grandes rasgos sobre HTDemucs/Whisper en CPU.
+# Audio estéreo float32 a 44.1kHz: ~0.35 MB/s; apply_model mantiene la mezcla, la salida
+# de 4 fuentes, la acumulación de shifts y los stems, ~12 copias en total.
+# Cada ventana cuesta lo mismo sea cual sea `segment`: HTDemucs rellena la entrada hasta su
+# segmento de entrenamiento, así que el coste por ventana es fijo para cada modelo
+SEPARATION_AUDIO_COPIES = 12
+SEPARATION_MB_PER_WINDOW_SECOND = 130
+TRANSCRIPTION_BASE_MB = 400
+TRANSCRIPTION_MB_PER_SECOND = 0.3
+
+_MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """El trabajo no cabe en el presupuesto de memoria configurado"""
+
+
+def current_rss_mb() -> Optional[float]:
+    """RSS actual del proceso en MB (None si la plataforma no lo permite)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / _MB
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Sin /proc solo queda el máximo histórico (bytes en macOS, KB en Linux)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / _MB if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return None
+
+
+def budget_from_env() -> Optional[float]:
+    value = os.environ.get(MEMORY_BUDGET_ENV, '').strip()
+    return float(value) if value else None
+
+
+def _cuda_allocated_mb() -> Optional[float]:
+    return torch.cuda.memory_allocated() / _MB if torch.cuda.is_available() else None
+
+
+# Etapas medidas ahora mismo en el proceso (para saber si las cifras son solo de una)
+_active_stages = 0
+_active_lock = threading.Lock()
+
+
+class StageMemory:
+    """Context manager que registra RSS inicial/pico/final y memoria CUDA de tensores.
+
+    Los picos salen de muestrear ambos contadores, sin reiniciar las estadísticas de pico
+    de CUDA (globales al proceso: el reinicio borraría el pico de otro trabajo en curso).
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Optional[float]] = {}
+        self._peak: Optional[float] = None
+        self._cuda_peak: Optional[float] = None
+        self._exclusive = True
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _measure(self):
+        rss = current_rss_mb()
+        if rss is not None and (self._peak is None or rss > self._peak):
+            self._peak = rss
+        cuda = _cuda_allocated_mb()
+        if cuda is not None and (self._cuda_peak is None or cuda > self._cuda_peak):
+            self._cuda_peak = cuda
+        if _active_stages > 1:
+            self._exclusive = False
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._measure()
+
+    def __enter__(self) -> 'StageMemory':
+        global _active_stages
+        with _active_lock:
+            _active_stages += 1
+        self._start = current_rss_mb()
+        self._cuda_start = _cuda_allocated_mb()
+        self._measure()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="lyraoke-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active_stages
+        self._stop.set()
+        self._thread.join()
+        self._measure()
+        with _active_lock:
+            _active_stages -= 1
+        end = current_rss_mb()
+        self.stats = {
+            'rss_start_mb': _round(self._start),
+            'rss_peak_mb': _round(self._peak),
+            'rss_end_mb': _round(end),
+            'rss_growth_mb': _round(self._peak - self._start)
+            if self._peak is not None and self._start is not None else None,
+            'cuda_peak_allocated_mb': _round(self._cuda_peak),
+            'cuda_growth_mb': _round(self._cuda_peak - self._cuda_start)
+            if self._cuda_peak is not None and self._cuda_start is not None else None,
+            'exclusive': self._exclusive,
+            'seconds': round(time.perf_counter() - self._started_at, 3),
+        }
+        return False
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def estimate_separation_mb(duration: float, window_seconds: float) -> float:
+    """`window_seconds`: segmento de entrenamiento del modelo (el tamaño real de cada ventana)"""
+    audio_mb = duration * 44100 * 2 * 4 / _MB
+    return audio_mb * SEPARATION_AUDIO_COPIES + window_seconds * SEPARATION_MB_PER_WINDOW_SECOND
+
+
+def estimate_transcription_mb(duration: float) -> float:
+    return TRANSCRIPTION_BASE_MB + duration * TRANSCRIPTION_MB_PER_SECOND
+
+
+class MemoryBudget:
+    """Presupuesto de memoria (MB) compartido por los pipelines de un proceso.
+
+    La memoria fija del proceso (modelos residentes, intérprete) se mide como RSS cuando no
+    hay ningún trabajo reservado; lo que ocupan los trabajos en curso se cuenta por sus
+    estimaciones. Así no se mezclan medidas y estimaciones de los mismos trabajos.
+    """
+
+    def __init__(self, budget_mb: Optional[float]):
+        self.budget_mb = budget_mb
+        self._reserved: Dict[int, float] = {}
+        self._idle_mb: Optional[float] = None
+        self._condition = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_mb is not None
+
+    def plan(self, duration: float, window_seconds: Optional[float], separate: bool, transcribe: bool,
+             on_wait: Optional[Callable[[], None]] = None) -> Dict:
+        """Reserva la memoria estimada del trabajo (`window_seconds`: segmento de entrenamiento
+        del separador, o None sin separación).
+
+        Devuelve el plan (incluye `reservation` para `release`). Si el trabajo no cabe ni
+        sin otros trabajos en curso, lanza MemoryBudgetExceeded sin esperar; si no cabe por
+        culpa de otros trabajos, espera a que terminen llamando a `on_wait()` cada segundo
+        (puede lanzar una excepción para abortar).
+        """
+        estimate = self._estimate(duration, window_seconds, separate, transcribe)
+        with self._condition:
+            while True:
+                if not self._reserved or self._idle_mb is None:
+                    # Sin trabajos en curso el RSS es la base fija (incluye los modelos cargados)
+                    self._idle_mb = current_rss_mb() or 0.0
+                baseline = self._idle_mb
+                others = sum(self._reserved.values())
+                if baseline + others + estimate <= self.budget_mb:
+                    break
+                if baseline + estimate > self.budget_mb or not self._reserved:
+                    raise MemoryBudgetExceeded(
+                        f"El trabajo necesita ~{estimate:.0f} MB además de los {baseline:.0f} MB fijos "
+                        f"del proceso y el presupuesto es de {self.budget_mb:.0f} MB ({duration:.0f}s de audio)")
+                if on_wait is not None:
+                    on_wait()
+                self._condition.wait(1.0)
+
+            reservation = object()
+            self._reserved[id(reservation)] = estimate
+            return {
+                'estimated_mb': round(estimate, 1),
+                'window_seconds': window_seconds,
+                'budget_mb': self.budget_mb,
+                'baseline_mb': round(baseline, 1),
+                'reserved_by_others_mb': round(others, 1),
+                'reservation': reservation,
+            }
+
+    def release(self, plan: Optional[Dict]):
+        if not plan or plan.get('reservation') is None:
+            return
+        with self._condition:
+            self._reserved.pop(id(plan['reservation']), None)
+            self._condition.notify_all()
+
+    @staticmethod
+    def _estimate(duration, window_seconds, separate, transcribe) -> float:
+        # Las etapas son secuenciales: cuenta el pico de la más exigente
+        peaks = [0.0]
+        if separate:
+            peaks.append(estimate_separation_mb(duration, window_seconds))
+        if transcribe:
+            peaks.append(estimate_transcription_mb(duration))
+        return max(peaks)
@@ -0,0 +1,260 @@
+"""Métricas del procesamiento en formato de texto de Prometheus.
+
+Registro en memoria del proceso (contadores, gauges e histogramas con etiquetas), sin
+dependencias externas. Se exporta por HTTP (`GET /metrics` del servicio) o a un archivo
+que se reescribe de forma atómica cada pocos segundos, apto para el textfile collector de
+node_exporter.
+
+Métricas del pipeline:
+- lyraoke_stage_duration_seconds{stage}: duración de cada etapa ejecutada
+- lyraoke_stage_failures_total{stage}: etapas que terminaron con error
+- lyraoke_songs_processed_total{status}: canciones terminadas (done, failed, cancelled)
+- lyraoke_audio_seconds_processed_total{mode} / lyraoke_processing_seconds_total{mode}: su
+  cociente (con rate()) es el audio procesado por segundo de reloj. `mode` separa las
+  canciones separadas de verdad (processed) de las reutilizadas (reused) o reanudadas
+  (resumed); el reloj empieza con el workspace bloqueado y sin la espera de memoria
+- lyraoke_model_load_seconds{model}: carga de HTDemucs, Whisper, Open-Unmix y el alineador
+- lyraoke_queue_depth, lyraoke_jobs_running: estado de la cola del servicio
+- lyraoke_separation_windows_total{batch_size} / lyraoke_separation_batch_seconds_total{batch_size}:
+  ventanas de HTDemucs por segundo de cómputo según el tamaño del lote (separación por lotes)
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from src.utils.files import atomic_write_text
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_WRITE_INTERVAL = 15.0
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+LOAD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} espera las etiquetas {self.label_names}, no {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        # En HELP solo se escapan la barra invertida y el salto de línea (no las comillas)
+        documentation = self.documentation.replace('\\', '\\\\').replace('\n', '\\n')
+        header = [f"# HELP {self.name} {documentation}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(header + self._samples())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        # Sin etiquetas la serie existe desde el principio (a 0), como espera rate()
+        self._values: Dict[Tuple[str, ...], float] = {} if self.label_names else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Un contador solo puede aumentar")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Valor instantáneo; con `set_function` se lee en el momento de exportar"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = float(function())
+            except Exception:
+                continue
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # cuentas por cubo + [suma, total]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observa la duración del bloque (también si termina con error)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} "
+                             f"{_format_value(cumulative)}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+    def write(self, path: Union[str, Path]):
+        """Vuelca todas las métricas a `path` (escritura atómica: nunca se lee a medias)"""
+        atomic_write_text(path, self.render())
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    'lyraoke_stage_duration_seconds', 'Duración de cada etapa del pipeline', ('stage',), STAGE_BUCKETS))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    'lyraoke_stage_failures_total', 'Etapas del pipeline terminadas con error', ('stage',)))
+SONGS_PROCESSED = REGISTRY.register(Counter(
+    'lyraoke_songs_processed_total', 'Canciones procesadas por resultado', ('status',)))
+AUDIO_SECONDS = REGISTRY.register(Counter(
+    'lyraoke_audio_seconds_processed_total', 'Segundos de audio de las canciones procesadas', ('mode',)))
+PROCESSING_SECONDS = REGISTRY.register(Counter(
+    'lyraoke_processing_seconds_total', 'Segundos de reloj dedicados a las canciones procesadas', ('mode',)))
+MODEL_LOAD = REGISTRY.register(Histogram(
+    'lyraoke_model_load_seconds', 'Tiempo de carga de cada modelo', ('model',), LOAD_BUCKETS))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'lyraoke_queue_depth', 'Trabajos esperando en la cola del servicio'))
+JOBS_RUNNING = REGISTRY.register(Gauge(
+    'lyraoke_jobs_running', 'Trabajos en procesamiento'))
+SEPARATION_WINDOWS = REGISTRY.register(Counter(
+    'lyraoke_separation_windows_total', 'Ventanas separadas en lotes, por tamaño de lote', ('batch_size',)))
+SEPARATION_BATCH_SECONDS = REGISTRY.register(Counter(
+    'lyraoke_separation_batch_seconds_total', 'Segundos de cómputo de los lotes de separación', ('batch_size',)))
+
+
+class MetricsFileWriter:
+    """Reescribe el archivo de métricas cada `interval` segundos en un hilo en segundo plano"""
+
+    def __init__(self, path: Union[str, Path], interval: float = DEFAULT_WRITE_INTERVAL,
+                 registry: MetricsRegistry = REGISTRY):
+        self.path = Path(path)
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'MetricsFileWriter':
+        self._thread = threading.Thread(target=self._loop, name="lyraoke-metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            try:
+                self.registry.write(self.path)
+            except OSError as e:
+                print(f"Advertencia: no se pudieron escribir las métricas en {self.path}: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def stop(self):
+        """Detiene el hilo y deja escrito el último estado"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.registry.write(self.path)
@@ -0,0 +1,147 @@
+"""Pirámide multirresolución de picos (máx/mín) y RMS para dibujar formas de onda.
+
+El nivel 0 resume bloques de `BASE_BLOCK` muestras y cada nivel siguiente agrupa
+`LEVEL_FACTOR` bloques del anterior. Una consulta elige el nivel más grueso que aún
+tiene al menos un bloque por píxel, de modo que su coste es O(píxeles) con
+independencia de la duración de la pista. Se guarda junto al audio como
+`<nombre>.peaks.npz` (float16).
+"""
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+from src.utils.audio_stream import iter_audio_blocks, probe_audio
+from src.utils.files import atomic_output
+
+BASE_BLOCK = 256
+LEVEL_FACTOR = 4
+
+
+def peaks_path_for(audio_path: Union[str, Path]) -> Path:
+    """vocals.wav -> vocals.peaks.npz"""
+    return Path(audio_path).with_suffix('.peaks.npz')
+
+
+class PeakPyramid:
+    """Niveles de (máx, mín, rms) por bloque sobre la mezcla mono de los canales"""
+
+    def __init__(self, levels: List[np.ndarray], sample_rate: int, length: int,
+                 base_block: int = BASE_BLOCK, factor: int = LEVEL_FACTOR):
+        self.levels = levels  # cada nivel: array (3, bloques) con filas máx, mín, rms
+        self.sample_rate = sample_rate
+        self.length = length
+        self.base_block = base_block
+        self.factor = factor
+
+    @property
+    def duration(self) -> float:
+        return self.length / self.sample_rate if self.sample_rate else 0.0
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[np.ndarray], sample_rate: int,
+                    base_block: int = BASE_BLOCK, factor: int = LEVEL_FACTOR) -> 'PeakPyramid':
+        """Construye la pirámide a partir de bloques (canales, muestras) de cualquier tamaño"""
+        pending = np.zeros((3, 0), dtype=np.float32)
+        parts = []
+        length = 0
+        for block in blocks:
+            block = np.asarray(block, dtype=np.float32)
+            if block.ndim == 1:
+                block = block[np.newaxis]
+            length += block.shape[1]
+            per_sample = np.stack([block.max(axis=0), block.min(axis=0), (block ** 2).mean(axis=0)])
+            pending = np.concatenate([pending, per_sample], axis=1)
+            usable = pending.shape[1] - pending.shape[1] % base_block
+            if usable:
+                parts.append(_reduce(pending[:, :usable], base_block))
+                pending = pending[:, usable:]
+        if pending.shape[1]:
+            parts.append(_reduce(pending, base_block))
+
+        level = np.concatenate(parts, axis=1) if parts else np.zeros((3, 0), dtype=np.float32)
+        levels = [level]
+        while level.shape[1] > factor:
+            level = _reduce(level, factor)
+            levels.append(level)
+        # El nivel guarda rms; la media cuadrática solo se usa para agregar
+        levels = [np.stack([l[0], l[1], np.sqrt(l[2])]).astype(np.float16) for l in levels]
+        return cls(levels, sample_rate, length, base_block, factor)
+
+    @classmethod
+    def from_array(cls, audio: np.ndarray, sample_rate: int) -> 'PeakPyramid':
+        """Audio en memoria (canales, muestras) o mono (muestras,)"""
+        return cls.from_blocks([audio], sample_rate)
+
+    @classmethod
+    def from_file(cls, audio_path: Union[str, Path]) -> 'PeakPyramid':
+        """Recorre el archivo por bloques, sin cargarlo entero"""
+        sample_rate, channels = probe_audio(audio_path)
+        return cls.from_blocks(iter_audio_blocks(audio_path, channels=channels), sample_rate)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        arrays = {f'level_{i}': level for i, level in enumerate(self.levels)}
+        meta = np.array([self.sample_rate, self.length, self.base_block, self.factor, len(self.levels)],
+                        dtype=np.int64)
+        with atomic_output(path) as temp_path:
+            with open(temp_path, 'wb') as f:
+                np.savez(f, meta=meta, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'PeakPyramid':
+        with np.load(str(path)) as data:
+            sample_rate, length, base_block, factor, count = (int(v) for v in data['meta'])
+            levels = [data[f'level_{i}'] for i in range(count)]
+        return cls(levels, sample_rate, length, base_block, factor)
+
+    def query(self, start: float, end: float, pixels: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(máx, mín, rms) por píxel para el intervalo [start, end) en segundos"""
+        if pixels <= 0 or not self.levels or not self.levels[0].shape[1] or end <= start:
+            empty = np.zeros(max(pixels, 0), dtype=np.float32)
+            return empty, empty, empty
+
+        first = max(0, int(start * self.sample_rate))
+        last = min(self.length, int(end * self.sample_rate))
+        samples_per_pixel = max(last - first, 1) / pixels
+
+        index = 0
+        block = self.base_block
+        while index + 1 < len(self.levels) and block * self.factor <= samples_per_pixel:
+            index += 1
+            block *= self.factor
+        level = self.levels[index]
+
+        edges = np.linspace(first, last, pixels + 1) // block
+        edges = np.clip(edges.astype(np.int64), 0, level.shape[1] - 1)
+        starts = edges[:-1]
+        # reduceat con índices repetidos devuelve el propio bloque (zoom por debajo del nivel 0)
+        stop = min(int(edges[-1]) + 1, level.shape[1])
+        counts = np.maximum(np.diff(np.append(starts, stop)), 1).astype(np.float32)
+        # Solo las columnas del intervalo: el coste depende de los píxeles, no de la canción
+        offset = int(starts[0])
+        window = level[:, offset:stop].astype(np.float32)
+        starts = starts - offset
+        highs = np.maximum.reduceat(window[0], starts)
+        lows = np.minimum.reduceat(window[1], starts)
+        rms = np.sqrt(np.add.reduceat(window[2] ** 2, starts) / counts)
+        return highs, lows, rms
+
+
+def _reduce(values: np.ndarray, size: int) -> np.ndarray:
+    """Agrupa columnas de (máx, mín, media cuadrática) de `size` en `size`"""
+    remainder = values.shape[1] % size
+    if remainder:
+        values = np.pad(values, ((0, 0), (0, size - remainder)), mode='edge')
+    grouped = values.reshape(3, -1, size)
+    return np.stack([grouped[0].max(axis=1), grouped[1].min(axis=1), grouped[2].mean(axis=1)])
+
+
+def write_peaks(audio_path: Union[str, Path], audio: np.ndarray = None, sample_rate: int = None) -> Path:
+    """Genera `<audio>.peaks.npz` desde el array dado o, sin él, leyendo el archivo por bloques"""
+    if audio is None:
+        pyramid = PeakPyramid.from_file(audio_path)
+    else:
+        pyramid = PeakPyramid.from_array(audio, sample_rate)
+    return pyramid.save(peaks_path_for(audio_path))
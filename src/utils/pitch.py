@@ -0,0 +1,152 @@
+"""Pista de afinación (f0) de la voz, estimada con YIN vectorizado.
+
+Se calcula sobre el stem de voces remuestreado a 16 kHz, con un frame de 64 ms centrado
+cada 10 ms. La función de diferencia de YIN se obtiene para todos los frames de un lote a
+la vez (autocorrelación por FFT y energías por suma acumulada), sin bucles por frame.
+
+Se guarda como `song_pitch.npz` junto a `song_timed.json`: nota MIDI en float16 (NaN =
+sin voz) y confianza en uint8, ~3 bytes por frame. La consulta por tiempo es O(1).
+"""
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import soxr
+
+from src.utils.audio_stream import read_audio
+from src.utils.files import atomic_output
+
+PITCH_SR = 16000
+HOP = 160             # 10 ms
+FRAME = 1024          # 64 ms: cubre dos periodos de la nota más grave
+FMIN = 65.0           # ~C2
+FMAX = 1000.0         # ~B5
+YIN_THRESHOLD = 0.15  # umbral absoluto de la CMNDF para aceptar el primer mínimo
+VOICED_THRESHOLD = 0.3
+SILENCE_DB = -50.0
+BATCH_FRAMES = 2048   # frames por lote (acota la memoria de las FFT)
+_EPS = 1e-10
+
+
+def _yin_batch(frames: np.ndarray):
+    """(midi, aperiodicidad) de cada fila de `frames` (lote, FRAME)"""
+    tau_min = int(PITCH_SR / FMAX)
+    tau_max = int(PITCH_SR / FMIN)
+    width = FRAME - tau_max
+    n_fft = 1 << int(np.ceil(np.log2(FRAME + width)))
+
+    # Diferencia d(tau) = e(0) + e(tau) - 2 r(tau) sobre una ventana de `width` muestras
+    spectrum = np.fft.rfft(frames, n_fft)
+    head = np.fft.rfft(frames[:, :width], n_fft)
+    acf = np.fft.irfft(np.conj(head) * spectrum, n_fft)[:, :tau_max + 1]
+    cumulative = np.concatenate([np.zeros((len(frames), 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+    taus = np.arange(tau_max + 1)
+    energy = cumulative[:, taus + width] - cumulative[:, taus]
+    diff = np.maximum(energy[:, :1] + energy - 2 * acf, 0.0)
+
+    # Diferencia normalizada por la media acumulada (CMNDF)
+    cmnd = np.ones_like(diff)
+    cmnd[:, 1:] = diff[:, 1:] * taus[1:] / np.maximum(np.cumsum(diff[:, 1:], axis=1), _EPS)
+
+    # Primer valle bajo el umbral (su mínimo local); si no hay, el mínimo global
+    search = cmnd[:, tau_min:tau_max]
+    below = search < YIN_THRESHOLD
+    has_dip = below.any(axis=1)
+    first = below.argmax(axis=1)
+    index = np.arange(search.shape[1])
+    rising = np.zeros_like(below)
+    rising[:, :-1] = search[:, 1:] > search[:, :-1]
+    local_min = rising & (index >= first[:, None])
+    best = np.where(local_min.any(axis=1), local_min.argmax(axis=1), search.shape[1] - 1)
+    best = np.where(has_dip, best, search.argmin(axis=1)) + tau_min
+
+    # Interpolación parabólica del periodo
+    rows = np.arange(len(frames))
+    left = cmnd[rows, np.maximum(best - 1, 0)]
+    center = cmnd[rows, best]
+    right = cmnd[rows, np.minimum(best + 1, tau_max)]
+    denominator = left - 2 * center + right
+    curved = np.abs(denominator) > _EPS
+    shift = np.where(curved, 0.5 * (left - right) / np.where(curved, denominator, 1.0), 0.0)
+    period = best + np.clip(shift, -1.0, 1.0)
+    midi = 69 + 12 * np.log2(PITCH_SR / period / 440.0)
+    return midi, center
+
+
+def estimate_pitch(audio: np.ndarray):
+    """(midi con NaN sin voz, confianza 0-1) para audio mono a PITCH_SR"""
+    audio = np.pad(np.asarray(audio, dtype=np.float64), (FRAME // 2, FRAME // 2))
+    if len(audio) < FRAME:
+        audio = np.pad(audio, (0, FRAME - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, FRAME)[::HOP]
+
+    midi = np.empty(len(frames))
+    aperiodicity = np.empty(len(frames))
+    power = np.empty(len(frames))
+    for start in range(0, len(frames), BATCH_FRAMES):
+        batch = frames[start:start + BATCH_FRAMES]
+        chunk = slice(start, start + len(batch))
+        midi[chunk], aperiodicity[chunk] = _yin_batch(batch)
+        power[chunk] = (batch ** 2).mean(axis=1)
+
+    rms_db = 10 * np.log10(np.maximum(power, _EPS))
+    voiced = (aperiodicity < VOICED_THRESHOLD) & (rms_db > SILENCE_DB)
+    midi[~voiced] = np.nan
+    return midi, np.clip(1.0 - aperiodicity, 0.0, 1.0)
+
+
+def pitch_path_for(lyrics_dir: Union[str, Path]) -> Path:
+    return Path(lyrics_dir) / "song_pitch.npz"
+
+
+class PitchTrack:
+    """Nota MIDI (float, NaN sin voz) y confianza cada `hop` segundos"""
+
+    def __init__(self, midi: np.ndarray, confidence: np.ndarray, hop: float = HOP / PITCH_SR):
+        self.midi = midi
+        self.confidence = confidence
+        self.hop = hop
+
+    @classmethod
+    def from_audio(cls, audio: np.ndarray, sample_rate: int) -> 'PitchTrack':
+        """Audio (canales, muestras) o mono (muestras,) a cualquier frecuencia"""
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim == 2:
+            audio = audio.mean(axis=0)
+        if sample_rate != PITCH_SR:
+            audio = soxr.resample(audio, sample_rate, PITCH_SR)
+        midi, confidence = estimate_pitch(audio)
+        return cls(midi.astype(np.float16), np.round(confidence * 255).astype(np.uint8))
+
+    @classmethod
+    def from_file(cls, audio_path: Union[str, Path]) -> 'PitchTrack':
+        audio, _ = read_audio(audio_path, target_sr=PITCH_SR, channels=1)
+        return cls.from_audio(audio[0], PITCH_SR)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        with atomic_output(path) as temp_path:
+            with open(temp_path, 'wb') as f:
+                np.savez(f, midi=self.midi, confidence=self.confidence, hop=np.array(self.hop))
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'PitchTrack':
+        with np.load(str(path)) as data:
+            return cls(data['midi'], data['confidence'], float(data['hop']))
+
+    @property
+    def duration(self) -> float:
+        return len(self.midi) * self.hop
+
+    def at(self, seconds: float) -> Optional[float]:
+        """Nota MIDI (con decimales) en `seconds`, o None si no se canta en ese instante"""
+        index = int(seconds / self.hop + 0.5)
+        if index < 0 or index >= len(self.midi):
+            return None
+        value = self.midi[index]
+        return None if np.isnan(value) else float(value)
+
+    def frequency_at(self, seconds: float) -> Optional[float]:
+        midi = self.at(seconds)
+        return None if midi is None else 440.0 * 2 ** ((midi - 69) / 12)
@@ -0,0 +1,146 @@
+"""Perfilado opcional del pipeline (torch profiler y/o cProfile).
+
+Se activa con la variable de entorno `LYRAOKE_PROFILE` (p. ej. `torch`, `cprofile` o
+`torch,cprofile`) o con `configure()` desde una CLI. Desactivado, `profile_region`
+devuelve siempre el mismo contexto vacío y no se instala ningún hook en los modelos.
+
+Cada trabajo perfilado deja en su directorio `profile/`:
+- `trace.json`: traza para chrome://tracing o Perfetto, con regiones etiquetadas
+  (decode, resample, separate.window, save, whisper.encode/decode/align_words...)
+- `summary.txt`: tabla de tiempos agregados por región/operador
+- `profile.pstats`: estadísticas de cProfile (`python -m pstats profile.pstats`)
+"""
+import contextlib
+import contextvars
+import cProfile
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+import torch
+
+PROFILE_ENV = "LYRAOKE_PROFILE"
+PROFILE_MODES = ('torch', 'cprofile')
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_modes = frozenset()
+# El trabajo perfilado del contexto actual (hilo): las regiones de otros trabajos que corren
+# a la vez en otros hilos no se etiquetan en su traza
+_active = contextvars.ContextVar('lyraoke_profiling_active', default=False)
+_job_lock = threading.Lock()
+
+
+def configure(modes: Union[str, Iterable[str], None]):
+    """Fija los modos de perfilado (cadena separada por comas o iterable); vacío = desactivado"""
+    global _modes
+    if isinstance(modes, str):
+        modes = [m.strip() for m in modes.split(',')]
+    modes = frozenset(m for m in (modes or ()) if m)
+    unknown = modes - set(PROFILE_MODES)
+    if unknown:
+        raise ValueError(f"Modo de perfilado desconocido: {', '.join(sorted(unknown))}. "
+                         f"Disponibles: {', '.join(PROFILE_MODES)}")
+    _modes = modes
+
+
+def enabled() -> bool:
+    return bool(_modes)
+
+
+def profile_region(name: str):
+    """Etiqueta una región en la traza del trabajo en curso (sin coste si no se perfila)"""
+    if not _active.get():
+        return _NULL_CONTEXT
+    return torch.profiler.record_function(name)
+
+
+def instrument_module(module: torch.nn.Module, name: str):
+    """Marca cada forward de `module` como región `name`. Solo instala hooks con el
+    perfilado activado, y una única vez por módulo"""
+    if 'torch' not in _modes or getattr(module, '_lyraoke_profiled', False):
+        return
+    stack = []
+
+    def enter(_module, _inputs):
+        if _active.get():
+            region = torch.profiler.record_function(name)
+            region.__enter__()
+            stack.append(region)
+
+    def leave(_module, _inputs, _output):
+        if stack:
+            stack.pop().__exit__(None, None, None)
+
+    module.register_forward_pre_hook(enter)
+    module.register_forward_hook(leave)
+    module._lyraoke_profiled = True
+
+
+class JobProfiler:
+    """Perfila un trabajo completo y exporta sus trazas a `output_dir` al terminar.
+
+    Los perfiladores son globales al proceso: si otro trabajo ya se está perfilando,
+    este se ejecuta sin perfilar en lugar de mezclar ambas trazas. Las regiones solo se
+    etiquetan en el contexto (hilo) del trabajo perfilado, no en los trabajos concurrentes.
+    """
+
+    def __init__(self, output_dir: Union[str, Path], modes: Optional[Iterable[str]] = None):
+        self.output_dir = Path(output_dir)
+        self.modes = frozenset(modes) if modes is not None else _modes
+        self.files: Dict[str, str] = {}
+        self._torch_profiler = None
+        self._cprofile = None
+        self._owns_lock = False
+        self._active_token = None
+
+    def __enter__(self) -> 'JobProfiler':
+        if not self.modes or not _job_lock.acquire(blocking=False):
+            return self
+        self._owns_lock = True
+        if 'torch' in self.modes:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._torch_profiler = torch.profiler.profile(activities=activities)
+            self._torch_profiler.__enter__()
+            self._active_token = _active.set(True)
+        if 'cprofile' in self.modes:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._owns_lock:
+            return False
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            if self._cprofile is not None:
+                self._cprofile.disable()
+                path = self.output_dir / "profile.pstats"
+                self._cprofile.dump_stats(str(path))
+                self.files['pstats'] = str(path)
+            if self._torch_profiler is not None:
+                self._reset_active()
+                self._torch_profiler.__exit__(None, None, None)
+                trace_path = self.output_dir / "trace.json"
+                self._torch_profiler.export_chrome_trace(str(trace_path))
+                self.files['chrome_trace'] = str(trace_path)
+                summary_path = self.output_dir / "summary.txt"
+                summary = self._torch_profiler.key_averages().table(
+                    sort_by="cpu_time_total", row_limit=40)
+                summary_path.write_text(summary, encoding='utf-8')
+                self.files['summary'] = str(summary_path)
+        finally:
+            self._reset_active()
+            _job_lock.release()
+            self._owns_lock = False
+        return False
+
+    def _reset_active(self):
+        if self._active_token is not None:
+            _active.reset(self._active_token)
+            self._active_token = None
+
+
+configure(os.environ.get(PROFILE_ENV, ''))
@@ -0,0 +1,32 @@
+"""Normalización de la letra para MMS_FA y rechazo de letras que no se pueden alinear.
+
+Necesita torch y torchaudio (se salta si no están); no carga el modelo del alineador.
+"""
+import pytest
+
+pytest.importorskip("torchaudio")
+align = pytest.importorskip("src.scripts.align")
+
+
+def test_latin_letters_without_decomposition_are_transliterated():
+    assert align.normalize_word("Straße") == "strasse"
+    assert align.normalize_word("canción,") == "cancion"
+    assert align.normalize_word("Ærø") == "aero"
+    assert align.normalize_word("don't") == "don't"
+
+
+def test_non_latin_words_are_romanized_when_uroman_is_available(monkeypatch):
+    class FakeUroman:
+        def romanize_string(self, text):
+            return {'привет': 'privet', '愛してる': 'aishiteru'}[text]
+
+    monkeypatch.setattr(align, '_uroman', FakeUroman())
+    assert align.normalize_word("Привет") == "privet"
+    assert align.normalize_word("愛してる") == "aishiteru"
+
+
+def test_unalignable_lyrics_raise_instead_of_zero_timings(monkeypatch):
+    monkeypatch.setattr(align, '_uroman', False)
+    aligner = align.LyricsAligner.__new__(align.LyricsAligner)
+    with pytest.raises(align.UnalignableLyricsError):
+        aligner._align_lines(["привет мир", "愛してる"], emission=None, seconds_per_frame=0.02)
@@ -0,0 +1,32 @@
+"""Lectura por bloques: read_audio devuelve el archivo exacto aunque la cabecera mienta."""
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+audio_stream = pytest.importorskip("src.utils.audio_stream")
+
+
+def _write_wav(path, samples, sample_rate: int = 8000):
+    pcm = np.round(samples.T * 32767).astype('<i2')
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(samples.shape[0])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+    return pcm.T.astype(np.float32) / 32768.0
+
+
+@pytest.mark.parametrize('duration', [None, 0.0])
+def test_read_audio_fills_preallocated_buffer(tmp_path, monkeypatch, duration):
+    if duration is not None:
+        # Cabecera que subestima la duración: el búfer tiene que crecer
+        monkeypatch.setattr(audio_stream, 'audio_duration', lambda path: duration)
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(-0.5, 0.5, size=(2, 3 * audio_stream.DEFAULT_BLOCK_FRAMES + 123))
+    expected = _write_wav(tmp_path / "ruido.wav", samples)
+
+    audio, sample_rate = audio_stream.read_audio(tmp_path / "ruido.wav")
+    assert sample_rate == 8000
+    assert audio.shape == expected.shape
+    assert np.allclose(audio, expected, atol=1e-4)
@@ -0,0 +1,33 @@
+"""Checkpoints mapeables: se descartan si el original cambia o desaparece."""
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+checkpoints = pytest.importorskip("src.utils.checkpoints")
+
+
+def test_conversion_is_tied_to_its_source(tmp_path):
+    source = tmp_path / "best_model.pth"
+    source.write_bytes(b'pesos originales')
+    path = checkpoints.mmap_path_for(source)
+    checkpoints.save_mmap_checkpoint(path, {'w': torch.arange(4.0)}, config={'a': 1}, source=source)
+
+    loaded = checkpoints.load_mmap_checkpoint(path, source=source)
+    assert loaded['config'] == {'a': 1}
+    assert torch.equal(loaded['state_dict']['w'], torch.arange(4.0))
+
+    source.write_bytes(b'pesos reentrenados, otro tamano')
+    assert checkpoints.load_mmap_checkpoint(path, source=source) is None
+    source.unlink()
+    assert checkpoints.load_mmap_checkpoint(path, source=source) is None
+
+
+def test_same_size_but_newer_source_is_rejected(tmp_path):
+    source = tmp_path / "small.pt"
+    source.write_bytes(b'aaaa')
+    path = tmp_path / "small.mmap.pt"
+    checkpoints.save_mmap_checkpoint(path, {'w': torch.zeros(1)}, source=source)
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert checkpoints.load_mmap_checkpoint(path, source=source) is None
@@ -0,0 +1,65 @@
+"""Instrumental derivado: la comprobación de calidad con los stems en memoria.
+
+Necesita numpy, scipy y soundfile (se salta si no están); usa señales sintéticas.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+sf = pytest.importorskip("soundfile")
+derived_stems = pytest.importorskip("src.utils.derived_stems")
+
+SAMPLE_RATE = 8000
+
+
+def _song(tmp_path, seconds: float = 3.0):
+    """original.wav de 16 bits y, como load_mix, su mezcla normalizada y la ganancia"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = 0.3 * np.sin(2 * np.pi * 440 * t)
+    band = 0.2 * np.sin(2 * np.pi * 110 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    original = tmp_path / "song.wav"
+    sf.write(str(original), np.stack([voice + band, voice + 0.8 * band], axis=1), SAMPLE_RATE, subtype='PCM_16')
+    stored, _ = sf.read(str(original), dtype='float32', always_2d=True)
+    mix_gain = 1.0 / float(np.abs(stored).max())
+    mix = (stored.T * mix_gain).astype(np.float32)
+    vocals = mix_gain * np.stack([voice, voice]).astype(np.float32)
+    return original, mix, mix_gain, vocals
+
+
+def _save_vocals(path, vocals):
+    sf.write(str(path), vocals.T, SAMPLE_RATE, subtype='PCM_16')
+    return path
+
+
+def test_recipe_quality_matches_what_playback_reads(tmp_path):
+    original, mix, mix_gain, vocals = _song(tmp_path)
+    stems = tmp_path / "stems"
+    stems.mkdir()
+    vocals_path = _save_vocals(stems / "vocals.wav", vocals)
+    instrumental = mix - vocals
+    recipe_path, quality = derived_stems.derive_instrumental(
+        stems / "instrumental.wav", instrumental, vocals, vocals_path, mix, mix_gain, original, SAMPLE_RATE)
+
+    assert recipe_path is not None and quality['sdr_db'] >= derived_stems.MIN_SDR_DB
+    assert (stems / derived_stems.MIX_FILENAME).is_file()
+    assert not (stems / "instrumental.wav").exists()
+    # El SDR medido en memoria es el que da la reproducción desde los archivos
+    with derived_stems.DerivedInstrumental(recipe_path) as reader:
+        played = reader.read_all()
+    error = played - instrumental
+    sdr = 10 * np.log10(np.square(instrumental).sum() / np.square(error).sum())
+    assert sdr >= derived_stems.MIN_SDR_DB and abs(sdr - quality['sdr_db']) < 3.0
+
+
+def test_falls_back_to_wav_when_subtraction_is_poor(tmp_path):
+    original, mix, mix_gain, vocals = _song(tmp_path)
+    stems = tmp_path / "stems"
+    stems.mkdir()
+    vocals_path = _save_vocals(stems / "vocals.wav", vocals)
+    # Stems que no suman la mezcla: la resta no reproduce el instrumental del modelo
+    instrumental = 0.5 * (mix - vocals)
+    recipe_path, quality = derived_stems.derive_instrumental(
+        stems / "instrumental.wav", instrumental, vocals, vocals_path, mix, mix_gain, original, SAMPLE_RATE)
+
+    assert recipe_path is None and quality['sdr_db'] < derived_stems.MIN_SDR_DB
+    assert not derived_stems.recipe_path_for(stems / "instrumental.wav").exists()
+    assert not (stems / derived_stems.MIX_FILENAME).exists()
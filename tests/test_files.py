@@ -0,0 +1,34 @@
+"""Escritura atómica: los artefactos publicados tienen los permisos de un open() normal."""
+import os
+import stat
+
+from src.utils import files
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_published_files_follow_the_umask(tmp_path):
+    plain = tmp_path / "plain.txt"
+    plain.write_text("x", encoding='utf-8')
+
+    files.atomic_write_text(tmp_path / "texto.txt", "hola")
+    files.atomic_write_json(tmp_path / "datos.json", {'a': 1})
+    with files.atomic_output(tmp_path / "binario.bin") as temp_path:
+        assert _mode(temp_path) == 0o600
+        temp_path.write_bytes(b'\x00')
+
+    for name in ("texto.txt", "datos.json", "binario.bin"):
+        assert _mode(tmp_path / name) == _mode(plain)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["binario.bin", "datos.json", "plain.txt", "texto.txt"]
+
+
+def test_failed_write_leaves_nothing(tmp_path):
+    try:
+        with files.atomic_output(tmp_path / "roto.txt") as temp_path:
+            temp_path.write_text("a medias", encoding='utf-8')
+            raise RuntimeError("fallo")
+    except RuntimeError:
+        pass
+    assert list(tmp_path.iterdir()) == []
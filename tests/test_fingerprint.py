@@ -0,0 +1,57 @@
+"""Índice de huellas: desfase admitido al reutilizar y registro incremental.
+
+Necesita numpy (se salta si no está); usa huellas sintéticas, no audio.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+fingerprint = pytest.importorskip("src.utils.fingerprint")
+
+
+def _words(count: int = 400, seed: int = 1) -> np.ndarray:
+    return np.random.default_rng(seed).integers(1, 2 ** 32, size=count, dtype=np.uint32)
+
+
+def test_lookup_rejects_shifted_recordings(tmp_path):
+    index = fingerprint.FingerprintIndex(tmp_path / "fingerprints.jsonl")
+    words = _words()
+    index.add(tmp_path / "a", words)
+
+    same = index.lookup(words, max_offset_seconds=fingerprint.MAX_REUSE_OFFSET_SECONDS)
+    assert [m['offset_seconds'] for m in same] == [0.0]
+
+    # Diez palabras (~1,9 s) de silencio inicial: es la misma grabación, pero desplazada
+    shifted = np.concatenate([np.zeros(10, dtype=np.uint32), words])
+    assert index.lookup(shifted)
+    assert index.lookup(shifted, max_offset_seconds=fingerprint.MAX_REUSE_OFFSET_SECONDS) == []
+
+
+def test_add_appends_and_other_instances_catch_up(tmp_path):
+    path = tmp_path / "fingerprints.jsonl"
+    first = fingerprint.FingerprintIndex(path)
+    second = fingerprint.FingerprintIndex(path)
+    first.add(tmp_path / "a", _words(seed=1))
+    before = path.read_bytes()
+    first.add(tmp_path / "b", _words(seed=2))
+    assert path.read_bytes().startswith(before)
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 2
+
+    # La segunda instancia solo lee las líneas nuevas y encuentra ambas
+    assert [m['workspace'] for m in second.lookup(_words(seed=2))] == [str((tmp_path / "b").resolve())]
+    assert len(second) == 2
+
+    # Sustituir una huella retira la anterior de las búsquedas
+    first.add(tmp_path / "a", _words(seed=3))
+    assert first.lookup(_words(seed=1)) == []
+    assert second.lookup(_words(seed=1)) == []
+
+
+def test_compaction_keeps_latest_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(fingerprint, 'COMPACT_MIN_LINES', 0)
+    path = tmp_path / "fingerprints.jsonl"
+    index = fingerprint.FingerprintIndex(path)
+    for seed in range(5):
+        index.add(tmp_path / "a", _words(seed=seed))
+    assert len(path.read_text(encoding='utf-8').splitlines()) <= 3
+    reloaded = fingerprint.FingerprintIndex(path)
+    assert len(reloaded) == 1 and reloaded.lookup(_words(seed=4))
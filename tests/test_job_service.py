@@ -0,0 +1,213 @@
+"""Servicio HTTP de extremo a extremo sobre localhost.
+
+La primera prueba sustituye el AudioProcessor por uno mínimo que escribe artefactos
+conocidos: ejercita la cola, la concurrencia entre workers y la API (subida, estado,
+descargas con Range) sin modelos. La segunda usa el procesador real y se salta si no
+están torch o los pesos del separador.
+"""
+import io
+import json
+import math
+import shutil
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+import wave
+from pathlib import Path
+
+import pytest
+
+from core.job_service import JobService, QueueFullError, UploadTooLargeError, create_server
+
+
+def _write_tone(path: Path, seconds: float = 3.0, sample_rate: int = 44100):
+    frames = int(seconds * sample_rate)
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        samples = (int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate)) for i in range(frames))
+        f.writeframes(b''.join(struct.pack('<hh', s, s) for s in samples))
+
+
+class RecordingProcessor:
+    """Procesador de prueba: copia la entrada como stems y registra la concurrencia"""
+
+    def __init__(self, delay: float = 0.3):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.output_dirs = []
+        self._lock = threading.Lock()
+
+    def process_audio(self, input_path, output_base_dir=None, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.output_dirs.append(output_base_dir)
+        try:
+            time.sleep(self.delay)
+            output_dir = Path(output_base_dir)
+            paths = {
+                'original': output_dir / "original" / "song.wav",
+                'vocals': output_dir / "stems" / "vocals.wav",
+                'instrumental': output_dir / "stems" / "instrumental.wav",
+            }
+            for path in paths.values():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(input_path, path)
+            lyrics_dir = output_dir / "lyrics"
+            lyrics_dir.mkdir(parents=True, exist_ok=True)
+            (lyrics_dir / "song_lyrics.txt").write_text("la la la", encoding='utf-8')
+            (lyrics_dir / "song_timed.json").write_text("[]", encoding='utf-8')
+            return {
+                'original': str(paths['original']),
+                'stems': {'vocals': str(paths['vocals']), 'instrumental': str(paths['instrumental'])},
+                'lyrics': {'text_path': str(lyrics_dir / "song_lyrics.txt"),
+                           'timed_path': str(lyrics_dir / "song_timed.json")},
+            }
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _request(url: str, data: bytes = None, headers: dict = None, method: str = None):
+    request = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def _wait_done(base: str, job_id: str, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        _, _, body = _request(f"{base}/jobs/{job_id}")
+        job = json.loads(body)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"El trabajo {job_id} no terminó en {timeout}s")
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """Arranca JobService + servidor en un puerto libre; devuelve (url base, servicio)"""
+    started = []
+
+    def start(processor, workers=1):
+        service = JobService(processor, tmp_path / "jobs", workers=workers, max_queue=8)
+        service.start()
+        server = create_server(service, "127.0.0.1", 0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        started.append((server, service))
+        host, port = server.server_address[:2]
+        return f"http://{host}:{port}", service
+
+    yield start
+    for server, service in started:
+        server.shutdown()
+        server.server_close()
+        service.stop()
+
+
+def test_jobs_run_concurrently_with_isolated_outputs(tmp_path, serve):
+    processor = RecordingProcessor()
+    base, _ = serve(processor, workers=2)
+    song = tmp_path / "tono.wav"
+    _write_tone(song, seconds=0.5)
+    data = song.read_bytes()
+
+    job_ids = []
+    for _ in range(2):
+        status, _, body = _request(f"{base}/jobs?filename=tono.wav", data=data, method='POST')
+        assert status == 202
+        job_ids.append(json.loads(body)['id'])
+
+    jobs = [_wait_done(base, job_id, timeout=10) for job_id in job_ids]
+    assert [job['status'] for job in jobs] == ['done', 'done']
+    assert processor.max_active == 2
+    assert len(set(processor.output_dirs)) == 2
+    assert set(jobs[0]['artifacts']) >= {'original', 'vocals', 'instrumental', 'lyrics', 'timed'}
+
+    status, _, body = _request(f"{base}/status")
+    assert status == 200 and json.loads(body)['completed'] == 2
+
+    # Descarga completa y por rangos del mismo artefacto
+    url = f"{base}/jobs/{job_ids[0]}/artifacts/vocals"
+    status, headers, full = _request(url)
+    assert status == 200 and full == data
+    status, headers, part = _request(url, headers={'Range': 'bytes=4-11'})
+    assert status == 206
+    assert part == data[4:12]
+    assert headers['Content-Range'] == f"bytes 4-11/{len(data)}"
+    status, _, _ = _request(url, headers={'Range': f'bytes={len(data) + 10}-'})
+    assert status == 416
+
+
+def test_rejects_bad_uploads_and_unknown_routes(tmp_path, serve):
+    base, _ = serve(RecordingProcessor(delay=0))
+    status, _, _ = _request(f"{base}/jobs?filename=nota.txt", data=b'hola', method='POST')
+    assert status == 400
+    status, _, _ = _request(f"{base}/jobs?filename=vacio.wav", data=b'', method='POST')
+    assert status == 400
+    status, _, _ = _request(f"{base}/jobs/no-existe")
+    assert status == 404
+    status, _, body = _request(f"{base}/metrics")
+    assert status == 200 and b'lyraoke_queue_depth' in body
+
+
+def test_rejects_oversized_uploads_and_full_queue_without_leftovers(tmp_path):
+    processor = RecordingProcessor(delay=0.5)
+    service = JobService(processor, tmp_path / "jobs", workers=1, max_queue=1, max_upload_mb=0.01)
+    data = b'\0' * 1024
+    with pytest.raises(UploadTooLargeError):
+        service.submit("grande.wav", io.BytesIO(b'\0' * 20000), 20000)
+    with pytest.raises(ValueError):
+        service.submit("corta.wav", io.BytesIO(data), len(data) + 1)
+
+    # Sin workers arrancados la cola admite un trabajo; el segundo se rechaza
+    first = service.submit("tono.wav", io.BytesIO(data), len(data))
+    assert first.input_path.read_bytes() == data
+    with pytest.raises(QueueFullError):
+        service.submit("tono.wav", io.BytesIO(data), len(data))
+    assert [p.name for p in (tmp_path / "jobs").iterdir()] == [first.id]
+
+
+def test_oversized_upload_returns_413(tmp_path, serve):
+    base, service = serve(RecordingProcessor(delay=0))
+    service.max_upload_bytes = 100
+    status, _, _ = _request(f"{base}/jobs?filename=tono.wav", data=b'\0' * 101, method='POST')
+    assert status == 413
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+
+def test_real_processor_end_to_end(tmp_path, serve):
+    pytest.importorskip("torch")
+    pytest.importorskip("whisper")
+    from src.scripts.separate import MODEL_PATH
+    if not Path(MODEL_PATH).exists():
+        pytest.skip(f"Sin pesos del separador en {MODEL_PATH}")
+    from core.audio_processor import AudioProcessor
+
+    processor = AudioProcessor(model_size="tiny", separation_preset="fast", deduplicate=False)
+    try:
+        base, _ = serve(processor, workers=2)
+        song = tmp_path / "tono.wav"
+        _write_tone(song)
+        job_ids = []
+        for _ in range(2):
+            status, _, body = _request(f"{base}/jobs?filename=tono.wav", data=song.read_bytes(), method='POST')
+            assert status == 202
+            job_ids.append(json.loads(body)['id'])
+        for job_id in job_ids:
+            job = _wait_done(base, job_id, timeout=600)
+            assert job['status'] == 'done', job['error']
+            status, headers, body = _request(f"{base}/jobs/{job_id}/artifacts/instrumental")
+            assert status == 200 and body[:4] == b'RIFF'
+    finally:
+        processor.close()
@@ -0,0 +1,51 @@
+"""Medidor BS.1770 con los casos de referencia de EBU Tech 3341 y la ganancia de reproducción.
+
+Necesita numpy y scipy (se salta si no están); usa señales sintéticas.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+loudness = pytest.importorskip("src.utils.loudness")
+
+SAMPLE_RATE = 48000
+
+
+def _sine(dbfs: float, seconds: float, frequency: float = 997.0) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = 10 ** (dbfs / 20) * np.sin(2 * np.pi * frequency * t)
+    return np.stack([tone, tone])
+
+
+def test_stereo_sine_at_minus_23_dbfs_reads_minus_23_lufs():
+    lufs = loudness.measure_blocks([_sine(-23.0, 20.0)], SAMPLE_RATE)
+    assert lufs == pytest.approx(-23.0, abs=0.1)
+
+
+def test_result_does_not_depend_on_block_size():
+    audio = _sine(-20.0, 5.0)
+    whole = loudness.measure_blocks([audio], SAMPLE_RATE)
+    pieces = loudness.measure_blocks(np.array_split(audio, 37, axis=1), SAMPLE_RATE)
+    assert pieces == pytest.approx(whole, abs=1e-6)
+
+
+def test_gates_drop_silence_and_quiet_passages():
+    silence = np.zeros((2, 10 * SAMPLE_RATE))
+    # Absoluta: el silencio no cuenta
+    lufs = loudness.measure_blocks([silence, _sine(-23.0, 20.0), silence], SAMPLE_RATE)
+    assert lufs == pytest.approx(-23.0, abs=0.1)
+    # Relativa (EBU 3341, caso 3): los tramos a -36 dBFS quedan bajo la puerta de -10 LU
+    quiet = _sine(-36.0, 10.0)
+    lufs = loudness.measure_blocks([quiet, _sine(-23.0, 60.0), quiet], SAMPLE_RATE)
+    assert lufs == pytest.approx(-23.0, abs=0.1)
+    assert loudness.measure_blocks([silence], SAMPLE_RATE) is None
+    assert loudness.measure_blocks([_sine(-23.0, 0.3)], SAMPLE_RATE) is None
+
+
+def test_playback_gain_only_attenuates_towards_target():
+    target = loudness.TARGET_LUFS
+    assert loudness.playback_gain_db(target + 6.0) == pytest.approx(-6.0)
+    assert loudness.playback_gain_db(target) == 0.0
+    assert loudness.playback_gain_db(target - 10.0) == 0.0
+    assert loudness.playback_gain_db(None) == 0.0
+    assert loudness.playback_gain_db(-10.0, target=-14.0) == pytest.approx(-4.0)
@@ -0,0 +1,59 @@
+"""Presupuesto de memoria y medición por etapa, con el RSS del proceso simulado."""
+import pytest
+
+pytest.importorskip("torch")
+memory = pytest.importorskip("src.utils.memory")
+
+
+def test_window_cost_is_fixed_by_the_training_segment():
+    short = memory.MemoryBudget._estimate(60.0, 7.8, separate=True, transcribe=False)
+    long = memory.MemoryBudget._estimate(600.0, 7.8, separate=True, transcribe=False)
+    assert short == pytest.approx(memory.estimate_separation_mb(60.0, 7.8))
+    assert long - short == pytest.approx(memory.estimate_separation_mb(600.0, 0.0)
+                                         - memory.estimate_separation_mb(60.0, 0.0))
+
+
+def test_baseline_is_measured_idle_and_jobs_count_by_estimate(monkeypatch):
+    rss = {'mb': 1000.0}
+    monkeypatch.setattr(memory, 'current_rss_mb', lambda: rss['mb'])
+    estimate = memory.MemoryBudget._estimate(180.0, 7.8, separate=True, transcribe=True)
+    budget = memory.MemoryBudget(1000.0 + 2 * estimate + 1)
+
+    first = budget.plan(180.0, 7.8, True, True)
+    assert first['baseline_mb'] == 1000.0
+    # El primer trabajo ya ocupa memoria real: no debe contarse dos veces
+    rss['mb'] = 1000.0 + estimate
+    second = budget.plan(180.0, 7.8, True, True)
+    assert second['baseline_mb'] == 1000.0
+    assert second['reserved_by_others_mb'] == pytest.approx(estimate, abs=0.1)
+
+    # Un tercero no cabe por culpa de los otros: espera y se aborta desde on_wait
+    class Abort(Exception):
+        pass
+
+    def abort():
+        raise Abort()
+
+    with pytest.raises(Abort):
+        budget.plan(180.0, 7.8, True, True, on_wait=abort)
+    budget.release(first)
+    budget.release(second)
+
+
+def test_job_that_never_fits_fails_at_once(monkeypatch):
+    monkeypatch.setattr(memory, 'current_rss_mb', lambda: 1000.0)
+    budget = memory.MemoryBudget(1100.0)
+    with pytest.raises(memory.MemoryBudgetExceeded):
+        budget.plan(600.0, 7.8, True, True, on_wait=pytest.fail)
+
+
+def test_stage_memory_marks_overlapping_stages():
+    with memory.StageMemory() as alone:
+        pass
+    assert alone.stats['exclusive'] is True
+    with memory.StageMemory() as outer:
+        with memory.StageMemory() as inner:
+            pass
+    assert outer.stats['exclusive'] is False
+    assert inner.stats['exclusive'] is False
+    assert alone.stats['rss_peak_mb'] is not None
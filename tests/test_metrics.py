@@ -0,0 +1,82 @@
+"""Formato de texto de Prometheus generado por el registro de métricas (sin dependencias)."""
+import math
+
+import pytest
+
+from src.utils import metrics
+
+
+def _lines(metric) -> list:
+    return metric.render().splitlines()
+
+
+def test_histogram_buckets_are_cumulative_and_end_in_count():
+    histogram = metrics.Histogram('demo_seconds', 'Duración', ('stage',), buckets=(1, 0.5, 5))
+    for value in (0.2, 0.5, 0.7, 3.0, 10.0):
+        histogram.observe(value, stage='separate')
+    lines = _lines(histogram)
+    assert lines[:2] == ['# HELP demo_seconds Duración', '# TYPE demo_seconds histogram']
+    assert lines[2:] == [
+        'demo_seconds_bucket{stage="separate",le="0.5"} 2',
+        'demo_seconds_bucket{stage="separate",le="1"} 3',
+        'demo_seconds_bucket{stage="separate",le="5"} 4',
+        'demo_seconds_bucket{stage="separate",le="+Inf"} 5',
+        'demo_seconds_sum{stage="separate"} 14.4',
+        'demo_seconds_count{stage="separate"} 5',
+    ]
+
+
+def test_counter_and_gauge_samples():
+    counter = metrics.Counter('demo_total', 'Contador')
+    assert _lines(counter)[-1] == 'demo_total 0'
+    counter.inc()
+    counter.inc(2.5)
+    assert _lines(counter) == ['# HELP demo_total Contador', '# TYPE demo_total counter', 'demo_total 3.5']
+    with pytest.raises(ValueError):
+        counter.inc(-1)
+
+    gauge = metrics.Gauge('demo_depth', 'Profundidad', ('queue',))
+    gauge.set(4, queue='a')
+    gauge.set_function(lambda: 7, queue='b')
+    gauge.set_function(lambda: 1 / 0, queue='c')  # una función que falla no rompe la exportación
+    assert _lines(gauge)[1:] == ['# TYPE demo_depth gauge', 'demo_depth{queue="a"} 4', 'demo_depth{queue="b"} 7']
+
+
+def test_label_values_and_help_are_escaped():
+    counter = metrics.Counter('demo_escaped_total', 'Línea 1\nruta C:\\tmp "sin escapar"', ('path',))
+    counter.inc(path='C:\\canciones\\"uno"\nfin')
+    lines = _lines(counter)
+    assert lines[0] == '# HELP demo_escaped_total Línea 1\\nruta C:\\\\tmp "sin escapar"'
+    assert lines[2] == 'demo_escaped_total{path="C:\\\\canciones\\\\\\"uno\\"\\nfin"} 1'
+
+
+def test_wrong_label_sets_are_rejected():
+    counter = metrics.Counter('demo_labels_total', 'Etiquetas', ('status',))
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.inc(status='done', extra='x')
+    histogram = metrics.Histogram('demo_labels_seconds', 'Etiquetas', ('stage',))
+    with pytest.raises(ValueError):
+        histogram.observe(1.0, model='whisper')
+
+
+def test_registry_renders_every_metric_and_rejects_duplicates():
+    registry = metrics.MetricsRegistry()
+    registry.register(metrics.Counter('demo_a_total', 'A'))
+    registry.register(metrics.Gauge('demo_b', 'B'))
+    with pytest.raises(ValueError):
+        registry.register(metrics.Counter('demo_a_total', 'Otra'))
+    text = registry.render()
+    assert text.endswith('\n')
+    assert [line for line in text.splitlines() if line.startswith('# TYPE')] == [
+        '# TYPE demo_a_total counter', '# TYPE demo_b gauge']
+
+
+def test_special_values():
+    gauge = metrics.Gauge('demo_special', 'Especiales', ('kind',))
+    gauge.set(math.inf, kind='inf')
+    gauge.set(math.nan, kind='nan')
+    gauge.set(-math.inf, kind='ninf')
+    assert _lines(gauge)[2:] == ['demo_special{kind="inf"} +Inf', 'demo_special{kind="nan"} NaN',
+                                 'demo_special{kind="ninf"} -Inf']
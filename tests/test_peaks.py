@@ -0,0 +1,39 @@
+"""Consultas de la pirámide de picos: el recorte a la ventana no cambia el resultado."""
+import pytest
+
+np = pytest.importorskip("numpy")
+peaks = pytest.importorskip("src.utils.peaks")
+
+
+def _full_query(pyramid, start, end, pixels):
+    """La consulta sobre el nivel completo, como referencia"""
+    first = max(0, int(start * pyramid.sample_rate))
+    last = min(pyramid.length, int(end * pyramid.sample_rate))
+    samples_per_pixel = max(last - first, 1) / pixels
+    index, block = 0, pyramid.base_block
+    while index + 1 < len(pyramid.levels) and block * pyramid.factor <= samples_per_pixel:
+        index += 1
+        block *= pyramid.factor
+    level = pyramid.levels[index]
+    edges = np.clip((np.linspace(first, last, pixels + 1) // block).astype(np.int64), 0, level.shape[1] - 1)
+    starts = edges[:-1]
+    stop = min(int(edges[-1]) + 1, level.shape[1])
+    counts = np.maximum(np.diff(np.append(starts, stop)), 1).astype(np.float32)
+    window = level[:, :stop].astype(np.float32)
+    return (np.maximum.reduceat(window[0], starts), np.minimum.reduceat(window[1], starts),
+            np.sqrt(np.add.reduceat(window[2] ** 2, starts) / counts))
+
+
+@pytest.mark.parametrize('start, end, pixels', [
+    (0.0, 60.0, 800),      # vista completa
+    (31.2, 33.9, 640),     # zoom en mitad de la pista
+    (59.99, 60.0, 100),    # zoom por debajo del nivel 0
+    (45.0, 80.0, 300),     # intervalo que se sale del final
+])
+def test_windowed_query_matches_full_level(start, end, pixels):
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-1, 1, size=(2, 60 * 8000)).astype(np.float32)
+    pyramid = peaks.PeakPyramid.from_array(audio, 8000)
+    for got, expected in zip(pyramid.query(start, end, pixels), _full_query(pyramid, start, end, pixels)):
+        assert got.shape == (pixels,)
+        assert np.allclose(got, expected)
@@ -0,0 +1,47 @@
+"""Manifiesto del pipeline: qué etapas se repiten al reanudar un workspace."""
+import pytest
+
+pytest.importorskip("torch")
+pipeline = pytest.importorskip("core.pipeline")
+
+
+def _done_workspace(tmp_path, stages):
+    manifest = pipeline.CheckpointManifest(tmp_path)
+    song = tmp_path / "song.wav"
+    song.write_bytes(b'RIFF')
+    manifest.bind_input(song, {})
+    for stage in stages:
+        artifact = tmp_path / f"{stage}.out"
+        artifact.write_text(stage, encoding='utf-8')
+        manifest.mark_done(stage, {stage: artifact})
+    return pipeline.CheckpointManifest(tmp_path)
+
+
+def test_missing_pitch_track_does_not_rerun_transcription(tmp_path):
+    # Workspace de antes de la etapa pitch: todo hecho salvo la pista de tono
+    manifest = _done_workspace(tmp_path, ['ingest', 'separate', 'save_stems', 'transcribe', 'export'])
+    first_pending = next(stage for stage in pipeline.STAGES if not manifest.is_done(stage))
+    assert first_pending == 'pitch'
+    manifest.invalidate_from(first_pending)
+    assert manifest.is_done('transcribe')
+    assert not manifest.is_done('export')
+
+
+@pytest.mark.parametrize('skipped, reused_from, mode', [
+    ([], None, 'processed'),
+    (['ingest', 'separate', 'save_stems'], None, 'resumed'),
+    (['separate', 'save_stems', 'transcribe', 'pitch'], 'otro', 'reused'),
+])
+def test_throughput_metrics_separate_reused_and_resumed_runs(skipped, reused_from, mode):
+    run = pipeline.ProcessingPipeline.__new__(pipeline.ProcessingPipeline)
+    run.skipped_stages, run.reused_from = skipped, reused_from
+    assert run._run_mode() == mode
+
+
+def test_transcription_language_survives_resume(tmp_path):
+    manifest = _done_workspace(tmp_path, ['ingest', 'separate', 'save_stems'])
+    timed = tmp_path / "timed.json"
+    timed.write_text('[]', encoding='utf-8')
+    manifest.mark_done('transcribe', {'timed': timed}, {'language': 'es'})
+    assert pipeline.CheckpointManifest(tmp_path).stage_info('transcribe') == {'language': 'es'}
+    assert pipeline.CheckpointManifest(tmp_path).stage_info('pitch') == {}
@@ -0,0 +1,31 @@
+"""Regiones de perfilado por trabajo: un trabajo concurrente no etiqueta la traza ajena."""
+import threading
+
+import pytest
+
+pytest.importorskip("torch")
+profiling = pytest.importorskip("src.utils.profiling")
+
+
+def test_regions_are_scoped_to_the_profiled_job(tmp_path):
+    inside = threading.Event()
+    checked = threading.Event()
+    seen = {}
+
+    def other_job():
+        inside.wait(timeout=10)
+        seen['other'] = profiling.profile_region('other.region')
+        checked.set()
+
+    thread = threading.Thread(target=other_job)
+    thread.start()
+    with profiling.JobProfiler(tmp_path, modes=['torch']):
+        seen['own'] = profiling.profile_region('own.region')
+        inside.set()
+        checked.wait(timeout=10)
+    thread.join()
+
+    assert seen['other'] is profiling._NULL_CONTEXT
+    assert seen['own'] is not profiling._NULL_CONTEXT
+    assert profiling.profile_region('after') is profiling._NULL_CONTEXT
+    assert (tmp_path / "trace.json").exists()
@@ -0,0 +1,77 @@
+"""Separación por ventanas con un modelo diminuto: checkpoints y shifts reproducibles.
+
+Necesita torch y demucs (se salta si no están); no usa los pesos reales del separador.
+"""
+import random
+
+import pytest
+
+torch = pytest.importorskip("torch")
+separate = pytest.importorskip("src.scripts.separate")
+
+
+class TinySeparator(torch.nn.Module):
+    """Cuatro fuentes como ganancias fijas de la entrada; cuenta las ventanas calculadas"""
+    samplerate = 100
+    segment = 2.0
+    sources = ['drums', 'bass', 'other', 'vocals']
+    audio_channels = 2
+
+    def __init__(self):
+        super().__init__()
+        self.gain = torch.nn.Parameter(torch.tensor([0.1, 0.2, 0.3, 0.4]), requires_grad=False)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        return x.unsqueeze(1) * self.gain.view(1, -1, 1, 1)
+
+
+def _mix(seconds: float = 10.0) -> torch.Tensor:
+    generator = torch.Generator().manual_seed(1)
+    return torch.randn(1, 2, int(seconds * TinySeparator.samplerate), generator=generator)
+
+
+def test_rerun_with_shifts_reuses_stored_windows(tmp_path):
+    model, mix, device = TinySeparator(), _mix(), torch.device('cpu')
+    first = separate.CheckpointPool(tmp_path / "windows")
+    vocals, instrumental = separate.separate_mix(model, mix, device, pool=first, preset='best')
+    assert first.reused == 0 and model.calls == first.submitted > 0
+
+    calls = model.calls
+    second = separate.CheckpointPool(tmp_path / "windows")
+    again, _ = separate.separate_mix(model, mix, device, pool=second, preset='best')
+    assert second.submitted == first.submitted
+    assert second.reused == second.submitted
+    assert model.calls == calls
+    assert torch.equal(vocals, again)
+
+
+def test_shifts_leave_global_random_state_untouched():
+    random.seed(123)
+    state = random.getstate()
+    first, _ = separate.separate_mix(TinySeparator(), _mix(), torch.device('cpu'), preset='best')
+    assert random.getstate() == state
+    random.seed(456)
+    second, _ = separate.separate_mix(TinySeparator(), _mix(), torch.device('cpu'), preset='best')
+    assert torch.equal(first, second)
+
+
+@pytest.mark.parametrize('shared_pool', [False, True])
+def test_concurrent_separations_with_shifts_match_serial(shared_pool):
+    from concurrent.futures import ThreadPoolExecutor
+
+    model, device = TinySeparator(), torch.device('cpu')
+    mixes = [_mix(seconds) for seconds in (6.0, 8.0, 10.0, 12.0)]
+    expected = [separate.separate_mix(model, mix, device, preset='best')[0] for mix in mixes]
+
+    pool = separate.BatchingSeparationPool(model, max_batch=4, max_wait=0.01) if shared_pool else None
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(
+                lambda mix: separate.separate_mix(model, mix, device, pool=pool, preset='best')[0], mixes))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    for got, want in zip(results, expected):
+        assert torch.allclose(got, want, atol=1e-6)
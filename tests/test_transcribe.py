@@ -0,0 +1,39 @@
+"""Pistas de idioma: artistas a la primera, carpetas solo con detecciones coincidentes."""
+import json
+
+import pytest
+
+transcribe = pytest.importorskip("src.scripts.transcribe")
+
+
+def test_detection_is_remembered_for_the_artist_only(tmp_path):
+    cache = transcribe.LanguageHintCache(tmp_path / "hints.json")
+    cache.remember(['artist:rosalía', 'library:/musica'], 'es')
+    assert cache.lookup(['artist:rosalía']) == 'es'
+    assert cache.lookup(['artist:otro', 'library:/musica']) is None
+
+
+def test_library_hint_needs_agreeing_detections(tmp_path):
+    path = tmp_path / "hints.json"
+    cache = transcribe.LanguageHintCache(path)
+    for _ in range(transcribe.LIBRARY_AGREEMENT - 1):
+        cache.remember(['library:/musica'], 'es')
+    assert cache.lookup(['library:/musica']) is None
+    # Las detecciones pendientes sobreviven a un reinicio
+    cache = transcribe.LanguageHintCache(path)
+    cache.remember(['library:/musica'], 'es')
+    assert cache.lookup(['library:/musica']) == 'es'
+
+    for language in ['es', 'en'] + ['es'] * transcribe.LIBRARY_AGREEMENT:
+        cache.remember(['library:/mezcla'], language)
+    assert cache.lookup(['library:/mezcla']) is None
+    cache.set_hint('library:/mezcla', 'en')
+    assert transcribe.LanguageHintCache(path).lookup(['library:/mezcla']) == 'en'
+    assert set(json.loads(path.read_text(encoding='utf-8'))) >= {'library:/musica', 'library:/mezcla'}
+
+
+def test_balanced_preset_keeps_whisper_defaults():
+    preset = transcribe.get_transcription_preset('balanced')
+    assert preset['condition_on_previous_text'] is True
+    assert tuple(preset['temperature']) == transcribe.TEMPERATURE_FALLBACK
+    assert preset['beam_size'] is None and preset['best_of'] is None
@@ -6,12 +6,17 @@ from PyQt5.QtCore import Qt, pyqtSignal, QUrl, QTimer
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QIcon
 from PyQt5.QtMultimedia import QMediaPlayer
 from pathlib import Path
-from core.audio_processor import AudioProcessor
+from core.worker_process import ProcessingWorker
+from core.playlist import Playlist, PREFETCH_LOOKAHEAD
 from core.player import KaraokePlayer
-import threading
+from ui.waveform import WaveformView
+from src.utils.peaks import PeakPyramid
 import json
 import time
 
+# Prioridad del worker frente a la reproducción (mayor = cede más CPU)
+PREFETCH_NICE = 5
+
 class MainWindow(QMainWindow):
     processing_finished = pyqtSignal(dict)
     
@@ -32,13 +37,23 @@ class MainWindow(QMainWindow):
         self.setAcceptDrops(True)
         self.setMinimumSize(800, 600)
         
-        self.audio_processor = AudioProcessor()
+        # El pipeline corre en un proceso aparte con los modelos precargados
+        self.worker = ProcessingWorker(nice=PREFETCH_NICE)
+        self.worker.start()
+        self.playlist = Playlist(self.worker, lookahead=PREFETCH_LOOKAHEAD)
+        self.worker_timer = QTimer(self)
+        self.worker_timer.setInterval(100)
+        self.worker_timer.timeout.connect(self.poll_worker_events)
+        self.worker_timer.start()
         self.player = KaraokePlayer()
         self.current_file = None
         self.current_audio_path = None
         self.original_path = None
         self.vocals_path = None
         self.instrumental_path = None
+        self.peaks = {}  # ruta de audio -> PeakPyramid
+        self.peak_paths = {}  # original/vocals/instrumental -> .peaks.npz
+        self.refining = False  # sonando la vista previa mientras HTDemucs termina
         self.duration_ms = 0
         
         self.init_ui()
@@ -112,6 +127,10 @@ class MainWindow(QMainWindow):
         controls_layout.addWidget(self.acapella_btn)
         controls_layout.addWidget(self.karaoke_btn)
         layout.addLayout(controls_layout)
+
+        # Forma de onda de la pista activa (pirámide de picos precalculada)
+        self.waveform = WaveformView()
+        layout.addWidget(self.waveform)
         
         # Barra de progreso de la canción con timer encima
         self.song_progress = QProgressBar()
@@ -170,6 +189,8 @@ class MainWindow(QMainWindow):
         self.player.durationChanged.connect(self.update_duration)  # Nueva conexión
         self.player.lyrics_updated.connect(self.update_lyrics_display)
         self.player.stateChanged.connect(self.update_buttons_state)
+        self.player.mediaStatusChanged.connect(self.on_media_status_changed)
+        self.waveform.seek_requested.connect(self.player.setPosition)
 
     def toggle_playback_mode(self, checked):
         """Manejar cambio entre modos de reproducción (ORIGINAL, ACAPELLA, KARAOKE)"""
@@ -185,6 +206,7 @@ class MainWindow(QMainWindow):
             self.current_audio_path = self.vocals_path
         elif hasattr(self, 'instrumental_path'):  # Karaoke por defecto
             self.current_audio_path = self.instrumental_path
+        self._show_waveform()
         
         # Si está reproduciendo, cambiar el audio inmediatamente
         if self.player.state() == QMediaPlayer.PlayingState:
@@ -209,14 +231,22 @@ class MainWindow(QMainWindow):
             self.handle_new_file(file_path)
 
     def handle_new_file(self, file_path):
-        self.current_file = file_path
-        self.drop_area.setText(f"Procesando:\n{os.path.basename(file_path)}")
-        self.start_processing()
+        """Añade la canción a la cola; se procesa en segundo plano mientras suena la actual"""
+        item = self.playlist.add(file_path)
+        current = self.playlist.current()
+        if current.status == 'failed' and self.playlist.has_next():
+            self.next_song()
+        elif item is current:
+            self.current_file = file_path
+            self.drop_area.setText(f"Procesando:\n{os.path.basename(file_path)}")
+            self.start_processing()
+        else:
+            self.update_queue_label()
 
     def start_processing(self):
+        """Muestra el progreso de la canción actual hasta que el worker la tenga lista"""
         self.progress_bar.show()
         self.progress_bar.setRange(0, 0)
-        self.setEnabled(False)
         
         # Deshabilitar todos los botones de control
         for btn in [self.play_btn, self.pause_btn, self.stop_btn, 
@@ -224,19 +254,143 @@ class MainWindow(QMainWindow):
             btn.setEnabled(False)
         
         self.lyrics_display.setText("")
-        
-        threading.Thread(target=self.process_audio_background, daemon=True).start()
+        self.waveform.set_pyramid(None)
+
+        item = self.playlist.current()
+        if item is not None and item.status == 'ready':
+            self.processing_finished.emit(item.result)
+
+    def poll_worker_events(self):
+        """Atiende los eventos del proceso worker sin bloquear la interfaz"""
+        current = self.playlist.current()
+        if current is not None and current.job_id is not None:
+            # Las palabras pendientes se alinean empezando por lo que está sonando
+            self.worker.set_playback(current.job_id, self.player.position() / 1000)
+
+        for kind, job_id, data in self.worker.poll_events():
+            if kind == 'fatal':
+                print(f"Error iniciando el worker: {data}")
+            item = self.playlist.handle_event(kind, job_id, data)
+            if item is None:
+                continue
+            if kind == 'words':
+                # Las demás canciones leerán sus palabras de song_words.json al cargarse
+                if item is self.playlist.current() and item.status == 'ready':
+                    self.player.set_segment_words(*data)
+                continue
+            if item is not self.playlist.current() or (self.current_audio_path and not self.refining):
+                # Canción en prefetch: solo se refleja en la cola
+                if kind == 'error':
+                    print(f"Error procesando {item.name}: {data}")
+                self.update_queue_label()
+                continue
+            if kind == 'progress':
+                stage, fraction = data
+                self.progress_bar.setRange(0, 100)
+                self.progress_bar.setValue(int(fraction * 100))
+            elif kind == 'artifacts':
+                artifact_kind, paths = data
+                if artifact_kind == 'preview' and not self.current_audio_path:
+                    self.on_preview_ready(item, paths)
+                elif artifact_kind == 'stems' and self.refining:
+                    self.on_stems_refined(paths)
+            elif kind == 'result':
+                self.processing_finished.emit(data)
+            elif kind in ('error', 'cancelled'):
+                self.progress_bar.hide()
+                self.refining = False
+                if kind == 'error':
+                    print(f"Error processing audio: {data}")
+                    QMessageBox.warning(self, "Error", f"Error al procesar el audio: {data}")
+                self.drop_area.setText("Arrastra tu canción aquí (MP3, WAV, etc.)")
+                self.current_file = None
+                self.next_song()
+
+    def next_song(self):
+        """Avanza a la siguiente canción de la cola; si ya está procesada suena al instante"""
+        item = self.playlist.advance()
+        if item is None:
+            return
+        self.player.stop()
+        self.current_file = str(item.path)
+        self.current_audio_path = None
+        self.refining = False
+        if item.status == 'ready':
+            self.processing_finished.emit(item.result)
+            self.play_audio()
+        else:
+            self.drop_area.setText(f"Procesando:\n{item.name}")
+            self.start_processing()
+
+    def on_media_status_changed(self, status):
+        if status == QMediaPlayer.EndOfMedia and self.playlist.has_next():
+            self.next_song()
+
+    def update_queue_label(self):
+        """Resume en el área de arrastre el estado de las próximas canciones"""
+        current = self.playlist.current()
+        if current is None:
+            return
+        header = f"Listo:\n{current.name}" if current.status == 'ready' else f"Procesando:\n{current.name}"
+        upcoming = self.playlist.upcoming()
+        if upcoming:
+            states = {'pending': 'en cola', 'processing': 'procesando', 'ready': 'lista', 'failed': 'error'}
+            lines = [f"{item.name} ({states[item.status]})" for item in upcoming[:3]]
+            header += "\nSiguientes: " + ", ".join(lines)
+        self.drop_area.setText(header)
 
-    def process_audio_background(self):
+    def on_preview_ready(self, item, paths):
+        """Stems rápidos (Open-Unmix): ya se puede cantar mientras HTDemucs y Whisper terminan"""
         try:
-            result = self.audio_processor.process_audio(self.current_file)
-            self.processing_finished.emit(result)
-        except Exception as e:
-            print(f"Error processing audio: {e}")
+            self.original_path = str(self._validate_audio_path(paths['original']))
+            self.vocals_path = str(self._validate_audio_path(paths['vocals']))
+            self.instrumental_path = str(self._validate_audio_path(paths['instrumental']))
+        except FileNotFoundError as e:
+            print(f"Info: Vista previa no disponible: {str(e)}")
+            return
+        self.refining = True
+        self.player.clear_lyrics()
+        self.current_audio_path = self.instrumental_path
+        self.karaoke_btn.setChecked(True)
+        self._load_peaks({name: paths.get(f'{name}_peaks') for name in ('original', 'vocals', 'instrumental')})
+        self.drop_area.setText(f"Vista previa lista:\n{item.name}\nRefinando separación y letras...")
+        self.update_buttons_state(self.player.state())
+
+    def on_stems_refined(self, paths):
+        """Llegan los stems de HTDemucs: se sustituyen en caliente en la posición actual"""
+        try:
+            self.vocals_path = str(self._validate_audio_path(paths['vocals']))
+            self.instrumental_path = str(self._validate_audio_path(paths['instrumental']))
+        except FileNotFoundError as e:
+            print(f"Info: Stems refinados no disponibles: {str(e)}")
+            return
+        self._load_peaks({
+            'original': self.peak_paths.get('original'),
+            'vocals': paths.get('vocals_peaks'),
+            'instrumental': paths.get('instrumental_peaks'),
+        })
+        self._swap_to_mode_source()
+
+    def _path_for_mode(self):
+        if self.original_btn.isChecked():
+            return self.original_path
+        if self.acapella_btn.isChecked():
+            return self.vocals_path
+        return self.instrumental_path
+
+    def _swap_to_mode_source(self):
+        """Actualiza la pista del modo actual; si sonaba la anterior, cambia sin perder la posición"""
+        previous = self.current_audio_path
+        self.current_audio_path = self._path_for_mode()
+        self._show_waveform()
+        media = self.player.media()
+        if media.isNull() or not previous or previous == self.current_audio_path:
+            return
+        if os.path.abspath(media.canonicalUrl().toLocalFile()) == os.path.abspath(previous):
+            self.player.swap_audio(self.current_audio_path)
 
     def on_processing_finished(self, result):
         self.progress_bar.hide()
-        self.setEnabled(True)
         
         if not result.get('stems'):
             QMessageBox.warning(self, "Error", "No se generaron las pistas de audio correctamente")
@@ -247,16 +401,27 @@ class MainWindow(QMainWindow):
             self.original_path = str(self._validate_audio_path(result['original']))
             self.vocals_path = str(self._validate_audio_path(result['stems']['vocals']))
             self.instrumental_path = str(self._validate_audio_path(result['stems']['instrumental']))
-            self.current_audio_path = str(self.instrumental_path)  # Modo karaoke por defecto
+            self._load_peaks(result.get('peaks', {}))
+            if self.refining:
+                # Se estaba cantando la vista previa: mantener modo y posición
+                self.refining = False
+                self._swap_to_mode_source()
+            else:
+                self.current_audio_path = str(self.instrumental_path)  # Modo karaoke por defecto
+                self.karaoke_btn.setChecked(True)
+                self._show_waveform()
             
             # Cargar letras temporizadas
-            lyrics_dir = os.path.join('output', 'lyrics')
-            timed_path = os.path.join(lyrics_dir, 'song_timed.json')
-            text_path = os.path.join(lyrics_dir, 'song_lyrics.txt')
+            timed_path = result['lyrics']['timed_path']
+            text_path = result['lyrics']['text_path']
             
             if os.path.exists(timed_path):
                 if not self.player.load_timed_lyrics_from_json(timed_path):
                     QMessageBox.warning(self, "Error", "Error al cargar letras temporizadas")
+
+            pitch_path = result.get('pitch_path')
+            if pitch_path and os.path.exists(pitch_path):
+                self.player.load_pitch_track(pitch_path)
             
             if os.path.exists(text_path):
                 try:
@@ -267,11 +432,29 @@ class MainWindow(QMainWindow):
             
             # Habilitar controles SOLO cuando el procesamiento termine
             self.update_buttons_state(self.player.state())
-            self.drop_area.setText(f"Listo:\n{os.path.basename(self.current_file)}")
+            self.update_queue_label()
             
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Error al finalizar el procesamiento: {str(e)}")
 
+    def _load_peaks(self, peaks_paths):
+        """Carga las pirámides de picos de original/vocales/instrumental (si existen)"""
+        self.peaks = {}
+        self.peak_paths = dict(peaks_paths)
+        sources = {'original': self.original_path, 'vocals': self.vocals_path,
+                   'instrumental': self.instrumental_path}
+        for name, audio_path in sources.items():
+            path = peaks_paths.get(name)
+            if path and os.path.exists(path):
+                try:
+                    self.peaks[audio_path] = PeakPyramid.load(path)
+                except Exception as e:
+                    print(f"Info: No se pudo cargar la forma de onda ({name}): {str(e)}")
+        self._show_waveform()
+
+    def _show_waveform(self):
+        self.waveform.set_pyramid(self.peaks.get(self.current_audio_path))
+
     def play_audio(self):
         """Reproducir audio con manejo de errores"""
         if not hasattr(self, 'current_audio_path'):
@@ -330,6 +513,7 @@ class MainWindow(QMainWindow):
         if self.duration_ms > 0:
             progress = int((position_ms / self.duration_ms) * 100)
             self.song_progress.setValue(progress)
+            self.waveform.set_position(position_ms)
             
             # Convertir milisegundos a minutos:segundos
             current_min, current_sec = divmod(position_ms // 1000, 60)
@@ -417,4 +601,6 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.player.stop()
+        self.worker_timer.stop()
+        self.worker.stop(timeout=1.0)
         event.accept()
\ No newline at end of file
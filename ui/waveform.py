@@ -0,0 +1,72 @@
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, pyqtSignal, QPointF
+from PyQt5.QtGui import QPainter, QColor, QPen
+from typing import Optional
+
+from src.utils.peaks import PeakPyramid
+
+
+class WaveformView(QWidget):
+    """Vista general de la pista a partir de su pirámide de picos.
+
+    Cada repintado consulta solo tantos valores como píxeles de ancho, así que el coste
+    no depende de la duración de la canción. Un clic pide saltar a esa posición.
+    """
+    seek_requested = pyqtSignal(int)  # milisegundos
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pyramid: Optional[PeakPyramid] = None
+        self._position_ms = 0
+        self._cache_key = None
+        self._cache = None
+        self.setMinimumHeight(60)
+
+    def set_pyramid(self, pyramid: Optional[PeakPyramid]):
+        self._pyramid = pyramid
+        self._cache_key = None
+        self.update()
+
+    def set_position(self, position_ms: int):
+        self._position_ms = position_ms
+        self.update()
+
+    def _columns(self, width: int):
+        """(máx, mín, rms) por columna; se recalcula solo si cambia la pista o el ancho"""
+        key = (id(self._pyramid), width)
+        if key != self._cache_key:
+            self._cache = self._pyramid.query(0.0, self._pyramid.duration, width)
+            self._cache_key = key
+        return self._cache
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#2b2b2b"))
+        width, height = self.width(), self.height()
+        if self._pyramid is None or width <= 0 or self._pyramid.duration <= 0:
+            painter.end()
+            return
+
+        highs, lows, rms = self._columns(width)
+        middle = height / 2
+        scale = middle - 2
+        played = int(width * self._position_ms / 1000 / self._pyramid.duration)
+
+        peak_pen = QPen(QColor("#4facfe"))
+        rms_pen = QPen(QColor("#00f2fe"))
+        dim_pen = QPen(QColor("#6b6b6b"))
+        for x in range(width):
+            painter.setPen(peak_pen if x <= played else dim_pen)
+            painter.drawLine(QPointF(x, middle - highs[x] * scale), QPointF(x, middle - lows[x] * scale))
+            if x <= played:
+                painter.setPen(rms_pen)
+                painter.drawLine(QPointF(x, middle - rms[x] * scale), QPointF(x, middle + rms[x] * scale))
+
+        painter.setPen(QPen(QColor("#ffffff")))
+        painter.drawLine(played, 0, played, height)
+        painter.end()
+
+    def mousePressEvent(self, event):
+        if self._pyramid is not None and event.button() == Qt.LeftButton and self.width() > 0:
+            fraction = min(max(event.x() / self.width(), 0.0), 1.0)
+            self.seek_requested.emit(int(fraction * self._pyramid.duration * 1000))